@@ -0,0 +1,149 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+
+from app import schemas, crud_async, http_cache, serialization
+from app.database import get_async_db, mark_read_primary
+from app.pagination import encode_cursor, decode_cursor, encode_search_cursor, decode_search_cursor
+
+# ⚡ АСИНХРОННЫЕ ЭНДПОИНТЫ ПОЛЬЗОВАТЕЛЕЙ (DB_ASYNC=true)
+# Подключаются в main.py раньше синхронных и перехватывают те же пути и методы.
+# Ответы совпадают с синхронными версиями, поэтому в OpenAPI не дублируются.
+# Чтения здесь всегда идут на primary: реплики (DB_REPLICA_URLS, get_read_db) есть только у синхронного
+# движка, async движка для реплик нет. Записи все равно ставят cookie read_primary - синхронные
+# читающие эндпоинты (выгрузка, batch, lookup) и в async режиме ходят на реплики
+router = APIRouter(include_in_schema=False)
+
+
+@router.post("/users/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
+async def create_user(user: schemas.UserCreate, response: Response, db: AsyncSession = Depends(get_async_db)):
+    """Асинхронная версия POST /users/"""
+    db_user = await crud_async.create_user(db=db, user=user)
+
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+
+    mark_read_primary(response)
+    return db_user
+
+
+@router.post("/users/bulk", response_model=schemas.BulkUserResponse)
+async def create_users_bulk(users: List[schemas.UserCreate], response: Response, db: AsyncSession = Depends(get_async_db)):
+    """Асинхронная версия POST /users/bulk"""
+    created = await crud_async.create_users_bulk(db, users)
+
+    results = [
+        schemas.BulkUserResult(
+            email=email,
+            status="duplicate" if user_id is None else "created",
+            id=user_id
+        )
+        for email, user_id in created
+    ]
+    created_count = sum(1 for result in results if result.status == "created")
+    mark_read_primary(response)
+
+    return schemas.BulkUserResponse(
+        created=created_count,
+        duplicates=len(results) - created_count,
+        results=results
+    )
+
+
+@router.get("/users/", response_model=List[schemas.User])
+async def read_users(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count: Optional[Literal["exact", "estimated", "cached"]] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Асинхронная версия GET /users/"""
+    after_id = None
+    if cursor is not None:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+
+    max_id, max_updated_at = await crud_async.get_users_version(db)
+    etag = http_cache.make_etag("users", max_id, max_updated_at, skip, limit, after_id, count)
+    headers = http_cache.cache_headers(etag, max_updated_at)
+    if http_cache.is_not_modified(request, etag, max_updated_at):
+        return http_cache.not_modified_response(headers)
+
+    if count is not None:
+        total, count_mode = await crud_async.get_users_total(db, count)
+        headers["X-Total-Count"] = str(total)
+        headers["X-Total-Count-Mode"] = count_mode
+
+    if serialization.FAST_SERIALIZATION:
+        rows = await crud_async.get_user_rows(db, skip=skip, limit=limit, after_id=after_id)
+        if rows and len(rows) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
+        return serialization.UserRowsResponse(rows, headers=headers)
+
+    response.headers.update(headers)
+    users = await crud_async.get_users(db, skip=skip, limit=limit, after_id=after_id)
+
+    if users and len(users) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(users[-1].id)
+
+    return users
+
+
+@router.get("/users/search", response_model=List[schemas.User])
+async def search_users(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=schemas.SEARCH_QUERY_MAX_LENGTH),
+    limit: int = Query(20, ge=1, le=schemas.SEARCH_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Асинхронная версия GET /users/search"""
+    if not q.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty search query")
+
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_search_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    rows = await crud_async.search_users(db, q, limit=limit, after=after)
+    headers = {}
+    if rows and len(rows) == limit:
+        headers["X-Next-Cursor"] = encode_search_cursor(rows[-1].tier, rows[-1].name_key, rows[-1].id)
+
+    if serialization.FAST_SERIALIZATION:
+        return serialization.UserRowsResponse(rows, headers=headers)
+    response.headers.update(headers)
+    return rows
+
+
+# Только числовой id: роутер подключается раньше синхронного, и иначе /users/{user_id}
+# перехватил бы /users/export, /users/batch и другие пути, которые есть только в main.py
+@router.get("/users/{user_id:int}", response_model=schemas.User)
+async def read_user(user_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    """Асинхронная версия GET /users/{user_id}"""
+    db_user = await crud_async.get_user_by_id(db, user_id=user_id)
+
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    etag = http_cache.make_etag("user", db_user.id, db_user.updated_at)
+    headers = http_cache.cache_headers(etag, db_user.updated_at)
+    if http_cache.is_not_modified(request, etag, db_user.updated_at):
+        return http_cache.not_modified_response(headers)
+    response.headers.update(headers)
+
+    return db_user
@@ -0,0 +1,163 @@
+import threading  # Для потокобезопасного доступа к кэшу
+import time  # Для TTL
+from collections import OrderedDict  # Порядок ключей для вытеснения LRU
+from typing import Any, Callable, Optional
+
+from app import models
+from app.database import env_bool, env_int
+
+# ⚙️ НАСТРОЙКИ КЭША ПОЛЬЗОВАТЕЛЕЙ
+# Кэш живет в памяти КАЖДОГО процесса uvicorn: инвалидация локальная, поэтому TTL
+# ограничивает, сколько другой воркер может отдавать устаревшие данные
+USER_CACHE_ENABLED = env_bool("USER_CACHE_ENABLED", False)
+USER_CACHE_SIZE = env_int("USER_CACHE_SIZE", 10000)  # Максимум записей (каждый пользователь - два ключа: id и email)
+USER_CACHE_TTL = env_int("USER_CACHE_TTL", 60)       # Время жизни записи в секундах
+USERS_COUNT_CACHE_TTL = env_int("USERS_COUNT_CACHE_TTL", 10)  # Секунд живет число пользователей для ?count=cached
+
+
+class CacheBackend:
+    """
+    🔌 Интерфейс хранилища кэша
+    Для общего кэша между воркерами (например, Redis) достаточно реализовать эти методы
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        """Значение по ключу или None"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Сохраняет значение на ttl секунд"""
+        raise NotImplementedError
+
+    def delete(self, *keys: str) -> None:
+        """Удаляет ключи (отсутствующие ключи игнорируются)"""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Очищает хранилище"""
+        raise NotImplementedError
+
+
+class InMemoryCache(CacheBackend):
+    """
+    🧠 Ограниченный LRU кэш с TTL в памяти процесса
+    При переполнении вытесняется запись, к которой дольше всего не обращались
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else self._clock() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class UserCache:
+    """
+    👤 Кэш пользователей поверх любого CacheBackend
+    Хранит колонки пользователя (а не ORM объект, привязанный к сессии) под ключами id и email
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: Optional[float] = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _id_key(user_id: int) -> str:
+        return f"user:id:{user_id}"
+
+    @staticmethod
+    def _email_key(email: str) -> str:
+        return f"user:email:{email}"
+
+    def _lookup(self, key: str):
+        data = self.backend.get(key)
+        # Счетчики без блокировки: редкая потеря инкремента не стоит лишнего lock на горячем пути
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Новый объект на каждый вызов - вызывающий код может его менять, не портя кэш
+        return models.User(**data)
+
+    def get_by_id(self, user_id: int):
+        """Пользователь из кэша по ID или None"""
+        return self._lookup(self._id_key(user_id))
+
+    def get_by_email(self, email: str):
+        """Пользователь из кэша по email или None"""
+        return self._lookup(self._email_key(email))
+
+    def put(self, user) -> None:
+        """Кладет пользователя в кэш под обоими ключами"""
+        data = {column.key: getattr(user, column.key) for column in models.User.__table__.columns}
+        self.backend.set(self._id_key(user.id), data, self.ttl)
+        self.backend.set(self._email_key(user.email), data, self.ttl)
+
+    def invalidate(self, user_id: Optional[int] = None, email: Optional[str] = None) -> None:
+        """Сбрасывает записи пользователя (вызывается при создании и будущих изменениях)"""
+        keys = []
+        if user_id is not None:
+            keys.append(self._id_key(user_id))
+        if email is not None:
+            keys.append(self._email_key(email))
+        if keys:
+            self.backend.delete(*keys)
+
+    def stats(self) -> dict:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+        if isinstance(self.backend, InMemoryCache):
+            stats["size"] = len(self.backend)
+            stats["maxsize"] = self.backend.maxsize
+        return stats
+
+
+# 🎯 ГЛОБАЛЬНЫЙ КЭШ ПОЛЬЗОВАТЕЛЕЙ (None - кэш выключен)
+user_cache: Optional[UserCache] = None
+if USER_CACHE_ENABLED:
+    user_cache = UserCache(InMemoryCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL), ttl=USER_CACHE_TTL)
+
+# 🔢 ЧИСЛО ПОЛЬЗОВАТЕЛЕЙ ДЛЯ X-Total-Count (crud.get_users_total, режим cached).
+# Всегда включен и не сбрасывается при создании пользователей: устаревание ограничено коротким TTL
+users_count_cache = InMemoryCache(maxsize=1, ttl=USERS_COUNT_CACHE_TTL)
@@ -0,0 +1,241 @@
+import gzip  # Разовое сжатие gzip
+import hashlib  # Ключ кэша сжатых тел
+import os  # Для работы с переменными окружения
+import zlib  # Потоковое сжатие gzip
+from typing import Dict, Optional, Sequence
+
+from app.cache import InMemoryCache
+from app.database import env_bool, env_int
+
+try:
+    import brotli  # pip install brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard  # pip install zstandard
+except ImportError:
+    zstandard = None
+
+# 🗜️ СЖАТИЕ ОТВЕТОВ
+# CompressionMiddleware сжимает JSON, NDJSON и текст кодировкой, которую клиент перечислил
+# в Accept-Encoding: zstd и br - если установлены zstandard/brotli, gzip - всегда.
+# Маленькие ответы (меньше COMPRESSION_MIN_SIZE) отдаются как есть - заголовки сжатия и CPU дороже выигрыша.
+# Потоковые ответы (GET /users/export) сжимаются по чанкам: каждый чанк сбрасывается сразу,
+# клиент получает данные по мере выгрузки, а память не растет.
+# Ответы с ETag (GET /users/, GET /users/{id}) кэшируются уже сжатыми: повторный опрос
+# той же страницы не сжимает ее заново
+
+COMPRESSION_ENABLED = env_bool("COMPRESSION_ENABLED", True)
+COMPRESSION_MIN_SIZE = env_int("COMPRESSION_MIN_SIZE", 1024)  # Байт; меньше - без сжатия
+# Порядок предпочтения сервера, если клиент принимает несколько кодировок с одинаковым q
+COMPRESSION_ENCODINGS = [name.strip() for name in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if name.strip()]
+GZIP_LEVEL = env_int("GZIP_LEVEL", 6)
+BROTLI_QUALITY = env_int("BROTLI_QUALITY", 4)  # 11 (по умолчанию у brotli) слишком медленно для динамических ответов
+ZSTD_LEVEL = env_int("ZSTD_LEVEL", 3)
+COMPRESSION_CACHE_SIZE = env_int("COMPRESSION_CACHE_SIZE", 256)  # Сжатых тел в памяти процесса; 0 - без кэша
+COMPRESSION_CACHE_TTL = env_int("COMPRESSION_CACHE_TTL", 300)
+
+# Что имеет смысл сжимать; изображения и архивы уже сжаты
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+_INSTALLED = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+
+
+def available_encodings(preferred: Sequence[str] = COMPRESSION_ENCODINGS) -> list:
+    """Кодировки из настройки, для которых установлена библиотека, в порядке предпочтения"""
+    return [name for name in preferred if _INSTALLED.get(name)]
+
+
+def compress(encoding: str, data: bytes) -> bytes:
+    """Сжатие тела целиком"""
+    if encoding == "gzip":
+        return gzip.compress(data, GZIP_LEVEL, mtime=0)  # mtime=0 - одинаковое тело дает одинаковые байты
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class StreamCompressor:
+    """
+    🌊 Сжатие потока по чанкам
+    compress() возвращает все, что можно отдать клиенту прямо сейчас (flush после каждого чанка),
+    finish() - завершение потока
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip заголовок
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "gzip":
+            return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "gzip":
+            return self._compressor.flush(zlib.Z_FINISH)
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def select_encoding(accept_encoding: Optional[str], encodings: Sequence[str]) -> Optional[str]:
+    """
+    🤝 Выбор кодировки по Accept-Encoding (RFC 9110, 12.5.3)
+    Наибольший q среди доступных, при равенстве - порядок encodings; q=0 запрещает кодировку,
+    * относится ко всем не перечисленным явно. None - отдавать без сжатия
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    candidates = []
+    for index, encoding in enumerate(encodings):
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > 0:
+            candidates.append((-q, index, encoding))
+    return min(candidates)[2] if candidates else None
+
+
+def _header(headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    """
+    🗜️ ASGI middleware сжатия ответов
+    Чистый ASGI, как MetricsMiddleware: ответ из одного сообщения сжимается целиком
+    (с Content-Length), потоковый - по чанкам без Content-Length
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        encodings: Optional[Sequence[str]] = None,
+        cache_size: int = COMPRESSION_CACHE_SIZE,
+        cache_ttl: int = COMPRESSION_CACHE_TTL,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = available_encodings() if encodings is None else available_encodings(encodings)
+        self.cache = InMemoryCache(maxsize=cache_size, ttl=cache_ttl) if cache_size > 0 else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = select_encoding(
+            (_header(scope["headers"], b"accept-encoding") or b"").decode("latin-1"), self.encodings
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None  # Заголовки придерживаются до первого чанка тела
+        passthrough = False
+        stream = None
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough, stream
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                content_type = (_header(headers, b"content-type") or b"").decode("latin-1")
+                cache_control = (_header(headers, b"cache-control") or b"").decode("latin-1")
+                if (
+                    _header(headers, b"content-encoding") is not None
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or "no-transform" in cache_control
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if stream is not None:
+                # Следующие чанки потокового ответа
+                chunk = stream.compress(body) if body else b""
+                if not more_body:
+                    chunk += stream.finish()
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            headers = [
+                (key, value) for key, value in start_message.get("headers", [])
+                if key.lower() not in (b"content-length", b"vary")
+            ]
+            vary = _header(start_message.get("headers", []), b"vary")
+            headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+
+            if not more_body:
+                if len(body) < self.minimum_size:
+                    headers.append((b"content-length", str(len(body)).encode()))
+                else:
+                    body = self._compress_body(encoding, body, start_message)
+                    headers.append((b"content-encoding", encoding.encode()))
+                    headers.append((b"content-length", str(len(body)).encode()))
+                await send({**start_message, "headers": headers})
+                await send({"type": "http.response.body", "body": body, "more_body": False})
+                return
+
+            # Первый чанк потокового ответа: длина заранее неизвестна
+            stream = StreamCompressor(encoding)
+            headers.append((b"content-encoding", encoding.encode()))
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": stream.compress(body), "more_body": True})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compress_body(self, encoding: str, body: bytes, start_message) -> bytes:
+        """Сжатие тела; ответы с ETag берутся из кэша сжатых тел"""
+        if self.cache is None or _header(start_message.get("headers", []), b"etag") is None:
+            return compress(encoding, body)
+        # Ключ - хэш самого тела, а не ETag: слабый ETag не обещает побайтного совпадения.
+        # blake2b в несколько раз быстрее gzip-6 (benchmarks/compression_cost.py, строка gzip-cached)
+        key = f"{encoding}:{hashlib.blake2b(body, digest_size=16).hexdigest()}"
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = compress(encoding, body)
+            self.cache.set(key, compressed)
+        return compressed
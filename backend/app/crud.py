@@ -1,6 +1,146 @@
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Integer, String, and_, any_, bindparam, func, literal, literal_column, null, select, text, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app import models
-from app.schemas import UserCreate
+from app import cache, models
+from app.database import env_int
+from app.schemas import User, UserCreate
+
+# 📦 РАЗМЕР ПАЧКИ ДЛЯ МАССОВОЙ ВСТАВКИ
+# Одна пачка = один многострочный INSERT = один запрос к БД
+BULK_INSERT_BATCH_SIZE = 1000
+
+# 🧩 ДИАЛЕКТЫ С INSERT ... ON CONFLICT DO NOTHING RETURNING
+# PostgreSQL в продакшене, SQLite в тестах. Остальные БД создают пользователей переносимым
+# путем SELECT + INSERT (см. create_user), async движок всегда asyncpg
+ON_CONFLICT_DIALECTS = ("postgresql", "sqlite")
+
+
+def supports_on_conflict(db: Session) -> bool:
+    """Понимает ли БД сессии INSERT ... ON CONFLICT DO NOTHING RETURNING"""
+    return db.get_bind().dialect.name in ON_CONFLICT_DIALECTS
+
+
+def _insert_ignoring_duplicates(db: Session):
+    """
+    🧩 INSERT с поддержкой ON CONFLICT для диалекта текущей БД (один из ON_CONFLICT_DIALECTS)
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(models.User)
+
+
+def create_user_stmt(db: Session, user: UserCreate):
+    """
+    🧩 INSERT ... ON CONFLICT (email) DO NOTHING RETURNING * для одного пользователя
+    При гонке двух регистраций с одним email БД сама выберет победителя,
+    проигравший получит пустой RETURNING вместо IntegrityError
+    """
+    return (
+        _insert_ignoring_duplicates(db)
+        .values(
+            name=user.name,  # Имя пользователя
+            email=user.email,  # Email пользователя
+            bio=user.bio  # Биография (может быть None)
+        )
+        .on_conflict_do_nothing(index_elements=[models.User.email])
+        .returning(*models.User.__table__.columns)
+    )
+
+
+def bulk_insert_stmt(db: Session, batch: List[UserCreate]):
+    """
+    🧩 Многострочный INSERT ... ON CONFLICT (email) DO NOTHING RETURNING id, email для пачки
+    """
+    return (
+        _insert_ignoring_duplicates(db)
+        .values([{"name": u.name, "email": u.email, "bio": u.bio} for u in batch])
+        .on_conflict_do_nothing(index_elements=[models.User.email])
+        .returning(models.User.id, models.User.email)
+    )
+
+
+def unique_batches(users: List[UserCreate], batch_size: int):
+    """
+    ✂️ Делит пользователей на пачки, оставляя только первое вхождение каждого email
+    Повтор email внутри одного запроса - тоже дубликат
+    """
+    unique_users = {}
+    for user in users:
+        unique_users.setdefault(user.email, user)
+
+    pending = list(unique_users.values())
+    for start in range(0, len(pending), batch_size):
+        yield pending[start:start + batch_size]
+
+
+def bulk_results(users: List[UserCreate], created_ids: dict):
+    """
+    📋 Результат массовой вставки в порядке запроса: (email, id) или (email, None) для дубликатов
+    """
+    results = []
+    for user in users:
+        # pop: повторное вхождение того же email получит None и станет дубликатом
+        results.append((user.email, created_ids.pop(user.email, None)))
+    return results
+
+
+def _create_user_portable(db: Session, user: UserCreate):
+    """
+    🐢 Создание пользователя без ON CONFLICT: SELECT по email, затем INSERT
+    Гонку двух регистраций разрешает уникальный индекс email - проигравший получает None, как и в ON CONFLICT
+    """
+    if db.query(models.User.id).filter(models.User.email == user.email).first() is not None:
+        return None
+
+    db_user = models.User(name=user.name, email=user.email, bio=user.bio)
+    try:
+        # SAVEPOINT: при конфликте откатывается только эта вставка, а не вся транзакция сессии
+        with db.begin_nested():
+            db.add(db_user)
+    except IntegrityError:
+        return None
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
+def _insert_batch_portable(db: Session, batch: List[UserCreate]) -> dict:
+    """
+    🐢 Вставка пачки без ON CONFLICT: одним SELECT отсеиваются существующие email, остальные
+    вставляются по одному в SAVEPOINT - email, занятый параллельным запросом, станет дубликатом
+    Возвращает {email: id} реально вставленных
+    """
+    emails = [user.email for user in batch]
+    existing = set(db.scalars(select(models.User.email).where(models.User.email.in_(emails))))
+
+    created_ids = {}
+    for user in batch:
+        if user.email in existing:
+            continue
+        db_user = models.User(name=user.name, email=user.email, bio=user.bio)
+        try:
+            with db.begin_nested():
+                db.add(db_user)
+        except IntegrityError:
+            continue
+        created_ids[user.email] = db_user.id
+    return created_ids
+
+
+def invalidate_cached_users(created):
+    """
+    🧹 Сбрасывает кэш для созданных пользователей: пары (email, id)
+    Тот же вызов нужен любому будущему пути изменения пользователя
+    """
+    user_cache = cache.user_cache
+    if user_cache is not None:
+        for email, user_id in created:
+            user_cache.invalidate(user_id=user_id, email=email)
 
 
 def get_user_by_email(db: Session, email: str):
@@ -8,8 +148,19 @@ def get_user_by_email(db: Session, email: str):
     🔍 Поиск пользователя по email в базе данных
     Возвращает пользователя или None если не найден
     """
+    # ⚡ Сначала кэш (если включен) - горячие профили отдаются без запроса к БД
+    user_cache = cache.user_cache
+    if user_cache is not None:
+        cached = user_cache.get_by_email(email)
+        if cached is not None:
+            return cached
+
     # Создаем SQL запрос: SELECT * FROM users WHERE email = ?
-    return db.query(models.User).filter(models.User.email == email).first()
+    db_user = db.query(models.User).filter(models.User.email == email).first()
+
+    if db_user is not None and user_cache is not None:
+        user_cache.put(db_user)
+    return db_user
 
 
 def get_user_by_id(db: Session, user_id: int):
@@ -17,8 +168,74 @@ def get_user_by_id(db: Session, user_id: int):
     🔍 Поиск пользователя по ID в базе данных
     Возвращает пользователя или None если не найден
     """
+    # ⚡ Сначала кэш (если включен) - горячие профили отдаются без запроса к БД
+    user_cache = cache.user_cache
+    if user_cache is not None:
+        cached = user_cache.get_by_id(user_id)
+        if cached is not None:
+            return cached
+
     # Создаем SQL запрос: SELECT * FROM users WHERE id = ?
-    return db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+
+    if db_user is not None and user_cache is not None:
+        user_cache.put(db_user)
+    return db_user
+
+
+def _match_any(db: Session, column, values: list):
+    """
+    🧩 Условие "колонка входит в список" одним параметром
+    PostgreSQL: column = ANY(:values) - один массив вместо N параметров, форма запроса не зависит от длины списка
+    Другие БД: обычный column IN (...)
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        item_type = Integer if column.type.python_type is int else String
+        return column == any_(bindparam(f"{column.key}_values", list(values), type_=ARRAY(item_type)))
+    return column.in_(values)
+
+
+def _get_users_by(db: Session, column, values: list, cache_lookup):
+    """
+    🔍 Пакетный поиск по уникальной колонке (id или email) одним запросом
+    Возвращает список той же длины, что values: пользователь или None, в порядке запроса
+    """
+    user_cache = cache.user_cache
+    found = {}
+
+    # ⚡ Сначала кэш - в БД идут только промахи
+    if user_cache is not None:
+        for value in values:
+            if value not in found:
+                cached = cache_lookup(user_cache, value)
+                if cached is not None:
+                    found[value] = cached
+
+    missing = list(dict.fromkeys(value for value in values if value not in found))
+    if missing:
+        # Один запрос на весь пакет: SELECT * FROM users WHERE id = ANY(?)
+        for db_user in db.query(models.User).filter(_match_any(db, column, missing)):
+            found[getattr(db_user, column.key)] = db_user
+            if user_cache is not None:
+                user_cache.put(db_user)
+
+    return [found.get(value) for value in values]
+
+
+def get_users_by_ids(db: Session, user_ids: List[int]):
+    """
+    📚 Пакетный поиск пользователей по списку ID
+    Возвращает список в порядке user_ids, None для отсутствующих
+    """
+    return _get_users_by(db, models.User.id, user_ids, lambda c, user_id: c.get_by_id(user_id))
+
+
+def get_users_by_emails(db: Session, emails: List[str]):
+    """
+    📚 Пакетный поиск пользователей по списку email
+    Возвращает список в порядке emails, None для отсутствующих
+    """
+    return _get_users_by(db, models.User.email, emails, lambda c, email: c.get_by_email(email))
 
 
 def create_user(db: Session, user: UserCreate):
@@ -26,35 +243,247 @@ def create_user(db: Session, user: UserCreate):
     🆕 Создание нового пользователя в базе данных
     Возвращает созданного пользователя или None если email уже существует
     """
-    # Проверяем нет ли пользователя с таким email
-    db_user = get_user_by_email(db, email=user.email)
-    if db_user:
+    if not supports_on_conflict(db):
+        db_user = _create_user_portable(db, user)
+        if db_user is not None:
+            invalidate_cached_users([(db_user.email, db_user.id)])
+        return db_user
+
+    # Один атомарный запрос вместо SELECT + INSERT + REFRESH
+    stmt = create_user_stmt(db, user)
+    row = db.execute(stmt).first()
+
+    # Сохраняем изменения в базе данных
+    db.commit()
+
+    if row is None:
         return None  # Пользователь с таким email уже существует
 
-    # Создаем новый объект пользователя из данных схемы
-    db_user = models.User(
-        name=user.name,  # Имя пользователя
-        email=user.email,  # Email пользователя
-        bio=user.bio  # Биография (может быть None)
-    )
+    # Собираем объект из RETURNING - повторный SELECT (refresh) не нужен
+    db_user = models.User(**row._mapping)
+    invalidate_cached_users([(db_user.email, db_user.id)])
+    return db_user
+
 
-    # Добавляем пользователя в сессию (подготовка к сохранению)
-    db.add(db_user)
+def create_users_bulk(db: Session, users: List[UserCreate], batch_size: int = BULK_INSERT_BATCH_SIZE):
+    """
+    📦 Массовое создание пользователей
+    Вставляет пачками через INSERT ... ON CONFLICT (email) DO NOTHING RETURNING
+    Возвращает список (email, id) в порядке запроса, id = None для дубликатов
+    """
+    created_ids = {}
+    on_conflict = supports_on_conflict(db)
+    for batch in unique_batches(users, batch_size):
+        if not on_conflict:
+            created_ids.update(_insert_batch_portable(db, batch))
+            continue
+        # Один многострочный INSERT на всю пачку, RETURNING отдает только реально вставленные строки
+        for user_id, email in db.execute(bulk_insert_stmt(db, batch)):
+            created_ids[email] = user_id
 
-    # Сохраняем изменения в базе данных (выполняем INSERT)
+    # Один COMMIT на весь запрос
     db.commit()
 
-    # Обновляем объект из базы данных (получаем сгенерированный ID)
-    db.refresh(db_user)
+    invalidate_cached_users(created_ids.items())
+    return bulk_results(users, created_ids)
+
 
-    return db_user  # Возвращаем созданного пользователя
+def _users_page(query, skip: int, limit: int, after_id: Optional[int]):
+    """Страница пользователей для get_users/get_user_rows: keyset по after_id или OFFSET"""
+    # Сортировка по первичному ключу делает порядок страниц стабильным
+    query = query.order_by(models.User.id)
 
+    if after_id is not None:
+        # 🔖 KEYSET: SELECT * FROM users WHERE id > ? ORDER BY id LIMIT ?
+        # Поиск по индексу первичного ключа - стоимость не зависит от глубины страницы
+        return query.filter(models.User.id > after_id).limit(limit).all()
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
+    # Создаем SQL запрос: SELECT * FROM users ORDER BY id OFFSET ? LIMIT ?
+    # Оставлен для совместимости: на глубоких страницах PostgreSQL читает и отбрасывает все пропущенные строки
+    return query.offset(skip).limit(limit).all()
+
+
+def get_users(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
     """
     📋 Получение списка пользователей с пагинацией
     skip - сколько записей пропустить (для пагинации)
     limit - максимальное количество записей для возврата
+    after_id - ID последней записи предыдущей страницы (keyset-пагинация)
+    """
+    return _users_page(db.query(models.User), skip, limit, after_id)
+
+
+# ⚡ Колонки пользователя в порядке полей схемы ответа User (name, email, bio, id)
+USER_ROW_COLUMNS = tuple(getattr(models.User, field) for field in User.model_fields)
+
+
+def get_user_rows(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    ⚡ Та же страница, что у get_users, но кортежами колонок USER_ROW_COLUMNS
+    ORM объекты не создаются и не попадают в identity map - строки сразу идут в JSON (serialization.py)
+    """
+    return _users_page(db.query(*USER_ROW_COLUMNS), skip, limit, after_id)
+
+
+# 🏷️ Версия таблицы users для ETag списка: новые строки меняют max(id), изменения - max(updated_at).
+# API пользователей не удаляет; если появится удаление, его нужно будет отразить в версии
+USERS_VERSION_COLUMNS = (func.max(models.User.id), func.max(models.User.updated_at))
+
+
+def get_users_version(db: Session):
+    """
+    🏷️ Версия коллекции пользователей: (max id, max updated_at), (None, None) для пустой таблицы
+    Оба агрегата PostgreSQL берет из краев индексов - строки таблицы не читаются
+    """
+    return tuple(db.query(*USERS_VERSION_COLUMNS).one())
+
+
+# 🔢 ОБЩЕЕ ЧИСЛО ПОЛЬЗОВАТЕЛЕЙ (X-Total-Count в GET /users/?count=...)
+# COUNT(*) в PostgreSQL читает всю таблицу (или весь индекс) - время растет вместе с users.
+# Режимы, выбираемые запросом:
+#   exact - COUNT(*), но только для небольших таблиц: если оценка больше USERS_COUNT_EXACT_MAX_ROWS,
+#           отдается оценка (режим в ответе - estimated)
+#   estimated - оценка из каталога pg_class, одна строка независимо от размера users.
+#           В СУБД без такой оценки (SQLite в тестах) - точный подсчет
+#   cached - результат exact из памяти процесса, не старше cache.USERS_COUNT_CACHE_TTL секунд
+USERS_COUNT_MODES = ("exact", "estimated", "cached")
+USERS_COUNT_EXACT_MAX_ROWS = env_int("USERS_COUNT_EXACT_MAX_ROWS", 100_000)
+
+USERS_COUNT_STMT = select(func.count()).select_from(models.User)
+# Как считает сам планировщик: плотность строк на страницу с последнего ANALYZE, умноженная
+# на текущее число страниц - оценка следует за ростом таблицы между автоанализами.
+# NULL, если таблицу еще не анализировали (autovacuum делает это после первых ~50 вставок)
+USERS_ESTIMATE_STMT = text("""
+    SELECT CASE
+        WHEN c.reltuples < 0 OR c.relpages = 0 THEN NULL
+        ELSE c.reltuples / c.relpages * (pg_relation_size(c.oid) / current_setting('block_size')::int)
+    END
+    FROM pg_class c
+    WHERE c.oid = CAST(:table AS regclass)
+""").bindparams(table=models.User.__tablename__)
+USERS_COUNT_CACHE_KEY = "users:count"
+
+
+def count_users(db: Session) -> int:
+    """Точное число пользователей: SELECT count(*) FROM users"""
+    return db.execute(USERS_COUNT_STMT).scalar()
+
+
+def estimate_users_count(db: Session) -> Optional[int]:
+    """Оценка числа пользователей по pg_class или None (не PostgreSQL, таблицу еще не анализировали)"""
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    estimate = db.execute(USERS_ESTIMATE_STMT).scalar()
+    return None if estimate is None else int(estimate)
+
+
+def get_users_total(db: Session, mode: str) -> Tuple[int, str]:
+    """
+    🔢 Общее число пользователей в режиме mode: exact, estimated или cached
+    Возвращает (число, фактический режим): exact на большой таблице становится estimated,
+    cached - только для точного числа
+    """
+    if mode == "cached":
+        total = cache.users_count_cache.get(USERS_COUNT_CACHE_KEY)
+        if total is not None:
+            return total, "cached"
+        total, used_mode = get_users_total(db, "exact")
+        if used_mode == "exact":
+            cache.users_count_cache.set(USERS_COUNT_CACHE_KEY, total)
+            return total, "cached"
+        return total, used_mode
+
+    estimate = estimate_users_count(db)
+    if estimate is not None and (mode == "estimated" or estimate > USERS_COUNT_EXACT_MAX_ROWS):
+        return estimate, "estimated"
+    return count_users(db), "exact"
+
+
+# 🔎 ПОИСК ПОЛЬЗОВАТЕЛЕЙ ПО ИМЕНИ И БИОГРАФИИ
+# Результаты идут уровнями ранжирования, каждый уровень - своим индексом (миграция 0003, PostgreSQL):
+#   0 - имя начинается с q: btree по (lower(name) COLLATE "C", id), порядок по имени
+#   1 - имя содержит q: GIN pg_trgm по lower(name), порядок по id
+#   2 - биография содержит все слова q: GIN по to_tsvector('simple', bio), порядок по id
+# Уровни запрашиваются по очереди с LIMIT оставшегося места на странице: частый префикс - один
+# запрос по btree, а следующие уровни выполняются, только если страница не заполнилась.
+# Курсор хранит уровень и ключ последней строки - keyset внутри уровня
+SEARCH_MIN_SUBSTRING_LENGTH = 3  # Короче - только префикс и слова биографии: триграммы не работают на 1-2 символах
+SEARCH_TS_CONFIG = "simple"  # Конфигурация tsvector - та же, что в индексе миграции 0003
+
+SEARCH_TIER_PREFIX, SEARCH_TIER_SUBSTRING, SEARCH_TIER_BIO = 0, 1, 2
+
+
+def _like_escape(value: str) -> str:
+    """Экранирует спецсимволы LIKE, чтобы % и _ в запросе искались буквально"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_stmts(dialect: str, q: str, after: Optional[Tuple[int, Optional[str], int]] = None):
+    """
+    🧩 SELECT каждого уровня поиска (без LIMIT) в порядке ранжирования
+    Колонки: USER_ROW_COLUMNS, затем tier и name_key для курсора
+    after - (tier, name_key, id) последней строки предыдущей страницы
+    """
+    term = q.strip().lower()
+    lower_name = func.lower(models.User.name)
+    name_key = lower_name
+    if dialect == "postgresql":
+        # Побайтовое сравнение: LIKE 'q%' и ORDER BY идут по одному btree индексу
+        name_key = name_key.collate("C")
+    escaped = _like_escape(term)
+    is_prefix = name_key.like(escaped + "%", escape="\\")
+    # Без COLLATE: триграммный индекс построен на lower(name) с правилом сравнения по умолчанию,
+    # а планировщик берет индекс, только если совпадают и выражение, и правило сравнения
+    is_substring = lower_name.like("%" + escaped + "%", escape="\\")
+
+    if dialect == "postgresql":
+        config = literal_column(f"'{SEARCH_TS_CONFIG}'")
+        document = func.to_tsvector(config, func.coalesce(models.User.bio, literal_column("''")))
+        bio_match = document.op("@@")(func.plainto_tsquery(config, term))
+    else:
+        # SQLite (тесты): все слова запроса есть в биографии целыми словами (разделитель - пробел)
+        bio = " " + func.lower(func.coalesce(models.User.bio, "")) + " "
+        bio_match = and_(*[bio.like("% " + _like_escape(word) + " %", escape="\\") for word in term.split()])
+
+    after_tier = after[0] if after is not None else -1
+    stmts = []
+
+    # 0 - префикс имени
+    if after_tier <= SEARCH_TIER_PREFIX:
+        stmt = select(*USER_ROW_COLUMNS, literal(SEARCH_TIER_PREFIX).label("tier"), name_key.label("name_key"))
+        stmt = stmt.where(is_prefix)
+        if after_tier == SEARCH_TIER_PREFIX:
+            stmt = stmt.where(tuple_(name_key, models.User.id) > tuple_(after[1], after[2]))
+        stmts.append(stmt.order_by(name_key, models.User.id))
+
+    # 1 - подстрока имени (не префикс); короткие запросы дают слишком много совпадений - только префикс и биография
+    substring_tier = len(term) >= SEARCH_MIN_SUBSTRING_LENGTH
+    if after_tier <= SEARCH_TIER_SUBSTRING and substring_tier:
+        stmt = select(*USER_ROW_COLUMNS, literal(SEARCH_TIER_SUBSTRING).label("tier"), null().label("name_key"))
+        stmt = stmt.where(is_substring, ~is_prefix)
+        if after_tier == SEARCH_TIER_SUBSTRING:
+            stmt = stmt.where(models.User.id > after[2])
+        stmts.append(stmt.order_by(models.User.id))
+
+    # 2 - слова в биографии, имя не попало в уровни выше (без уровня 1 исключается только префикс)
+    if term.split():
+        stmt = select(*USER_ROW_COLUMNS, literal(SEARCH_TIER_BIO).label("tier"), null().label("name_key"))
+        stmt = stmt.where(bio_match, ~is_substring if substring_tier else ~is_prefix)
+        if after_tier == SEARCH_TIER_BIO:
+            stmt = stmt.where(models.User.id > after[2])
+        stmts.append(stmt.order_by(models.User.id))
+
+    return stmts
+
+
+def search_users(db: Session, q: str, limit: int = 20, after: Optional[Tuple[int, Optional[str], int]] = None):
+    """
+    🔎 Поиск пользователей: префикс и подстрока имени, слова биографии
+    Возвращает строки (name, email, bio, id, tier, name_key) в порядке ранжирования
     """
-    # Создаем SQL запрос: SELECT * FROM users OFFSET ? LIMIT ?
-    return db.query(models.User).offset(skip).limit(limit).all()
\ No newline at end of file
+    rows = []
+    for stmt in search_stmts(db.get_bind().dialect.name, q, after):
+        rows += db.execute(stmt.limit(limit - len(rows))).all()
+        if len(rows) == limit:
+            break
+    return rows
@@ -0,0 +1,165 @@
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import cache, models
+from app.crud import (
+    BULK_INSERT_BATCH_SIZE,
+    USER_ROW_COLUMNS,
+    USERS_COUNT_CACHE_KEY,
+    USERS_COUNT_EXACT_MAX_ROWS,
+    USERS_COUNT_STMT,
+    USERS_ESTIMATE_STMT,
+    USERS_VERSION_COLUMNS,
+    bulk_insert_stmt,
+    bulk_results,
+    create_user_stmt,
+    invalidate_cached_users,
+    search_stmts,
+    unique_batches,
+)
+from app.schemas import UserCreate
+
+# ⚡ АСИНХРОННЫЕ CRUD ОПЕРАЦИИ
+# Те же запросы, что и в crud.py, но через AsyncSession: пока PostgreSQL отвечает,
+# event loop обслуживает другие запросы вместо блокировки потока
+
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    """
+    🔍 Поиск пользователя по email в базе данных
+    Возвращает пользователя или None если не найден
+    """
+    user_cache = cache.user_cache
+    if user_cache is not None:
+        cached = user_cache.get_by_email(email)
+        if cached is not None:
+            return cached
+
+    # SELECT * FROM users WHERE email = ? LIMIT 1
+    result = await db.execute(select(models.User).where(models.User.email == email).limit(1))
+    db_user = result.scalars().first()
+
+    if db_user is not None and user_cache is not None:
+        user_cache.put(db_user)
+    return db_user
+
+
+async def get_user_by_id(db: AsyncSession, user_id: int):
+    """
+    🔍 Поиск пользователя по ID в базе данных
+    Возвращает пользователя или None если не найден
+    """
+    user_cache = cache.user_cache
+    if user_cache is not None:
+        cached = user_cache.get_by_id(user_id)
+        if cached is not None:
+            return cached
+
+    # SELECT * FROM users WHERE id = ? LIMIT 1
+    result = await db.execute(select(models.User).where(models.User.id == user_id).limit(1))
+    db_user = result.scalars().first()
+
+    if db_user is not None and user_cache is not None:
+        user_cache.put(db_user)
+    return db_user
+
+
+async def create_user(db: AsyncSession, user: UserCreate):
+    """
+    🆕 Создание нового пользователя в базе данных
+    Возвращает созданного пользователя или None если email уже существует
+    """
+    # Один атомарный INSERT ... ON CONFLICT (email) DO NOTHING RETURNING *
+    result = await db.execute(create_user_stmt(db, user))
+    row = result.first()
+
+    await db.commit()
+
+    if row is None:
+        return None  # Пользователь с таким email уже существует
+
+    db_user = models.User(**row._mapping)
+    invalidate_cached_users([(db_user.email, db_user.id)])
+    return db_user
+
+
+async def create_users_bulk(db: AsyncSession, users: List[UserCreate], batch_size: int = BULK_INSERT_BATCH_SIZE):
+    """
+    📦 Массовое создание пользователей пачками
+    Возвращает список (email, id) в порядке запроса, id = None для дубликатов
+    """
+    created_ids = {}
+    for batch in unique_batches(users, batch_size):
+        result = await db.execute(bulk_insert_stmt(db, batch))
+        for user_id, email in result:
+            created_ids[email] = user_id
+
+    await db.commit()
+
+    invalidate_cached_users(created_ids.items())
+    return bulk_results(users, created_ids)
+
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    📋 Получение списка пользователей с пагинацией
+    skip - сколько записей пропустить (для пагинации)
+    limit - максимальное количество записей для возврата
+    after_id - ID последней записи предыдущей страницы (keyset-пагинация)
+    """
+    result = await db.execute(_users_page_stmt(select(models.User), skip, limit, after_id))
+    return result.scalars().all()
+
+
+async def get_user_rows(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """⚡ Асинхронный аналог crud.get_user_rows - страница кортежами колонок"""
+    result = await db.execute(_users_page_stmt(select(*USER_ROW_COLUMNS), skip, limit, after_id))
+    return result.all()
+
+
+async def get_users_version(db: AsyncSession):
+    """🏷️ Асинхронный аналог crud.get_users_version"""
+    result = await db.execute(select(*USERS_VERSION_COLUMNS))
+    return tuple(result.one())
+
+
+async def get_users_total(db: AsyncSession, mode: str) -> Tuple[int, str]:
+    """🔢 Асинхронный аналог crud.get_users_total"""
+    if mode == "cached":
+        total = cache.users_count_cache.get(USERS_COUNT_CACHE_KEY)
+        if total is not None:
+            return total, "cached"
+        total, used_mode = await get_users_total(db, "exact")
+        if used_mode == "exact":
+            cache.users_count_cache.set(USERS_COUNT_CACHE_KEY, total)
+            return total, "cached"
+        return total, used_mode
+
+    estimate = None
+    if db.get_bind().dialect.name == "postgresql":
+        estimate = (await db.execute(USERS_ESTIMATE_STMT)).scalar()
+    if estimate is not None and (mode == "estimated" or estimate > USERS_COUNT_EXACT_MAX_ROWS):
+        return int(estimate), "estimated"
+    return (await db.execute(USERS_COUNT_STMT)).scalar(), "exact"
+
+
+async def search_users(db: AsyncSession, q: str, limit: int = 20, after: Optional[Tuple[int, Optional[str], int]] = None):
+    """🔎 Асинхронный аналог crud.search_users"""
+    rows = []
+    for stmt in search_stmts(db.get_bind().dialect.name, q, after):
+        result = await db.execute(stmt.limit(limit - len(rows)))
+        rows += result.all()
+        if len(rows) == limit:
+            break
+    return rows
+
+
+def _users_page_stmt(stmt, skip: int, limit: int, after_id: Optional[int]):
+    """Страница пользователей: keyset по after_id или OFFSET"""
+    stmt = stmt.order_by(models.User.id).limit(limit)
+
+    if after_id is not None:
+        # 🔖 KEYSET: WHERE id > ? ORDER BY id LIMIT ?
+        return stmt.where(models.User.id > after_id)
+    return stmt.offset(skip)
@@ -0,0 +1,67 @@
+import csv  # Для формата CSV
+import io  # Буфер для csv.writer
+import json  # Для формата NDJSON
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import models
+
+# 📤 ПОТОКОВАЯ ВЫГРУЗКА ПОЛЬЗОВАТЕЛЕЙ
+# Строки читаются серверным курсором пачками по EXPORT_BATCH_SIZE и сразу отдаются клиенту,
+# поэтому память процесса не растет вместе с таблицей
+
+EXPORT_BATCH_SIZE = 1000
+
+# Колонки выгрузки - те же поля, что в схеме ответа User
+EXPORT_COLUMNS = (models.User.id, models.User.name, models.User.email, models.User.bio)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+# Форматы выгрузки: формат -> (media type, расширение файла)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+def iter_user_batches(db: Session, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    🔄 Пачки строк таблицы users в порядке id
+    stream_results включает серверный курсор PostgreSQL (psycopg2 named cursor),
+    yield_per ограничивает число строк в памяти одной пачкой.
+    Выбираются кортежи колонок, а не ORM объекты - ничего не копится в identity map
+    """
+    stmt = (
+        select(*EXPORT_COLUMNS)
+        .order_by(models.User.id)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    result = db.execute(stmt)
+    try:
+        for batch in result.partitions():
+            yield batch
+    finally:
+        result.close()
+
+
+def stream_ndjson(db: Session, batch_size: int = EXPORT_BATCH_SIZE):
+    """📄 NDJSON: одна строка JSON на пользователя, один чанк ответа на пачку"""
+    for batch in iter_user_batches(db, batch_size):
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + "\n"
+            for row in batch
+        )
+
+
+def stream_csv(db: Session, batch_size: int = EXPORT_BATCH_SIZE):
+    """📊 CSV: заголовок сразу (первый байт не ждет БД), затем один чанк на пачку"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.getvalue()
+
+    for batch in iter_user_batches(db, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
@@ -0,0 +1,77 @@
+import hashlib  # Короткий хэш для ETag
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime  # Формат дат HTTP
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.database import env_int
+
+# 🏷️ HTTP КЭШИРОВАНИЕ ЧТЕНИЯ ПОЛЬЗОВАТЕЛЕЙ
+# GET /users/ и GET /users/{user_id} отдают ETag, Last-Modified и Cache-Control. Клиент, который
+# опрашивает список (React UserList), присылает If-None-Match и при неизменных данных получает
+# пустой 304 Not Modified: для списка это один запрос max(id), max(updated_at) по индексам,
+# без чтения строк и сериализации.
+# ETag слабый (W/): тело может отличаться байтами (сжатие), но не смыслом
+
+# Сколько секунд клиент может не перепроверять ответ; 0 - перепроверять каждый раз (no-cache)
+HTTP_CACHE_MAX_AGE = env_int("HTTP_CACHE_MAX_AGE", 0)
+
+# Меняется вместе с форматом ответа, чтобы старые ETag клиентов перестали совпадать
+REPRESENTATION_VERSION = 1
+
+
+def make_etag(*parts) -> str:
+    """Слабый ETag из частей версии ресурса (id, updated_at, параметры страницы...)"""
+    raw = "|".join(str(part) for part in (REPRESENTATION_VERSION,) + parts)
+    return f'W/"{hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()}"'
+
+
+def _as_utc(moment: datetime) -> datetime:
+    # SQLite возвращает CURRENT_TIMESTAMP без часового пояса - это UTC
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    """Заголовки ответа: одинаковые для 200 и 304"""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={HTTP_CACHE_MAX_AGE}" if HTTP_CACHE_MAX_AGE > 0 else "private, no-cache",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def _opaque_tag(tag: str) -> str:
+    # Слабое сравнение (RFC 9110, 8.8.3.2): префикс W/ не учитывается
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    🔁 Можно ли ответить 304
+    If-None-Match важнее If-Modified-Since; If-Modified-Since сравнивается с точностью до секунды
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return _opaque_tag(etag) in {_opaque_tag(tag) for tag in if_none_match.split(",")}
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False  # Некорректная дата игнорируется, как требует RFC
+    return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(since)
+
+
+def not_modified_response(headers: dict) -> Response:
+    """Пустой 304 с теми же ETag/Cache-Control/Last-Modified, что у полного ответа"""
+    return Response(status_code=304, headers=headers)
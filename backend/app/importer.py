@@ -0,0 +1,168 @@
+import csv  # Для формата CSV
+import io  # Буфер для COPY
+import json  # Для формата NDJSON
+from typing import Callable, List, Optional, TextIO, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app import crud
+from app.schemas import EMAIL_MAX_LENGTH, NAME_MAX_LENGTH, ImportReport, ImportRowError, UserCreate
+
+# 📥 МАССОВЫЙ ИМПОРТ ПОЛЬЗОВАТЕЛЕЙ ИЗ CSV/NDJSON
+# Файл читается потоком, строки валидируются схемой UserCreate пачками по IMPORT_CHUNK_SIZE.
+# На PostgreSQL пачка грузится через COPY во временную staging таблицу и сливается в users
+# одним INSERT ... SELECT ... ON CONFLICT (email) DO NOTHING. На других БД (SQLite в тестах)
+# используется многострочный INSERT из crud.create_users_bulk
+
+IMPORT_CHUNK_SIZE = 50000
+IMPORT_MAX_REPORTED_ERRORS = 100  # Сколько ошибок валидации вернуть в отчете
+IMPORT_FORMATS = ("csv", "ndjson")
+
+STAGING_TABLE = "users_import_staging"
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    """Формат по расширению файла: .csv -> csv, .ndjson/.jsonl -> ndjson"""
+    if not filename:
+        return None
+    name = filename.lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+def iter_records(stream: TextIO, file_format: str):
+    """
+    🔄 Строки файла как (номер строки, данные)
+    Для NDJSON нераспознанная строка отдается как (номер, None) и попадет в отклоненные
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # В CSV нет NULL: пустое поле считаем отсутствующим значением
+            yield reader.line_num, {key: (value if value != "" else None) for key, value in record.items()}
+    elif file_format == "ndjson":
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_num, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    """Короткое описание ошибок валидации: 'email: value is not a valid email address'"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+def _copy_csv_field(value) -> str:
+    """
+    Поле CSV для COPY: None - пустое поле без кавычек (NULL в CSV формате COPY),
+    любое значение - в кавычках, так пустая строка остается пустой строкой, как в INSERT на других БД
+    """
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_to_staging(db: Session, rows: List[Tuple[int, UserCreate]]) -> int:
+    """
+    🚚 PostgreSQL: COPY пачки в staging таблицу и слияние в users
+    Возвращает число реально вставленных строк
+    """
+    db.execute(text(
+        f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} "
+        f"(line bigint, name varchar({NAME_MAX_LENGTH}), email varchar({EMAIL_MAX_LENGTH}), bio text) ON COMMIT DELETE ROWS"
+    ))
+
+    buffer = io.StringIO()
+    for line_num, user in rows:
+        buffer.write(",".join(_copy_csv_field(value) for value in (line_num, user.name, user.email, user.bio)) + "\n")
+
+    copy_sql = f"COPY {STAGING_TABLE} (line, name, email, bio) FROM STDIN WITH (FORMAT csv)"
+    cursor = db.connection().connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):
+            # psycopg2
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+        else:
+            # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+    # DISTINCT ON: при повторе email внутри пачки побеждает первая строка файла
+    result = db.execute(text(
+        "INSERT INTO users (name, email, bio) "
+        f"SELECT DISTINCT ON (email) name, email, bio FROM {STAGING_TABLE} ORDER BY email, line "
+        "ON CONFLICT (email) DO NOTHING"
+    ))
+    return result.rowcount
+
+
+def _load_chunk(db: Session, rows: List[Tuple[int, UserCreate]]) -> int:
+    """Грузит пачку валидных строк и коммитит; возвращает число вставленных"""
+    if db.get_bind().dialect.name == "postgresql":
+        inserted = _copy_to_staging(db, rows)
+        db.commit()  # ON COMMIT DELETE ROWS очищает staging
+        return inserted
+
+    created = crud.create_users_bulk(db, [user for _, user in rows])
+    return sum(1 for _, user_id in created if user_id is not None)
+
+
+def import_users(
+    db: Session,
+    stream: TextIO,
+    file_format: str,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    progress: Optional[Callable[[ImportReport], None]] = None,
+) -> ImportReport:
+    """
+    📥 Импорт пользователей из текстового потока CSV или NDJSON
+    - progress вызывается после каждой загруженной пачки с текущим отчетом
+    - Возвращает итоговый отчет: вставлено, дубликаты, отклонено и первые ошибки
+    """
+    report = ImportReport()
+    chunk: List[Tuple[int, UserCreate]] = []
+
+    def flush():
+        inserted = _load_chunk(db, chunk)
+        report.inserted += inserted
+        report.duplicates += len(chunk) - inserted
+        chunk.clear()
+        if progress is not None:
+            progress(report)
+
+    for line_num, record in iter_records(stream, file_format):
+        report.processed += 1
+        try:
+            if record is None:
+                raise ValueError("row is not a JSON object")
+            chunk.append((line_num, UserCreate.model_validate(record)))
+        except (ValidationError, ValueError) as exc:
+            report.rejected += 1
+            if len(report.errors) < IMPORT_MAX_REPORTED_ERRORS:
+                message = _format_validation_error(exc) if isinstance(exc, ValidationError) else str(exc)
+                report.errors.append(ImportRowError(line=line_num, error=message))
+            continue
+
+        if len(chunk) >= chunk_size:
+            flush()
+
+    if chunk:
+        flush()
+
+    return report
@@ -1,20 +1,56 @@
 # Импорт необходимых компонентов FastAPI и зависимостей
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool  # Блокирующие вызовы БД из lifespan
 from fastapi.middleware.cors import CORSMiddleware  # Для CORS (междоменных запросов)
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse  # Ответы с произвольным статусом, текстовые и потоковые
+from sqlalchemy import text  # Для сырых SQL запросов (проверка соединения)
+from sqlalchemy.exc import SQLAlchemyError  # Базовая ошибка SQLAlchemy
 from sqlalchemy.orm import Session  # Для типизации сессии БД
-from typing import List  # Для типизации списков
+from typing import List, Literal, Optional  # Для типизации списков и опциональных параметров
+import io  # Для чтения загруженного файла как текста
+from contextlib import asynccontextmanager  # Для lifespan приложения
+import anyio  # Размер threadpool для def обработчиков
 
 # 📦 ИМПОРТЫ ИЗ ПРОЕКТА
-from app import models, schemas, crud  # Модели, схемы и CRUD операции
-from app.database import engine, get_db  # Движок БД и генератор сессий
+from app import schemas, crud  # Схемы и CRUD операции
+from app import cache  # Кэш пользователей (статистика для /health/cache)
+from app import export  # Потоковая выгрузка пользователей
+from app import importer  # Массовый импорт пользователей
+from app import metrics  # Метрики запросов и БД (/metrics, Server-Timing)
+from app import serialization  # Быстрая сериализация списка пользователей
+from app import http_cache  # ETag, Last-Modified и 304 для чтения пользователей
+from app import compression  # Сжатие ответов (gzip, br, zstd)
+from app.database import get_db, pool_status, DB_ASYNC, THREADPOOL_SIZE  # Генератор сессий, статистика пула
+from app.database import warm_up_pool, warm_up_async_pool, dispose_engines, dispose_async_engine  # Lifespan
+from app.database import get_read_db, mark_read_primary  # Чтение с реплик и read-your-own-writes
+from app.pagination import encode_cursor, decode_cursor  # Курсоры keyset-пагинации
+from app.pagination import encode_search_cursor, decode_search_cursor  # Курсоры поиска
+
+# 🗃️ СХЕМА БАЗЫ ДАННЫХ
+# Таблицы создают миграции Alembic (python migrate.py), а не импорт приложения:
+# воркер стартует без обращения к БД, а схема меняется явно и версионируется
+
+
+# 🔥 ЖИЗНЕННЫЙ ЦИКЛ ВОРКЕРА
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Старт: размер threadpool по пулу (THREADPOOL_SIZE, если задан или --prod) и прогрев пула соединений (DB_POOL_WARMUP)
+    Остановка (после того как uvicorn дождался текущих запросов): закрытие соединений
+    """
+    if THREADPOOL_SIZE > 0:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    await run_in_threadpool(warm_up_pool)
+    if DB_ASYNC:
+        await warm_up_async_pool()
+    yield
+    await run_in_threadpool(dispose_engines)
+    if DB_ASYNC:
+        await dispose_async_engine()
 
-# 🗃️ СОЗДАНИЕ ТАБЛИЦ В БАЗЕ ДАННЫХ
-# Автоматически создает все таблицы на основе SQLAlchemy моделей
-# В продакшене обычно используются миграции (Alembic)
-models.Base.metadata.create_all(bind=engine)
 
 # 🚀 СОЗДАНИЕ FASTAPI ПРИЛОЖЕНИЯ
-app = FastAPI(title="User Management API")  # С заголовком для документации
+app = FastAPI(title="User Management API", lifespan=lifespan)  # С заголовком для документации
 
 # 🌐 НАСТРОЙКА CORS (CROSS-ORIGIN RESOURCE SHARING)
 # Разрешает запросы с фронтенда (React на порту 3000)
@@ -24,8 +60,28 @@ app.add_middleware(
     allow_credentials=True,  # Разрешить куки и авторизацию
     allow_methods=["*"],  # Разрешить все HTTP методы (GET, POST, etc.)
     allow_headers=["*"],  # Разрешить все заголовки
+    # Фронтенд должен видеть курсор следующей страницы, ETag и общее число ("страница X из Y")
+    expose_headers=["X-Next-Cursor", "ETag", "X-Total-Count", "X-Total-Count-Mode"],
 )
 
+# 🗜️ СЖАТИЕ ОТВЕТОВ (COMPRESSION_ENABLED=false - выключить, например если сжимает балансировщик)
+# Внутри метрик: время сжатия попадает в длительность запроса
+if compression.COMPRESSION_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+
+# ⏱️ МЕТРИКИ ЗАПРОСОВ (METRICS_ENABLED=false - выключить)
+# Добавлен последним, значит выполняется первым и меряет запрос целиком, включая CORS
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+
+# ⚡ АСИНХРОННЫЙ РЕЖИМ (DB_ASYNC=true)
+# Async-версии эндпоинтов пользователей регистрируются раньше синхронных:
+# маршруты проверяются по порядку, поэтому запросы уходят в async def обработчики
+if DB_ASYNC:
+    from app.async_api import router as async_users_router
+    app.include_router(async_users_router)
+
 
 # 🏠 КОРНЕВОЙ ЭНДПОИНТ - ПРОВЕРКА РАБОТОСПОСОБНОСТИ API
 @app.get("/")
@@ -34,13 +90,54 @@ def read_root():
     return {"message": "User Management API is running"}
 
 
+# 📈 МЕТРИКИ В ФОРМАТЕ PROMETHEUS
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """Счетчики и гистограммы запросов по маршрутам, время в БД и ожидание пула"""
+    return PlainTextResponse(metrics.metrics_registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# 🩺 ПРОВЕРКА СОСТОЯНИЯ БАЗЫ ДАННЫХ И ПУЛА СОЕДИНЕНИЙ
+@app.get("/health/db")
+def health_db(db: Session = Depends(get_db)):
+    """
+    Проверяет доступность БД и показывает загрузку пула соединений
+    - checkedin: свободные соединения в пуле
+    - checkedout: соединения, выданные запросам
+    - overflow: соединения сверх pool_size
+    - При недоступной БД возвращает 503
+    """
+    pool = pool_status(db.get_bind())
+    try:
+        db.execute(text("SELECT 1"))
+    except SQLAlchemyError:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "unavailable", "pool": pool}
+        )
+    return {"status": "ok", "pool": pool}
+
+
+# 🧠 СТАТИСТИКА КЭША ПОЛЬЗОВАТЕЛЕЙ
+@app.get("/health/cache")
+def health_cache():
+    """
+    Показывает состояние кэша пользователей (USER_CACHE_ENABLED)
+    - hits/misses/hit_ratio: попадания и промахи
+    - size/maxsize: заполненность кэша в памяти
+    """
+    if cache.user_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.user_cache.stats()}
+
+
 # 👤 СОЗДАНИЕ НОВОГО ПОЛЬЗОВАТЕЛЯ
 @app.post("/users/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+def create_user(user: schemas.UserCreate, response: Response, db: Session = Depends(get_db)):
     """
     Создает нового пользователя в системе
     - Валидирует данные через схему UserCreate
-    - Проверяет уникальность email
+    - Проверяет уникальность email атомарно одним INSERT ... ON CONFLICT (без гонки при параллельных регистрациях)
     - Возвращает созданного пользователя
     """
     # Вызываем CRUD операцию для создания пользователя
@@ -54,37 +151,292 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
             detail="Email already registered"
         )
 
+    # Следующие чтения клиента идут на primary, где запись уже видна
+    mark_read_primary(response)
+
     # Возвращаем созданного пользователя (автоматически конвертируется в JSON)
     return db_user
 
 
+# 📦 МАССОВОЕ СОЗДАНИЕ ПОЛЬЗОВАТЕЛЕЙ
+@app.post("/users/bulk", response_model=schemas.BulkUserResponse)
+def create_users_bulk(users: List[schemas.UserCreate], response: Response, db: Session = Depends(get_db)):
+    """
+    Создает много пользователей за один запрос (ночная синхронизация)
+    - Валидирует каждый элемент через схему UserCreate
+    - Вставляет пачками: один INSERT ... ON CONFLICT на пачку, а не четыре запроса на пользователя
+    - Возвращает статус created/duplicate по каждому элементу в порядке запроса
+    """
+    created = crud.create_users_bulk(db, users)
+
+    results = [
+        schemas.BulkUserResult(
+            email=email,
+            status="duplicate" if user_id is None else "created",
+            id=user_id
+        )
+        for email, user_id in created
+    ]
+    created_count = sum(1 for result in results if result.status == "created")
+    mark_read_primary(response)
+
+    return schemas.BulkUserResponse(
+        created=created_count,
+        duplicates=len(results) - created_count,
+        results=results
+    )
+
+
+# 📥 ИМПОРТ ПОЛЬЗОВАТЕЛЕЙ ИЗ ФАЙЛА
+@app.post("/users/import", response_model=schemas.ImportReport)
+def import_users_file(
+    response: Response,
+    file: UploadFile = File(...),
+    import_format: Optional[Literal["csv", "ndjson"]] = Query(None, alias="format"),
+    db: Session = Depends(get_db),
+):
+    """
+    Импортирует пользователей из загруженного CSV или NDJSON файла
+    - Формат берется из ?format= или из расширения файла
+    - Строки валидируются схемой UserCreate, невалидные попадают в отчет
+    - На PostgreSQL данные грузятся через COPY пачками
+    """
+    file_format = import_format or importer.detect_format(file.filename)
+    if file_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot detect file format, pass ?format=csv or ?format=ndjson"
+        )
+
+    # Файл уже лежит во временном файле - читаем его потоком как текст
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        report = importer.import_users(db, stream, file_format)
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be UTF-8 encoded"
+        )
+    finally:
+        # Отвязываем обертку, чтобы закрытием файла управлял FastAPI
+        stream.detach()
+
+    mark_read_primary(response)
+    return report
+
+
 # 📋 ПОЛУЧЕНИЕ СПИСКА ПОЛЬЗОВАТЕЛЕЙ С ПАГИНАЦИЕЙ
 @app.get("/users/", response_model=List[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_users(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count: Optional[Literal["exact", "estimated", "cached"]] = None,
+    db: Session = Depends(get_read_db),
+):
     """
     Возвращает список пользователей с поддержкой пагинации
     - skip: сколько записей пропустить (для постраничного вывода)
     - limit: максимальное количество записей (по умолчанию 100)
+    - cursor: курсор из заголовка X-Next-Cursor предыдущей страницы (keyset-пагинация, skip игнорируется)
+    - If-None-Match с ETag прошлого ответа: 304 без чтения строк, если таблица не менялась
+    - count=exact|estimated|cached: общее число пользователей в X-Total-Count, фактический режим -
+      в X-Total-Count-Mode (точный подсчет только для небольших таблиц, см. crud.get_users_total)
     """
+    after_id = None
+    if cursor is not None:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError:
+            # Поврежденный курсор - ошибка клиента, а не сервера
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+
+    # 🏷️ Версия читается до страницы: при гонке с записью ETag может оказаться старше данных
+    # (клиент лишний раз перечитает страницу), но никогда не новее
+    # count входит в ETag: 304 приходит без тела и без X-Total-Count, поэтому ответ с числом - другой ресурс
+    max_id, max_updated_at = crud.get_users_version(db)
+    etag = http_cache.make_etag("users", max_id, max_updated_at, skip, limit, after_id, count)
+    headers = http_cache.cache_headers(etag, max_updated_at)
+    if http_cache.is_not_modified(request, etag, max_updated_at):
+        return http_cache.not_modified_response(headers)
+
+    # 🔢 Общее число - только по запросу: без ?count= список не платит за подсчет (crud.get_users_total)
+    if count is not None:
+        total, count_mode = crud.get_users_total(db, count)
+        headers["X-Total-Count"] = str(total)
+        headers["X-Total-Count-Mode"] = count_mode
+
+    if serialization.FAST_SERIALIZATION:
+        # ⚡ Кортежи колонок сразу в JSON, без ORM объектов и валидации response_model (serialization.py)
+        rows = crud.get_user_rows(db, skip=skip, limit=limit, after_id=after_id)
+        if rows and len(rows) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
+        # Заголовки передаются в сам ответ: у возвращенного Response заголовки из response не применяются
+        return serialization.UserRowsResponse(rows, headers=headers)
+
+    response.headers.update(headers)
+
     # Получаем пользователей через CRUD с пагинацией
-    users = crud.get_users(db, skip=skip, limit=limit)
+    users = crud.get_users(db, skip=skip, limit=limit, after_id=after_id)
+
+    # 🔖 Полная страница - возможно есть следующая, отдаем курсор в заголовке
+    # Тело ответа остается списком, чтобы не ломать существующих клиентов
+    if users and len(users) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(users[-1].id)
+
     return users
 
 
+# 📤 ПОТОКОВАЯ ВЫГРУЗКА ВСЕХ ПОЛЬЗОВАТЕЛЕЙ
+# Объявлен раньше /users/{user_id}, иначе "export" попадет в user_id
+@app.get("/users/export")
+def export_users(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Выгружает всю таблицу пользователей потоком
+    - format=ndjson (по умолчанию): одна JSON строка на пользователя
+    - format=csv: CSV с заголовком id,name,email,bio
+    - Строки читаются серверным курсором пачками, память не растет вместе с таблицей
+    """
+    media_type, extension = export.EXPORT_FORMATS[export_format]
+    stream = export.stream_csv(db) if export_format == "csv" else export.stream_ndjson(db)
+
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{extension}"'}
+    )
+
+
+def _batch_lookup(db: Session, ids: List[int], emails: List[str]) -> dict:
+    """
+    Собирает ответ пакетного поиска: найденные пользователи в порядке запроса
+    и явные списки отсутствующих id и email
+    """
+    by_id = crud.get_users_by_ids(db, ids) if ids else []
+    by_email = crud.get_users_by_emails(db, emails) if emails else []
+
+    # Пользователь, запрошенный и по id, и по email, попадает в ответ один раз
+    users, seen = [], set()
+    for db_user in by_id + by_email:
+        if db_user is not None and db_user.id not in seen:
+            seen.add(db_user.id)
+            users.append(db_user)
+
+    return {
+        "users": users,
+        "missing_ids": list(dict.fromkeys(i for i, u in zip(ids, by_id) if u is None)),
+        "missing_emails": list(dict.fromkeys(e for e, u in zip(emails, by_email) if u is None)),
+    }
+
+
+# 📚 ПАКЕТНОЕ ПОЛУЧЕНИЕ ПОЛЬЗОВАТЕЛЕЙ ПО СПИСКУ ID
+# Объявлен раньше /users/{user_id}, иначе "batch" попадет в user_id
+@app.get("/users/batch", response_model=schemas.UserBatchResponse)
+def read_users_batch(ids: List[int] = Query(...), db: Session = Depends(get_read_db)):
+    """
+    Возвращает пользователей по списку ID одним запросом к БД
+    - ids: повторяющийся параметр (?ids=1&ids=2), не больше BATCH_LOOKUP_MAX_ITEMS
+    - Порядок ответа совпадает с порядком ids, отсутствующие перечислены в missing_ids
+    """
+    if len(ids) > schemas.BATCH_LOOKUP_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many ids, max {schemas.BATCH_LOOKUP_MAX_ITEMS}"
+        )
+    return _batch_lookup(db, ids, [])
+
+
+# 🔎 ПАКЕТНЫЙ ПОИСК ПОЛЬЗОВАТЕЛЕЙ ПО ID И EMAIL
+@app.post("/users/lookup", response_model=schemas.UserBatchResponse)
+def lookup_users(lookup: schemas.UserLookup, db: Session = Depends(get_read_db)):
+    """
+    Ищет пользователей по спискам ID и email (для React UserList и внутренних сервисов)
+    - Один запрос к БД на каждый непустой список вместо запроса на пользователя
+    - Порядок ответа: сначала по ids, затем по emails; отсутствующие - в missing_ids / missing_emails
+    """
+    return _batch_lookup(db, lookup.ids, lookup.emails)
+
+
+# 🔎 ПОИСК ПОЛЬЗОВАТЕЛЕЙ ПО ИМЕНИ И БИОГРАФИИ
+# Объявлен раньше /users/{user_id}, иначе "search" попадет в user_id
+@app.get("/users/search", response_model=List[schemas.User])
+def search_users(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=schemas.SEARCH_QUERY_MAX_LENGTH),
+    limit: int = Query(20, ge=1, le=schemas.SEARCH_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """
+    Ищет пользователей: сначала имена, начинающиеся с q, затем имена, содержащие q (от 3 символов),
+    затем пользователи, в биографии которых есть все слова q
+    - limit: размер страницы (до SEARCH_MAX_LIMIT)
+    - cursor: курсор из заголовка X-Next-Cursor предыдущей страницы
+    """
+    if not q.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty search query")
+
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_search_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    # Строки (name, email, bio, id, tier, name_key): первые четыре - поля User, остальные - для курсора
+    rows = crud.search_users(db, q, limit=limit, after=after)
+    headers = {}
+    if rows and len(rows) == limit:
+        headers["X-Next-Cursor"] = encode_search_cursor(rows[-1].tier, rows[-1].name_key, rows[-1].id)
+
+    if serialization.FAST_SERIALIZATION:
+        return serialization.UserRowsResponse(rows, headers=headers)
+    response.headers.update(headers)
+    return rows
+
+
 # 🔍 ПОЛУЧЕНИЕ КОНКРЕТНОГО ПОЛЬЗОВАТЕЛЯ ПО ID
 @app.get("/users/{user_id}", response_model=schemas.User)
-def read_user(user_id: int, db: Session = Depends(get_db)):
+def read_user(
+    user_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    primary_db: Session = Depends(get_db),
+):
     """
     Возвращает пользователя по его ID
+    - Читает с реплики, если они настроены
     - Если пользователь не найден, возвращает 404 ошибку
+    - If-None-Match с ETag прошлого ответа: 304 без тела, если пользователь не менялся
     """
     # Ищем пользователя в базе данных
     db_user = crud.get_user_by_id(db, user_id=user_id)
 
+    # Реплика могла еще не получить только что созданного пользователя - перепроверяем на primary
+    # (сессия primary ленивая: соединение берется только здесь)
+    if db_user is None and db is not primary_db:
+        db_user = crud.get_user_by_id(primary_db, user_id=user_id)
+
     # Если пользователь не найден
     if db_user is None:
         # Возвращаем ошибку 404 Not Found
         raise HTTPException(status_code=404, detail="User not found")
 
+    # 🏷️ ETag по id и updated_at (берется и из кэша пользователей - тогда без запроса к БД)
+    etag = http_cache.make_etag("user", db_user.id, db_user.updated_at)
+    headers = http_cache.cache_headers(etag, db_user.updated_at)
+    if http_cache.is_not_modified(request, etag, db_user.updated_at):
+        return http_cache.not_modified_response(headers)
+    response.headers.update(headers)
+
     # Возвращаем найденного пользователя
     return db_user
\ No newline at end of file
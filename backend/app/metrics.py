@@ -0,0 +1,193 @@
+import threading  # Для потокобезопасного обновления счетчиков
+import time  # Для замера длительности запроса
+from bisect import bisect_left  # Поиск корзины гистограммы
+from collections import defaultdict
+from typing import Dict, Optional, Sequence, Tuple
+
+from app.database import DBStats, env_bool, created_engines, current_db_stats, pool_status
+
+# 📈 МЕТРИКИ ЗАПРОСОВ И БАЗЫ ДАННЫХ
+# MetricsMiddleware меряет каждый HTTP запрос: длительность, число SQL запросов, время в БД
+# и ожидание соединения из пула (счетчики БД копят хуки из database.py). Метрики отдаются
+# на /metrics в текстовом формате Prometheus, а по каждому ответу - в заголовке Server-Timing.
+# Метрики живут в памяти процесса: при нескольких воркерах uvicorn Prometheus опрашивает
+# каждый процесс отдельно (или их агрегирует прокси)
+
+METRICS_ENABLED = env_bool("METRICS_ENABLED", True)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNMATCHED_ROUTE = "<unmatched>"  # Метка для 404 - не плодим серии на каждый случайный путь
+
+# Границы корзин гистограмм (верхние, включительно)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """📊 Гистограмма Prometheus: счетчики по корзинам, сумма и число наблюдений"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Пары (le, накопленный счетчик) как в формате Prometheus"""
+        total = 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            total += count
+            yield bound, total
+
+
+# Гистограммы на маршрут: имя метрики -> (описание, корзины)
+HISTOGRAMS = {
+    "http_request_duration_seconds": ("HTTP request latency", LATENCY_BUCKETS),
+    "db_queries_per_request": ("SQL statements executed per HTTP request", QUERY_COUNT_BUCKETS),
+    "db_time_per_request_seconds": ("Time spent in SQL statements per HTTP request", DB_TIME_BUCKETS),
+    "db_pool_wait_seconds": ("Time spent waiting for a pooled DB connection per HTTP request", POOL_WAIT_BUCKETS),
+}
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """
+    🗂️ Метрики процесса по маршрутам
+    Маршрут - шаблон пути (/users/{user_id}), а не сам путь, чтобы число серий было ограничено
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+
+    def _histogram(self, name: str, method: str, route: str) -> Histogram:
+        key = (name, method, route)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(HISTOGRAMS[name][1])
+        return histogram
+
+    def observe(self, method: str, route: str, status_code: int, duration: float, stats: DBStats) -> None:
+        """Записывает один завершенный запрос"""
+        with self._lock:
+            self._requests[(method, route, status_code)] += 1
+            self._histogram("http_request_duration_seconds", method, route).observe(duration)
+            self._histogram("db_queries_per_request", method, route).observe(stats.queries)
+            self._histogram("db_time_per_request_seconds", method, route).observe(stats.db_time)
+            self._histogram("db_pool_wait_seconds", method, route).observe(stats.pool_wait)
+
+    def reset(self) -> None:
+        """Сбрасывает все метрики (для тестов)"""
+        with self._lock:
+            self._requests.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """📝 Все метрики в текстовом формате Prometheus"""
+        lines = [
+            "# HELP http_requests_total Total HTTP requests",
+            "# TYPE http_requests_total counter",
+        ]
+        with self._lock:
+            for (method, route, status_code), value in sorted(self._requests.items()):
+                lines.append(f"http_requests_total{_labels(method=method, route=route, status=status_code)} {value}")
+
+            for name, (description, _) in HISTOGRAMS.items():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, method, route), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in histogram.cumulative():
+                        labels = _labels(method=method, route=route, le=_format_value(bound))
+                        lines.append(f"{name}_bucket{labels} {count}")
+                    labels = _labels(method=method, route=route)
+                    lines.append(f"{name}_sum{labels} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{labels} {histogram.count}")
+
+        # Текущее состояние пулов уже созданных движков (sync и, при DB_ASYNC=true, async) с меткой engine
+        gauges = {}
+        for engine_name, engine in created_engines().items():
+            for key, value in pool_status(engine).items():
+                if isinstance(value, int):
+                    gauges.setdefault(key, []).append(f"db_pool_{key}{_labels(engine=engine_name)} {value}")
+        for key, samples in gauges.items():
+            lines.append(f"# TYPE db_pool_{key} gauge")
+            lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
+
+
+# 🎯 ГЛОБАЛЬНЫЙ РЕЕСТР МЕТРИК ПРОЦЕССА
+metrics_registry = MetricsRegistry()
+
+
+def server_timing(duration: float, stats: DBStats) -> str:
+    """Значение заголовка Server-Timing (миллисекунды) - видно во вкладке Network браузера"""
+    return (
+        f"app;dur={duration * 1000:.2f}, "
+        f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries", '
+        f"pool;dur={stats.pool_wait * 1000:.2f}"
+    )
+
+
+class MetricsMiddleware:
+    """
+    ⏱️ ASGI middleware метрик
+    Чистый ASGI (без BaseHTTPMiddleware): не оборачивает тело ответа в лишние задачи и очереди,
+    поэтому накладные расходы - пара замеров времени и одна запись в реестр под lock.
+    Server-Timing добавляется к заголовкам ответа: для потоковых ответов (выгрузка) в нем
+    только то, что успело выполниться до первого байта, а в метрики попадает весь запрос
+    """
+
+    def __init__(self, app, registry: Optional[MetricsRegistry] = None):
+        self.app = app
+        self.registry = registry if registry is not None else metrics_registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = DBStats(scope)
+        token = current_db_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500  # Если приложение упало до ответа
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(time.perf_counter() - started, stats).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_db_stats.reset(token)
+            # Роутер Starlette кладет найденный маршрут в scope - берем шаблон пути
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            self.registry.observe(scope["method"], route, status_code, time.perf_counter() - started, stats)
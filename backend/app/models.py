@@ -1,5 +1,5 @@
 # Импорт необходимых компонентов SQLAlchemy
-from sqlalchemy import Column, Integer, String, Text  # Типы колонок для БД
+from sqlalchemy import Column, DateTime, Integer, String, Text, func  # Типы колонок для БД
 from app.database import Base  # Базовый класс для всех моделей
 
 
@@ -38,4 +38,14 @@ class User(Base):
     bio = Column(
         Text  # Тип данных: текст (неограниченной длины)
         # nullable по умолчанию True - поле может быть пустым
-    )
\ No newline at end of file
+    )
+
+    # 🕒 ВРЕМЯ ПОСЛЕДНЕГО ИЗМЕНЕНИЯ
+    # Источник ETag и Last-Modified для GET /users/ и GET /users/{user_id} (http_cache.py)
+    updated_at = Column(
+        DateTime(timezone=True),  # Тип данных: дата и время с часовым поясом
+        nullable=False,
+        server_default=func.now(),  # Ставит БД при INSERT - в том числе при COPY импорта и Core вставках
+        onupdate=func.now(),  # Обновляется при каждом UPDATE через SQLAlchemy
+        index=True  # max(updated_at) - версия коллекции без чтения строк
+    )
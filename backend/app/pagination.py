@@ -0,0 +1,67 @@
+import base64
+import binascii
+import json
+from typing import Optional, Tuple
+
+
+# 🔖 КУРСОРЫ ДЛЯ KEYSET-ПАГИНАЦИИ
+# Курсор - непрозрачная для клиента строка, внутри которой лежит ID последней
+# записи страницы. Следующая страница читается запросом WHERE id > :after_id,
+# поэтому PostgreSQL идет по индексу первичного ключа и не пропускает строки как OFFSET
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    🔒 Упаковка ID последней записи страницы в курсор
+    Возвращает base64url строку без паддинга
+    """
+    raw = str(last_id).encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    🔓 Распаковка курсора обратно в ID
+    Бросает ValueError если курсор поврежден или подделан
+    """
+    # Восстанавливаем паддинг, который был срезан при кодировании
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii")
+    except (binascii.Error, UnicodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+    if not raw.isdigit():
+        raise ValueError("Invalid cursor")
+
+    return int(raw)
+
+
+def encode_search_cursor(tier: int, name_key: Optional[str], last_id: int) -> str:
+    """
+    🔒 Курсор поиска: уровень ранжирования, ключ имени (только для префиксного уровня) и ID
+    последней записи страницы - по ним следующая страница продолжает keyset внутри уровня
+    """
+    raw = json.dumps([tier, name_key, last_id], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Tuple[int, Optional[str], int]:
+    """
+    🔓 Распаковка курсора поиска
+    Бросает ValueError если курсор поврежден или подделан
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        tier, name_key, last_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (binascii.Error, UnicodeError, ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+    if (
+        not isinstance(tier, int) or isinstance(tier, bool)
+        or not isinstance(last_id, int) or isinstance(last_id, bool)
+        or not (name_key is None or isinstance(name_key, str))
+    ):
+        raise ValueError("Invalid cursor")
+
+    return tier, name_key, last_id
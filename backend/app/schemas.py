@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, EmailStr, ConfigDict, Field, model_validator
+from typing import List, Literal, Optional
 
 # 🎯 БАЗОВАЯ СХЕМА ПОЛЬЗОВАТЕЛЯ
 # Определяет общие поля для всех схем пользователя
@@ -8,14 +8,17 @@ class UserBase(BaseModel):
     email: EmailStr              # Обязательное поле: email с автоматической валидацией формата
     bio: Optional[str] = None    # Опциональное поле: биография (может быть None)
 
+# 📏 ДЛИНА ПОЛЕЙ - КАК У КОЛОНОК В models.py (String(50), String(100))
+# Проверяется при валидации: иначе PostgreSQL отклонит всю вставку (пачку, COPY импорта) с DataError
+NAME_MAX_LENGTH = 50
+EMAIL_MAX_LENGTH = 100
+
 # 🆕 СХЕМА ДЛЯ СОЗДАНИЯ ПОЛЬЗОВАТЕЛЯ
-# Используется при получении данных от клиента (POST /users/)
+# Используется при получении данных от клиента (POST /users/, POST /users/bulk, импорт)
 class UserCreate(UserBase):
-    # Наследует все поля от UserBase без изменений
-    # name: str (обязательно)
-    # email: EmailStr (обязательно)
-    # bio: Optional[str] = None (опционально)
-    pass
+    name: str = Field(max_length=NAME_MAX_LENGTH)        # Обязательно, не длиннее колонки name
+    email: EmailStr = Field(max_length=EMAIL_MAX_LENGTH)  # Обязательно, не длиннее колонки email
+    # bio: Optional[str] = None (опционально, Text без ограничения длины)
 
 # 👤 СХЕМА ДЛЯ ОТВЕТА API
 # Используется при возврате данных клиенту (после создания/чтения пользователя)
@@ -25,4 +28,58 @@ class User(UserBase):
     # ⚙️ КОНФИГУРАЦИЯ PYDANTIC v2
     # from_attributes=True позволяет создавать Pydantic модели из ORM объектов (ранее orm_mode = True)
     # Это позволяет автоматически конвертировать SQLAlchemy модели в Pydantic схемы
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+# 📦 РЕЗУЛЬТАТ МАССОВОГО СОЗДАНИЯ ДЛЯ ОДНОГО ЭЛЕМЕНТА
+# Порядок результатов совпадает с порядком пользователей в запросе (POST /users/bulk)
+class BulkUserResult(BaseModel):
+    email: EmailStr                            # Email из запроса
+    status: Literal["created", "duplicate"]   # created - вставлен, duplicate - email уже занят
+    id: Optional[int] = None                   # ID созданного пользователя (None для дубликатов)
+
+# 📊 ОТВЕТ МАССОВОГО СОЗДАНИЯ
+class BulkUserResponse(BaseModel):
+    created: int                     # Сколько пользователей вставлено
+    duplicates: int                  # Сколько пропущено из-за занятого email
+    results: List[BulkUserResult]    # Статус по каждому элементу запроса
+
+# ⚠️ ОТКЛОНЕННАЯ СТРОКА ИМПОРТА
+class ImportRowError(BaseModel):
+    line: int    # Номер строки в файле (для CSV заголовок - строка 1)
+    error: str   # Почему строка не прошла валидацию
+
+# 📥 ОТЧЕТ ОБ ИМПОРТЕ ПОЛЬЗОВАТЕЛЕЙ (POST /users/import и import_users.py)
+class ImportReport(BaseModel):
+    processed: int = 0                     # Прочитано строк с данными
+    inserted: int = 0                      # Вставлено новых пользователей
+    duplicates: int = 0                    # Пропущено: email уже есть в БД или раньше в файле
+    rejected: int = 0                      # Отклонено валидацией
+    errors: List[ImportRowError] = []      # Первые ошибки валидации (список ограничен)
+
+# 🔢 ЛИМИТ ПАКЕТНОГО ПОИСКА
+# Сколько id и email вместе можно запросить за один вызов /users/batch или /users/lookup
+BATCH_LOOKUP_MAX_ITEMS = 500
+
+# 🔎 ЛИМИТЫ ПОИСКА (GET /users/search)
+SEARCH_QUERY_MAX_LENGTH = 100  # Имя короче 50 символов, длиннее - только слова биографии
+SEARCH_MAX_LIMIT = 100         # Максимальный размер страницы результатов
+
+# 🔎 ЗАПРОС ПАКЕТНОГО ПОИСКА (POST /users/lookup)
+# max_length у списков отсекает огромные тела еще до разбора email, лимит на сумму - в валидаторе
+class UserLookup(BaseModel):
+    ids: List[int] = Field(default_factory=list, max_length=BATCH_LOOKUP_MAX_ITEMS)        # Искомые ID
+    emails: List[EmailStr] = Field(default_factory=list, max_length=BATCH_LOOKUP_MAX_ITEMS)  # Искомые email
+
+    @model_validator(mode="after")
+    def check_total_items(self):
+        """ids и emails вместе - не больше BATCH_LOOKUP_MAX_ITEMS (ошибка валидации - 422)"""
+        if len(self.ids) + len(self.emails) > BATCH_LOOKUP_MAX_ITEMS:
+            raise ValueError(f"Too many ids and emails together, max {BATCH_LOOKUP_MAX_ITEMS}")
+        return self
+
+# 📚 ОТВЕТ ПАКЕТНОГО ПОИСКА
+# users - найденные пользователи в порядке запроса (сначала по ids, затем по emails, без повторов)
+class UserBatchResponse(BaseModel):
+    users: List[User]
+    missing_ids: List[int] = []     # ID, которых нет в БД
+    missing_emails: List[str] = []  # Email, которых нет в БД
@@ -0,0 +1,48 @@
+from typing import Any, Dict, List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app import schemas
+from app.database import env_bool
+
+try:
+    import orjson  # Быстрый JSON на Rust (ставится вместе с fastapi[all])
+except ImportError:  # Без orjson работает заранее собранный TypeAdapter pydantic
+    orjson = None
+
+# ⚡ БЫСТРАЯ СЕРИАЛИЗАЦИЯ СПИСКА ПОЛЬЗОВАТЕЛЕЙ
+# Обычный путь FastAPI для response_model=List[User]: ORM объекты -> валидация каждого объекта
+# (from_attributes, EmailStr) -> jsonable dict -> json.dumps. Строки пришли из нашей же БД,
+# поэтому валидация на выходе ничего не проверяет, а на странице в 1000 пользователей занимает
+# большую часть CPU запроса. Быстрый путь: crud.get_user_rows отдает кортежи колонок, а здесь они
+# сразу превращаются в JSON. response_model остается на маршруте - схема в OpenAPI прежняя.
+# FAST_SERIALIZATION=false возвращает обычный путь (например, чтобы сравнить ответы)
+
+FAST_SERIALIZATION = env_bool("FAST_SERIALIZATION", True)
+
+# Ключи JSON - поля схемы ответа User в ее порядке; в том же порядке crud.USER_ROW_COLUMNS
+USER_FIELDS = tuple(schemas.User.model_fields)
+
+# Собирается один раз при импорте, а не на каждый ответ
+_user_rows_adapter = TypeAdapter(List[Dict[str, Any]])
+
+
+def dump_user_rows(rows) -> bytes:
+    """📝 JSON массив пользователей из кортежей колонок (name, email, bio, id)"""
+    items = [dict(zip(USER_FIELDS, row)) for row in rows]
+    if orjson is not None:
+        return orjson.dumps(items)
+    return _user_rows_adapter.dump_json(items)
+
+
+class UserRowsResponse(Response):
+    """
+    📦 JSON ответ из строк crud.get_user_rows
+    Обработчик возвращает Response, поэтому FastAPI не прогоняет содержимое через response_model
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dump_user_rows(content)
@@ -0,0 +1,53 @@
+"""
+⚡ Бенчмарк: синхронный режим (def + psycopg2) против асинхронного (async def + asyncpg)
+
+Запускает uvicorn дважды - с DB_ASYNC=false и DB_ASYNC=true - на одной и той же
+PostgreSQL базе из переменных DB_* и нагружает GET /users/{id} заданным числом
+одновременных клиентов. Печатает req/s, p50, p99 и число ошибок для каждого режима.
+
+Запуск из папки backend:
+    python -m benchmarks.async_vs_sync --concurrency 500 --duration 30
+"""
+import argparse
+import asyncio
+
+from benchmarks.load_test import open_client, run_closed_loop, seed_users, start_server, wait_until_ready
+
+
+async def measure(base_url: str, users: int, concurrency: int, duration: float) -> dict:
+    """GET /users/{id} в закрытом цикле через общий нагрузочный харнесс"""
+    async with open_client(base_url, concurrency) as client:
+        ids = await seed_users(client, users)
+        # Короткий прогрев, чтобы пул соединений был заполнен до замера
+        await run_closed_loop(client, ids, {"get": 1}, concurrency, duration=2.0)
+        stats = await run_closed_loop(client, ids, {"get": 1}, concurrency, duration)
+    return stats.summary()["total"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async database mode benchmark")
+    parser.add_argument("--concurrency", type=int, default=500, help="Одновременных клиентов")
+    parser.add_argument("--duration", type=float, default=30.0, help="Длительность замера, секунд")
+    parser.add_argument("--users", type=int, default=10000, help="Сколько пользователей создать для чтения")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    for async_mode in (False, True):
+        server = start_server(args.port, env={"DB_ASYNC": "true" if async_mode else "false"})
+        try:
+            wait_until_ready(base_url)
+            result = asyncio.run(measure(base_url, args.users, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+        mode = "async" if async_mode else "sync"
+        print(
+            f"{mode:>5}: {result['rps']:8.1f} req/s  p50 {result['p50_ms']:7.1f} ms  "
+            f"p99 {result['p99_ms']:7.1f} ms  errors {result['errors']}  ({result['requests']} requests)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+🗜️ Цена сжатия против сэкономленных байт для страниц GET /users/ разного размера
+
+Для каждой страницы (JSON как у быстрой сериализации) и каждой кодировки/уровня печатает
+размер после сжатия, долю сэкономленных байт, CPU на ответ и CPU на каждый сэкономленный КБ.
+Строка "cached" - попадание в кэш сжатых тел CompressionMiddleware (хэш тела вместо сжатия).
+
+Как читать: на маленьких страницах заголовки и CPU съедают выигрыш - отсюда COMPRESSION_MIN_SIZE.
+Для динамических ответов обычно выгоднее gzip 1-6, br 4-5 или zstd 3: высокие уровни
+добавляют CPU кратно, а байт экономят на проценты.
+
+Запуск из папки backend (br и zstd - если установлены brotli и zstandard):
+    python -m benchmarks.compression_cost
+    python -m benchmarks.compression_cost --pages 10,100,1000,10000 --repeat 50
+"""
+import argparse
+import time
+
+from app import compression
+from app.serialization import dump_user_rows
+
+# (кодировка, настройка уровня в compression.py, уровни)
+LEVELS = [
+    ("gzip", "GZIP_LEVEL", (1, 6, 9)),
+    ("br", "BROTLI_QUALITY", (1, 4, 11)),
+    ("zstd", "ZSTD_LEVEL", (1, 3, 19)),
+]
+
+
+def make_page(size: int) -> bytes:
+    """Тело ответа GET /users/?limit=size - похоже на реальные строки, с повторами и различиями"""
+    rows = [(f"User {n}", f"user-{n}@example.com", f"Bio of user {n}: " + "likes Python " * (n % 7), n) for n in range(size)]
+    return dump_user_rows(rows)
+
+
+def measure(func, repeat: int) -> float:
+    """Лучшее время вызова из repeat, секунд (минимум меньше всего зависит от шума)"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU cost vs bytes saved by response compression")
+    parser.add_argument("--pages", default="10,100,1000,5000", help="Размеры страниц через запятую")
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов на замер")
+    args = parser.parse_args()
+
+    print(f"{'page':>6} {'encoding':>12} {'bytes':>9} {'->':>9} {'saved':>6} {'us/resp':>9} {'us/KB saved':>12}")
+    for size in (int(page) for page in args.pages.split(",")):
+        body = make_page(size)
+        print(f"{size:>6} {'identity':>12} {len(body):>9} {len(body):>9} {'0%':>6} {0:>9.1f} {'-':>12}")
+
+        for encoding, setting, levels in LEVELS:
+            if not compression.available_encodings([encoding]):
+                continue
+            default_level = getattr(compression, setting)
+            try:
+                for level in levels:
+                    setattr(compression, setting, level)
+                    compressed = compression.compress(encoding, body)
+                    seconds = measure(lambda: compression.compress(encoding, body), args.repeat)
+                    saved = len(body) - len(compressed)
+                    per_kb = seconds * 1e6 / (saved / 1024) if saved > 0 else float("inf")
+                    print(
+                        f"{size:>6} {f'{encoding}-{level}':>12} {len(body):>9} {len(compressed):>9} "
+                        f"{saved / len(body):>6.0%} {seconds * 1e6:>9.1f} {per_kb:>12.1f}"
+                    )
+            finally:
+                setattr(compression, setting, default_level)
+
+        # Попадание в кэш: ответ с ETag, тело уже сжималось
+        middleware = compression.CompressionMiddleware(None, encodings=["gzip"])
+        start = {"headers": [(b"etag", b'W/"bench"')]}
+        compressed = middleware._compress_body("gzip", body, start)
+        seconds = measure(lambda: middleware._compress_body("gzip", body, start), args.repeat)
+        saved = len(body) - len(compressed)
+        print(
+            f"{size:>6} {'gzip-cached':>12} {len(body):>9} {len(compressed):>9} "
+            f"{saved / len(body):>6.0%} {seconds * 1e6:>9.1f} {seconds * 1e6 / max(saved / 1024, 1e-9):>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+⏱️ Общие фикстуры бенчмарков (pytest-benchmark)
+
+Бенчмарки лежат отдельно от юнит-тестов и запускаются явно:
+    pytest benchmarks --benchmark-autosave
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:15%
+
+BENCH_DATABASE_URL - БД для замеров (по умолчанию SQLite в памяти). Таблица users в ней
+будет очищена и заполнена заново, поэтому не указывайте рабочую базу.
+BENCH_TABLE_SIZES - размеры таблицы через запятую для CRUD бенчмарков (по умолчанию 1000,10000,100000)
+"""
+import os
+
+import pytest
+from alembic import command
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, delete, func, insert, select, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.main import app, get_db
+from migrate import alembic_config
+
+BENCH_DATABASE_URL = os.environ.get("BENCH_DATABASE_URL", "sqlite:///:memory:")
+BENCH_TABLE_SIZES = [int(size) for size in os.environ.get("BENCH_TABLE_SIZES", "1000,10000,100000").split(",")]
+BENCH_API_TABLE_SIZE = BENCH_TABLE_SIZES[len(BENCH_TABLE_SIZES) // 2]  # Для сквозных замеров - средний размер
+
+SEED_BATCH_SIZE = 10000
+
+
+class UserTable:
+    """
+    📏 Таблица users заданного размера
+    Строки bench-<n>@example.com добавляются и удаляются по мере надобности, так что при
+    переходе от 1000 к 10000 строк вставляются только недостающие 9000
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.size = 0
+
+    def resize(self, size: int) -> None:
+        with self.session_factory() as db:
+            current = db.scalar(select(func.count()).select_from(models.User))
+            if current < size:
+                for start in range(current, size, SEED_BATCH_SIZE):
+                    stop = min(start + SEED_BATCH_SIZE, size)
+                    # Сразу в Core INSERT: валидация схемой здесь только замедлила бы подготовку
+                    db.execute(insert(models.User), [
+                        {"name": f"Bench {n}", "email": f"bench-{n}@example.com", "bio": "x" * 100}
+                        for n in range(start, stop)
+                    ])
+            elif current > size:
+                # Лишние - самые новые строки, в том числе созданные бенчмарками create_user
+                last_id = db.scalar(select(models.User.id).order_by(models.User.id).offset(size - 1).limit(1))
+                db.execute(delete(models.User).where(models.User.id > last_id))
+            db.commit()
+        self.size = size
+
+    def ids(self) -> list:
+        with self.session_factory() as db:
+            return list(db.scalars(select(models.User.id).order_by(models.User.id)))
+
+
+def drop_schema(engine) -> None:
+    """Удаляет таблицы прошлого прогона вместе с историей миграций (и схему от create_all без истории)"""
+    models.Base.metadata.drop_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+
+@pytest.fixture(scope="session")
+def bench_engine():
+    """Движок БД для замеров со свежей схемой из миграций - с теми же индексами, что в продакшене"""
+    if BENCH_DATABASE_URL.startswith("sqlite"):
+        engine = create_engine(
+            BENCH_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+    else:
+        engine = create_engine(BENCH_DATABASE_URL)
+    drop_schema(engine)
+    # Без внешней транзакции, как в tests/conftest.py: CREATE INDEX CONCURRENTLY идет в autocommit
+    with engine.connect() as connection:
+        command.upgrade(alembic_config(connection=connection), "head")
+    try:
+        yield engine
+    finally:
+        drop_schema(engine)
+        engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def bench_sessions(bench_engine):
+    """Фабрика сессий для замеров - как SessionLocal в приложении"""
+    return sessionmaker(autocommit=False, autoflush=False, bind=bench_engine)
+
+
+@pytest.fixture(scope="session")
+def user_table(bench_sessions):
+    """Таблица users, размер которой бенчмарк задает через resize()"""
+    return UserTable(bench_sessions)
+
+
+@pytest.fixture
+def bench_db(bench_sessions):
+    """Сессия для CRUD бенчмарка"""
+    with bench_sessions() as db:
+        yield db
+
+
+@pytest.fixture(scope="module")
+def bench_client(bench_sessions):
+    """ASGI клиент приложения поверх БД для замеров"""
+
+    def override_get_db():
+        db: Session = bench_sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,380 @@
+"""
+🏋️ Нагрузочный тест FastAPI приложения: пропускная способность и перцентили задержки
+
+Нагружает app.main:app смесью запросов создания, списка и получения по ID:
+    --target asgi     - в том же процессе через httpx.ASGITransport (без сети и uvicorn)
+    --target uvicorn  - настоящий uvicorn в отдельном процессе (--workers N)
+    --target production - python run.py --prod в отдельном процессе (--workers N)
+    --url http://...  - уже запущенный сервер
+Два режима нагрузки:
+    --concurrency N   - закрытый цикл: N клиентов шлют запросы друг за другом
+    --rate R          - открытый цикл: R запросов в секунду (пуассоновский поток) независимо от
+                        скорости ответов; задержка считается от запланированного момента отправки,
+                        поэтому очередь перед сервером тоже попадает в перцентили
+Во время замера опрашивается /health/db - так видно, упирается ли нагрузка в пул соединений БД.
+
+Запуск из папки backend (нужна PostgreSQL из DB_*):
+    python -m benchmarks.load_test --target uvicorn --workers 2 --concurrency 64 --duration 30
+    python -m benchmarks.load_test --target asgi --rate 300 --mix create=1,list=2,get=7 --json result.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import httpx
+
+from app.pagination import encode_cursor
+
+DEFAULT_MIX = "create=1,list=2,get=7"
+LIST_LIMIT = 20
+
+
+def percentile(values, q):
+    """Перцентиль q (0..100) по отсортированному списку"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def parse_mix(mix: str) -> dict:
+    """'create=1,list=2,get=7' -> {'create': 1.0, 'list': 2.0, 'get': 7.0}"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}, expected one of {', '.join(OPERATIONS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+# 🚀 ЗАПУСК СЕРВЕРА
+
+RUN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "run.py")
+
+
+def start_server(port: int, workers: int = 1, env: dict = None, production: bool = False) -> subprocess.Popen:
+    """
+    Запускает app.main:app в отдельном процессе: uvicorn с настройками по умолчанию
+    или, с production=True, через python run.py --prod (uvloop/httptools, бюджет соединений)
+    """
+    if production:
+        command = [sys.executable, RUN_PY, "--prod", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    else:
+        command = [
+            sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ]
+    return subprocess.Popen(command, env=dict(os.environ, **(env or {})))
+
+
+def wait_until_ready(base_url: str, timeout: float = 30.0):
+    """Ждет, пока сервер начнет отвечать на /health/db"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health/db", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready")
+
+
+@asynccontextmanager
+async def open_client(base_url: str = None, connections: int = 100):
+    """
+    HTTP клиент к серверу по base_url или, без него, к app.main:app в этом же процессе
+    (lifespan приложения запускается вручную - ASGITransport этого не делает)
+    """
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    if base_url is not None:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+            yield client
+        return
+
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://asgi", timeout=30.0) as client:
+            yield client
+
+
+async def seed_users(client: httpx.AsyncClient, count: int) -> list:
+    """Создает пользователей для чтения (повторный запуск их не дублирует) и возвращает до count ID"""
+    for start in range(0, count, 1000):
+        payload = [{"name": f"Bench {i}", "email": f"bench-{i}@example.com"} for i in range(start, min(start + 1000, count))]
+        (await client.post("/users/bulk", json=payload)).raise_for_status()
+
+    ids, cursor = [], None
+    while len(ids) < count:
+        params = {"limit": 1000} if cursor is None else {"limit": 1000, "cursor": cursor}
+        response = await client.get("/users/", params=params)
+        ids.extend(user["id"] for user in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    return ids[:count]
+
+
+# 🎯 ОПЕРАЦИИ НАГРУЗКИ
+# Каждая операция получает клиента, список ID и уникальный номер запроса
+
+_run_token = uuid.uuid4().hex[:8]  # Email новых пользователей не пересекаются между запусками
+_request_numbers = itertools.count()  # Сквозная нумерация запросов - прогрев и замер не повторяют email
+
+
+async def op_create(client, ids, n):
+    return await client.post("/users/", json={"name": f"Load {n}", "email": f"load-{_run_token}-{n}@example.com"})
+
+
+async def op_list(client, ids, n):
+    # Случайная страница через курсор - как листание списка с разных мест
+    return await client.get("/users/", params={"limit": LIST_LIMIT, "cursor": encode_cursor(random.choice(ids))})
+
+
+async def op_get(client, ids, n):
+    return await client.get(f"/users/{random.choice(ids)}")
+
+
+OPERATIONS = {"create": op_create, "list": op_list, "get": op_get}
+
+
+class LoadStats:
+    """📊 Задержки и ошибки по каждой операции"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.elapsed = 0.0
+
+    def record(self, operation: str, latency: float, ok: bool):
+        self.latencies[operation].append(latency)
+        if not ok:
+            self.errors[operation] += 1
+
+    @staticmethod
+    def _summarize(latencies: list, errors: int, elapsed: float) -> dict:
+        latencies = sorted(latencies)
+        return {
+            "requests": len(latencies),
+            "rps": len(latencies) / elapsed if elapsed else 0.0,
+            "errors": errors,
+            "error_rate": errors / len(latencies) if latencies else 0.0,
+            "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        }
+
+    def summary(self) -> dict:
+        operations = {
+            name: self._summarize(latencies, self.errors[name], self.elapsed)
+            for name, latencies in self.latencies.items()
+        }
+        everything = [latency for latencies in self.latencies.values() for latency in latencies]
+        operations["total"] = self._summarize(everything, sum(self.errors.values()), self.elapsed)
+        return operations
+
+
+async def _send(client, ids, operation, n, stats, started):
+    """Один запрос; задержка считается от started (для открытого цикла - запланированный момент)"""
+    try:
+        response = await OPERATIONS[operation](client, ids, n)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    stats.record(operation, time.perf_counter() - started, ok)
+
+
+async def run_closed_loop(client, ids, mix: dict, concurrency: int, duration: float) -> LoadStats:
+    """Закрытый цикл: concurrency клиентов шлют запросы друг за другом в течение duration секунд"""
+    stats = LoadStats()
+    names, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            operation = random.choices(names, weights)[0]
+            await _send(client, ids, operation, next(_request_numbers), stats, time.perf_counter())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+async def run_open_loop(client, ids, mix: dict, rate: float, duration: float) -> LoadStats:
+    """Открытый цикл: пуассоновский поток rate запросов в секунду в течение duration секунд"""
+    stats = LoadStats()
+    names, weights = list(mix), list(mix.values())
+    tasks = set()
+
+    started = time.perf_counter()
+    scheduled = started
+    while scheduled - started < duration:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        operation = random.choices(names, weights)[0]
+        task = asyncio.create_task(_send(client, ids, operation, next(_request_numbers), stats, scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        scheduled += random.expovariate(rate)
+
+    await asyncio.gather(*tasks)
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+async def sample_pool(client, interval: float, samples: list, stop: asyncio.Event):
+    """Опрашивает /health/db и копит счетчики пула до сигнала stop"""
+    while not stop.is_set():
+        try:
+            pool = (await client.get("/health/db")).json().get("pool", {})
+            samples.append(pool)
+        except (httpx.HTTPError, ValueError):
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def summarize_pool(samples: list) -> dict:
+    """
+    Насыщение пула: сколько соединений было выдано и как часто пул был исчерпан
+    (checkedout >= DB_POOL_SIZE + DB_MAX_OVERFLOW - новые запросы ждут соединение до DB_POOL_TIMEOUT)
+    """
+    from app.database import DB_MAX_OVERFLOW
+
+    checked_out = [s["checkedout"] for s in samples if s.get("checkedout") is not None]
+    if not checked_out:
+        return {"samples": len(samples), "available": False}
+    size = samples[-1].get("size") or 0
+    limit = size + DB_MAX_OVERFLOW
+    return {
+        "samples": len(checked_out),
+        "available": True,
+        "pool_class": samples[-1].get("pool_class"),
+        "size": size,
+        "limit": limit,
+        "checkedout_max": max(checked_out),
+        "checkedout_mean": statistics.fmean(checked_out),
+        "overflow_share": sum(1 for c in checked_out if c > size) / len(checked_out),
+        "saturated_share": sum(1 for c in checked_out if c >= limit) / len(checked_out),
+    }
+
+
+async def run(args, base_url: str = None) -> dict:
+    """Прогрев, замер и опрос пула; возвращает сводку"""
+    mix = parse_mix(args.mix)
+    connections = args.connections or args.concurrency or 100
+
+    async with open_client(base_url, connections) as client:
+        ids = await seed_users(client, args.users)
+
+        async def load(duration):
+            if args.rate:
+                return await run_open_loop(client, ids, mix, args.rate, duration)
+            return await run_closed_loop(client, ids, mix, args.concurrency, duration)
+
+        if args.warmup:
+            await load(args.warmup)
+
+        samples, stop = [], asyncio.Event()
+        sampler = asyncio.create_task(sample_pool(client, args.pool_interval, samples, stop))
+        try:
+            stats = await load(args.duration)
+        finally:
+            stop.set()
+            await sampler
+
+    return {
+        "target": args.url or args.target,
+        "mode": f"open loop {args.rate} req/s" if args.rate else f"closed loop x{args.concurrency}",
+        "mix": mix,
+        "duration": args.duration,
+        "operations": stats.summary(),
+        "pool": summarize_pool(samples),
+    }
+
+
+def print_report(result: dict):
+    """Таблица перцентилей по операциям и строка про пул"""
+    print(f"{result['target']}, {result['mode']}, {result['duration']:.0f}s")
+    print(f"{'operation':>10} {'requests':>9} {'req/s':>8} {'errors':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for name, s in result["operations"].items():
+        print(
+            f"{name:>10} {s['requests']:>9} {s['rps']:>8.1f} {s['error_rate']:>6.1%} "
+            f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}"
+        )
+
+    pool = result["pool"]
+    if not pool["available"]:
+        print("pool: no counters (pool class without statistics)")
+        return
+    print(
+        f"pool: {pool['pool_class']} size {pool['size']} limit {pool['limit']}  "
+        f"checked out max {pool['checkedout_max']} mean {pool['checkedout_mean']:.1f}  "
+        f"overflow {pool['overflow_share']:.0%} saturated {pool['saturated_share']:.0%} of {pool['samples']} samples"
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load test for app.main:app")
+    parser.add_argument("--target", choices=("asgi", "uvicorn", "production"), default="asgi", help="Где запустить приложение")
+    parser.add_argument("--url", help="Нагружать уже запущенный сервер (вместо --target)")
+    parser.add_argument("--workers", type=int, default=1, help="Процессов uvicorn для --target uvicorn/production")
+    parser.add_argument("--port", type=int, default=8765)
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=None, help="Закрытый цикл: одновременных клиентов (по умолчанию 50)")
+    load.add_argument("--rate", type=float, default=None, help="Открытый цикл: запросов в секунду")
+    parser.add_argument("--connections", type=int, default=None, help="Максимум HTTP соединений клиента")
+    parser.add_argument("--duration", type=float, default=30.0, help="Длительность замера, секунд")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Прогрев перед замером, секунд")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Веса операций create/list/get")
+    parser.add_argument("--users", type=int, default=10000, help="Сколько пользователей создать для чтения")
+    parser.add_argument("--pool-interval", type=float, default=0.5, help="Период опроса /health/db, секунд")
+    parser.add_argument("--json", help="Сохранить сводку в JSON файл")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.rate is None and args.concurrency is None:
+        args.concurrency = 50
+
+    server = None
+    base_url = args.url
+    if base_url is None and args.target in ("uvicorn", "production"):
+        base_url = f"http://127.0.0.1:{args.port}"
+        server = start_server(args.port, args.workers, production=args.target == "production")
+    try:
+        if server is not None:
+            wait_until_ready(base_url)
+        result = asyncio.run(run(args, base_url))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+⏱️ Сквозные бенчмарки: задержка каждого маршрута app/main.py через ASGI клиент
+
+Запрос проходит весь стек - middleware, валидацию, зависимости, CRUD и сериализацию ответа.
+Таблица users заполнена до BENCH_API_TABLE_SIZE строк.
+"""
+import itertools
+import json
+
+import pytest
+from fastapi.routing import APIRoute
+
+from app.main import app
+from benchmarks.conftest import BENCH_API_TABLE_SIZE
+
+_counter = itertools.count()
+
+
+def _new_user():
+    n = next(_counter)
+    return {"name": f"Api {n}", "email": f"api-{n}@example.com"}
+
+
+def _import_file():
+    rows = [_new_user() for _ in range(100)]
+    content = "\n".join(json.dumps(row) for row in rows)
+    return {"files": {"file": ("users.ndjson", content, "application/x-ndjson")}}
+
+
+# Маршрут -> (метод, URL, параметры запроса). URL с {id}/{email} подставляются из таблицы
+ROUTES = {
+    ("GET", "/"): lambda t: ("GET", "/", {}),
+    ("GET", "/health/db"): lambda t: ("GET", "/health/db", {}),
+    ("GET", "/health/cache"): lambda t: ("GET", "/health/cache", {}),
+    ("POST", "/users/"): lambda t: ("POST", "/users/", {"json": _new_user()}),
+    ("POST", "/users/bulk"): lambda t: ("POST", "/users/bulk", {"json": [_new_user() for _ in range(100)]}),
+    ("POST", "/users/import"): lambda t: ("POST", "/users/import", _import_file()),
+    ("GET", "/users/"): lambda t: ("GET", "/users/", {"params": {"limit": 100}}),
+    ("GET", "/users/export"): lambda t: ("GET", "/users/export", {"params": {"format": "ndjson"}}),
+    ("GET", "/users/batch"): lambda t: ("GET", "/users/batch", {"params": {"ids": t["ids"][:100]}}),
+    ("POST", "/users/lookup"): lambda t: ("POST", "/users/lookup", {"json": {"emails": t["emails"][:100]}}),
+    ("GET", "/users/search"): lambda t: ("GET", "/users/search", {"params": {"q": "bench 12"}}),
+    ("GET", "/users/{user_id}"): lambda t: ("GET", f"/users/{t['ids'][len(t['ids']) // 2]}", {}),
+}
+
+
+def test_every_route_is_benchmarked():
+    """Новый маршрут в app/main.py должен получить бенчмарк"""
+    routes = {
+        (method, route.path)
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.include_in_schema
+        for method in route.methods
+    }
+    assert routes == set(ROUTES)
+
+
+@pytest.fixture(scope="module")
+def table(user_table):
+    """Заполненная таблица и ID/email для запросов"""
+    user_table.resize(BENCH_API_TABLE_SIZE)
+    ids = user_table.ids()
+    return {"ids": ids, "emails": [f"bench-{n}@example.com" for n in range(0, BENCH_API_TABLE_SIZE, 7)]}
+
+
+# Маршруты, которые пишут в БД, замеряются фиксированным числом раундов - иначе таблица раздувается
+WRITE_ROUNDS = 50
+
+
+@pytest.mark.benchmark(group="api")
+@pytest.mark.parametrize("route", list(ROUTES), ids=lambda route: f"{route[0]} {route[1]}")
+def test_route_latency(benchmark, bench_client, table, route):
+    def call():
+        # Запрос строится заново на каждый вызов: POST маршрутам нужны уникальные email
+        method, url, kwargs = ROUTES[route](table)
+        return bench_client.request(method, url, **kwargs)
+
+    if route[0] == "GET":
+        response = benchmark(call)
+    else:
+        response = benchmark.pedantic(call, rounds=WRITE_ROUNDS, warmup_rounds=1)
+    assert response.status_code < 400, response.text
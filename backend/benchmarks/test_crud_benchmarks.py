@@ -0,0 +1,82 @@
+"""
+⏱️ Бенчмарки CRUD слоя на таблицах разного размера (BENCH_TABLE_SIZES)
+
+Запуск из папки backend:
+    pytest benchmarks/test_crud_benchmarks.py --benchmark-group-by=group,param:size
+"""
+import itertools
+import random
+
+import pytest
+from sqlalchemy import text
+
+from app import cache, crud
+from app.schemas import UserCreate
+from benchmarks.conftest import BENCH_TABLE_SIZES
+
+# Глубина страницы - доля таблицы, которую нужно пропустить
+PAGE_DEPTHS = [0.0, 0.5, 0.99]
+PAGE_SIZE = 100
+
+_emails = itertools.count()
+
+
+@pytest.fixture(params=BENCH_TABLE_SIZES, ids=lambda size: f"size={size}")
+def size(request, user_table):
+    """Размер таблицы users для бенчмарка"""
+    user_table.resize(request.param)
+    return request.param
+
+
+@pytest.mark.benchmark(group="crud.create_user")
+def test_create_user(benchmark, bench_db, size):
+    def create():
+        n = next(_emails)
+        return crud.create_user(bench_db, UserCreate(name=f"New {n}", email=f"new-{n}@example.com"))
+
+    assert benchmark(create) is not None
+
+
+@pytest.mark.benchmark(group="crud.get_user_by_id")
+def test_get_user_by_id(benchmark, bench_db, user_table, size):
+    ids = user_table.ids()
+    rng = random.Random(size)
+
+    user = benchmark(lambda: crud.get_user_by_id(bench_db, rng.choice(ids)))
+    assert user is not None
+
+
+@pytest.mark.benchmark(group="crud.get_user_by_email")
+def test_get_user_by_email(benchmark, bench_db, size):
+    rng = random.Random(size)
+
+    user = benchmark(lambda: crud.get_user_by_email(bench_db, f"bench-{rng.randrange(size)}@example.com"))
+    assert user is not None
+
+
+@pytest.mark.benchmark(group="crud.get_users")
+@pytest.mark.parametrize("depth", PAGE_DEPTHS, ids=lambda depth: f"depth={depth:.0%}")
+@pytest.mark.parametrize("mode", ["offset", "keyset"])
+def test_get_users_page(benchmark, bench_db, user_table, size, depth, mode):
+    ids = user_table.ids()
+    skip = min(int(size * depth), size - PAGE_SIZE)
+
+    if mode == "offset":
+        page = benchmark(lambda: crud.get_users(bench_db, skip=skip, limit=PAGE_SIZE))
+    else:
+        after_id = ids[skip - 1] if skip else 0
+        page = benchmark(lambda: crud.get_users(bench_db, limit=PAGE_SIZE, after_id=after_id))
+
+    assert [user.id for user in page] == ids[skip:skip + PAGE_SIZE]
+
+
+@pytest.mark.benchmark(group="crud.get_users_total")
+@pytest.mark.parametrize("mode", ["exact", "estimated", "cached"])
+def test_get_users_total(benchmark, bench_db, size, mode):
+    # Оценке PostgreSQL нужна статистика pg_class; без нее estimated считает точно
+    if bench_db.get_bind().dialect.name == "postgresql":
+        bench_db.execute(text("ANALYZE users"))
+    cache.users_count_cache.clear()
+
+    total, _ = benchmark(lambda: crud.get_users_total(bench_db, mode))
+    assert total > 0
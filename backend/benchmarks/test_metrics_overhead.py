@@ -0,0 +1,71 @@
+"""
+⏱️ Накладные расходы метрик: MetricsMiddleware и хуки БД из database.py
+
+Сравниваются пары "с метриками" / "без" в одной группе - разница средних и есть цена метрик
+на запрос. Для сравнения: сквозной GET /users/{user_id} из test_api_benchmarks.py занимает
+сотни микросекунд, так что метрики можно держать включенными.
+    pytest benchmarks/test_metrics_overhead.py
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.database import DBStats, current_db_stats
+from app.metrics import MetricsMiddleware, MetricsRegistry
+
+SCOPE = {"type": "http", "method": "GET", "path": "/users/1", "headers": []}
+
+
+async def _empty_app(scope, receive, send):
+    """Приложение без работы - измеряется только обертка"""
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", b"0")]})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.mark.benchmark(group="metrics.middleware")
+@pytest.mark.parametrize("enabled", [False, True], ids=["plain", "metrics"])
+def test_middleware_overhead(benchmark, loop, enabled):
+    asgi_app = MetricsMiddleware(_empty_app, registry=MetricsRegistry()) if enabled else _empty_app
+
+    async def requests(n=100):
+        for _ in range(n):
+            await asgi_app(dict(SCOPE), _receive, _send)
+
+    # 100 запросов на раунд - иначе в замере доминирует run_until_complete
+    benchmark(lambda: loop.run_until_complete(requests()))
+
+
+@pytest.fixture(scope="module")
+def sqlite_engine():
+    engine = create_engine("sqlite:///:memory:")
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.benchmark(group="metrics.db_hooks")
+@pytest.mark.parametrize("enabled", [False, True], ids=["outside-request", "inside-request"])
+def test_db_hooks_overhead(benchmark, sqlite_engine, enabled):
+    stats = DBStats()
+    token = current_db_stats.set(stats if enabled else None)
+    try:
+        with sqlite_engine.connect() as conn:
+            benchmark(lambda: conn.execute(text("SELECT 1")).scalar())
+    finally:
+        current_db_stats.reset(token)
+    assert (stats.queries > 0) == enabled
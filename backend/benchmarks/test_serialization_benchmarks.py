@@ -0,0 +1,62 @@
+"""
+⚡ Быстрая сериализация списка пользователей (app/serialization.py) против response_model
+
+serialization.<limit> - только превращение страницы в байты JSON:
+    orm-response-model - ORM объекты -> валидация List[User] (from_attributes) -> json.dumps, как FastAPI
+    rows-fast          - кортежи колонок -> dump_user_rows
+api.users_list.<limit> - сквозной GET /users/?limit=<limit> с FAST_SERIALIZATION выкл/вкл, включая SELECT
+
+Разница средних в группе - сэкономленное CPU на запрос; с ростом страницы она растет линейно.
+    pytest benchmarks/test_serialization_benchmarks.py
+"""
+import json
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+
+from app import crud, schemas, serialization
+from benchmarks.conftest import BENCH_API_TABLE_SIZE
+
+PAGE_SIZES = [100, 1000]
+
+# Тот же адаптер, что FastAPI строит для response_model=List[schemas.User]
+_response_model_adapter = TypeAdapter(List[schemas.User])
+
+
+def _response_model_json(users) -> bytes:
+    """Путь FastAPI: валидация каждого объекта, jsonable dict и JSONResponse.render"""
+    content = _response_model_adapter.dump_python(
+        _response_model_adapter.validate_python(users, from_attributes=True), mode="json"
+    )
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@pytest.fixture(scope="module")
+def table(user_table):
+    user_table.resize(max(BENCH_API_TABLE_SIZE, max(PAGE_SIZES)))
+    return user_table
+
+
+@pytest.mark.parametrize("limit", PAGE_SIZES)
+@pytest.mark.parametrize("fast", [False, True], ids=["orm-response-model", "rows-fast"])
+def test_serialize_page(benchmark, table, bench_db, limit, fast):
+    benchmark.group = f"serialization.{limit}"
+    if fast:
+        rows = crud.get_user_rows(bench_db, limit=limit)
+        body = benchmark(serialization.dump_user_rows, rows)
+    else:
+        users = crud.get_users(bench_db, limit=limit)
+        body = benchmark(_response_model_json, users)
+    assert len(json.loads(body)) == limit
+
+
+@pytest.mark.parametrize("limit", PAGE_SIZES)
+@pytest.mark.parametrize("fast", [False, True], ids=["response-model", "fast"])
+def test_list_users_endpoint(benchmark, table, bench_client, monkeypatch, limit, fast):
+    benchmark.group = f"api.users_list.{limit}"
+    monkeypatch.setattr(serialization, "FAST_SERIALIZATION", fast)
+
+    response = benchmark(bench_client.get, "/users/", params={"limit": limit})
+    assert response.status_code == 200
+    assert len(response.json()) == limit
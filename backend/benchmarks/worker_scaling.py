@@ -0,0 +1,80 @@
+"""
+📈 Бенчмарк масштабирования: пропускная способность python run.py --prod при разном числе воркеров
+
+Для каждого числа воркеров запускает продакшен сервер на одной и той же PostgreSQL базе из DB_*
+и нагружает его смесью запросов в закрытом цикле. Печатает req/s, ускорение относительно одного
+воркера, эффективность (ускорение / воркеры) и перцентили задержки.
+
+Чего ожидать: воркер - отдельный процесс со своим GIL и event loop, поэтому пока у каждого воркера
+есть свое ядро и БД не насыщена, req/s растет почти линейно (эффективность 0.8-0.95 - часть CPU
+забирают PostgreSQL и сам генератор нагрузки, если они на той же машине). Больше воркеров, чем ядер,
+прироста не дает - процессы делят CPU, а p99 растет. Если ускорение остановилось раньше, чем кончились
+ядра, узкое место в БД: смотрите пул (load_test --target production) и DB_MAX_CONNECTIONS.
+
+Запуск из папки backend (схема создана: python migrate.py):
+    python -m benchmarks.worker_scaling --workers 1,2,4,8 --concurrency 128 --duration 20
+    DB_MAX_CONNECTIONS=80 python -m benchmarks.worker_scaling   # пулы воркеров делят бюджет
+"""
+import argparse
+import asyncio
+import os
+
+from benchmarks.load_test import (
+    DEFAULT_MIX, open_client, parse_mix, run_closed_loop, seed_users, start_server, wait_until_ready,
+)
+
+
+def default_worker_counts() -> str:
+    """1, 2, 4, ... до числа CPU включительно"""
+    cpus = os.cpu_count() or 1
+    counts, n = [], 1
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    counts.append(cpus)
+    return ",".join(str(count) for count in counts)
+
+
+async def measure(base_url: str, mix: dict, users: int, concurrency: int, duration: float) -> dict:
+    """Прогрев и замер через общий нагрузочный харнесс"""
+    async with open_client(base_url, concurrency) as client:
+        ids = await seed_users(client, users)
+        await run_closed_loop(client, ids, mix, concurrency, duration=3.0)
+        stats = await run_closed_loop(client, ids, mix, concurrency, duration)
+    return stats.summary()["total"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput scaling of the production server by worker count")
+    parser.add_argument("--workers", default=default_worker_counts(), help="Числа воркеров через запятую")
+    parser.add_argument("--concurrency", type=int, default=128, help="Одновременных клиентов")
+    parser.add_argument("--duration", type=float, default=20.0, help="Длительность замера, секунд")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Смесь операций, как у load_test")
+    parser.add_argument("--users", type=int, default=10000, help="Сколько пользователей создать для чтения")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    base_url = f"http://127.0.0.1:{args.port}"
+    baseline = None
+
+    print(f"{'workers':>7} {'req/s':>9} {'speedup':>8} {'effic.':>7} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for workers in (int(count) for count in args.workers.split(",")):
+        server = start_server(args.port, workers, production=True)
+        try:
+            wait_until_ready(base_url)
+            result = asyncio.run(measure(base_url, mix, args.users, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+        baseline = baseline or result["rps"] / workers
+        speedup = result["rps"] / baseline
+        print(
+            f"{workers:>7} {result['rps']:>9.1f} {speedup:>7.2f}x {speedup / workers:>7.2f} "
+            f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
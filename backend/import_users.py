@@ -0,0 +1,48 @@
+# Импорт необходимых библиотек
+import argparse  # Разбор аргументов командной строки
+import sys  # Вывод прогресса в stderr
+import time  # Скорость импорта
+
+from app.database import SessionLocal, get_engine  # Фабрика сессий и движок БД
+from app.importer import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, detect_format, import_users  # Импорт пользователей
+
+
+# 📥 ТОЧКА ВХОДА ДЛЯ МАССОВОГО ИМПОРТА ПОЛЬЗОВАТЕЛЕЙ
+# Запуск: python import_users.py partners.csv [--format csv|ndjson] [--chunk-size 50000]
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import users from a CSV or NDJSON file")
+    parser.add_argument("path", help="Путь к файлу CSV (name,email,bio) или NDJSON")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Формат файла (по умолчанию - по расширению)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Строк в одной пачке COPY")
+    args = parser.parse_args()
+
+    file_format = args.format or detect_format(args.path)
+    if file_format is None:
+        parser.error("cannot detect file format, pass --format")
+
+    started = time.monotonic()
+
+    def progress(report):
+        """Печатает прогресс после каждой загруженной пачки"""
+        elapsed = time.monotonic() - started
+        print(
+            f"processed {report.processed}  inserted {report.inserted}  duplicates {report.duplicates}  "
+            f"rejected {report.rejected}  ({report.processed / elapsed:.0f} rows/s)",
+            file=sys.stderr,
+        )
+
+    db = SessionLocal(bind=get_engine())
+    try:
+        with open(args.path, encoding="utf-8-sig", newline="") as stream:
+            report = import_users(db, stream, file_format, chunk_size=args.chunk_size, progress=progress)
+    finally:
+        db.close()
+
+    # Итоговый отчет в stdout в JSON - удобно для скриптов
+    print(report.model_dump_json(indent=2))
+    # Ненулевой код возврата - в файле были отклоненные строки
+    return 0 if report.rejected == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# Импорт необходимых библиотек
+import argparse  # Разбор аргументов командной строки
+import sys  # Код возврата
+from pathlib import Path  # Путь к alembic.ini рядом с этим файлом
+
+from alembic import command  # Команды Alembic (upgrade, stamp)
+from alembic.config import Config  # Конфигурация Alembic
+from sqlalchemy import create_engine, inspect  # Проверка существующих таблиц
+from sqlalchemy.pool import NullPool
+
+from app.database import DATABASE_URL  # URL основной БД из DB_*
+
+ALEMBIC_INI = Path(__file__).resolve().with_name("alembic.ini")
+
+# Первая ревизия повторяет схему, которую раньше создавал create_all при импорте main.py
+BASELINE_REVISION = "0001"
+
+# Индексы по выражениям из миграции 0003 (поиск, только PostgreSQL). В моделях их нет:
+# autogenerate не умеет надежно сравнивать такие индексы и предлагал бы их удалить
+SEARCH_INDEXES = {"ix_users_name_prefix", "ix_users_name_trgm", "ix_users_bio_fts"}
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    """Фильтр autogenerate: индексы поиска управляются только миграциями"""
+    return not (type_ == "index" and name in SEARCH_INDEXES)
+
+
+def alembic_config(url: str = None, connection=None) -> Config:
+    """
+    ⚙️ Конфигурация Alembic для запуска из кода
+    url - другая БД вместо DB_*, connection - готовое соединение без открытой транзакции (ревизии фиксируются по одной)
+    """
+    config = Config(str(ALEMBIC_INI))
+    config.attributes["configure_logger"] = connection is None  # Не трогаем логирование вызывающего кода
+    if url:
+        # % в пароле - спецсимвол ConfigParser
+        config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def bootstrap(url: str = None, revision: str = "head") -> None:
+    """
+    🗃️ Приводит схему БД к ревизии revision (по умолчанию - последней)
+    База, созданная до миграций через create_all, сначала помечается BASELINE_REVISION,
+    чтобы Alembic не пытался создать уже существующие таблицы
+    """
+    config = alembic_config(url)
+    engine = create_engine(url or DATABASE_URL, poolclass=NullPool)
+    try:
+        tables = set(inspect(engine).get_table_names())
+    finally:
+        engine.dispose()
+
+    if "users" in tables and "alembic_version" not in tables:
+        print(f"Existing schema without migration history, stamping {BASELINE_REVISION}", file=sys.stderr)
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, revision)
+
+
+# 🚀 ТОЧКА ВХОДА ДЛЯ ПОДГОТОВКИ СХЕМЫ БД
+# Запускается один раз при деплое, до старта воркеров uvicorn (run.py схему не создает):
+#   python migrate.py                - применить все миграции
+#   python migrate.py --sql          - напечатать SQL без подключения к БД
+#   python migrate.py --url postgresql+psycopg2://...  - другая БД
+def main():
+    parser = argparse.ArgumentParser(description="Create or upgrade the database schema with Alembic migrations")
+    parser.add_argument("revision", nargs="?", default="head", help="Целевая ревизия (по умолчанию head)")
+    parser.add_argument("--url", help="URL БД (по умолчанию - из DB_* в .env)")
+    parser.add_argument("--sql", action="store_true", help="Только напечатать SQL миграций")
+    args = parser.parse_args()
+
+    if args.sql:
+        command.upgrade(alembic_config(args.url), args.revision, sql=True)
+    else:
+        bootstrap(args.url, args.revision)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# Импорт необходимых библиотек
+from logging.config import fileConfig  # Логирование из alembic.ini
+
+from alembic import context
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool  # Миграции - разовый процесс, пул не нужен
+
+from app import models  # noqa: F401 - регистрирует таблицы в Base.metadata
+from app.database import Base, DATABASE_URL
+from migrate import include_object  # Индексы поиска не сравниваются с моделями
+
+# 📜 ОКРУЖЕНИЕ МИГРАЦИЙ ALEMBIC
+# Запускается командами alembic и migrate.py. Источник URL по порядку:
+# готовое соединение в config.attributes["connection"] (тесты), -x url=..., sqlalchemy.url, DB_* из .env
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+# Метаданные моделей - для alembic revision --autogenerate
+target_metadata = Base.metadata
+
+
+def get_url() -> str:
+    """URL базы для миграций"""
+    return (
+        context.get_x_argument(as_dictionary=True).get("url")
+        or config.get_main_option("sqlalchemy.url")
+        or DATABASE_URL
+    )
+
+
+def run_migrations(connection):
+    """Выполняет миграции на открытом соединении"""
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        # Своя транзакция на каждую ревизию: autocommit_block (CREATE INDEX CONCURRENTLY в 0003)
+        # фиксирует только текущую, а не всю цепочку миграций
+        transaction_per_migration=True,
+        # SQLite не умеет ALTER COLUMN - изменения колонок идут через пересоздание таблицы
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_offline():
+    """--sql: печатает SQL миграций без подключения к БД (для ревью или ручного применения DBA)"""
+    context.configure(url=get_url(), target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Применяет миграции к БД"""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        run_migrations(connection)
+        return
+
+    engine = create_engine(get_url(), poolclass=NullPool)
+    try:
+        with engine.connect() as connection:
+            run_migrations(connection)
+    finally:
+        engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
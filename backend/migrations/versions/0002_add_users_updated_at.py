@@ -0,0 +1,37 @@
+"""add users.updated_at
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# Идентификаторы ревизии для Alembic
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # PostgreSQL 11+: now() вычисляется один раз, колонка добавляется без перезаписи таблицы,
+    # существующие строки получают время миграции.
+    # SQLite не умеет ADD COLUMN с DEFAULT CURRENT_TIMESTAMP - там таблица пересоздается (batch)
+    recreate = "always" if op.get_context().dialect.name == "sqlite" else "auto"
+    with op.batch_alter_table("users", recreate=recreate) as batch_op:
+        batch_op.add_column(
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False)
+        )
+    op.create_index(op.f("ix_users_updated_at"), "users", ["updated_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_users_updated_at"), table_name="users")
+    recreate = "always" if op.get_context().dialect.name == "sqlite" else "auto"
+    with op.batch_alter_table("users", recreate=recreate) as batch_op:
+        batch_op.drop_column("updated_at")
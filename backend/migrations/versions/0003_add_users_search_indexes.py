@@ -0,0 +1,72 @@
+"""add users search indexes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 16:00:00
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# Идентификаторы ревизии для Alembic
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def upgrade() -> None:
+    # Индексы GET /users/search (crud.search_users) - только PostgreSQL: SQLite в тестах ищет перебором.
+    # Выражения должны совпадать с запросом символ в символ (и правило сравнения тоже),
+    # иначе планировщик их не использует
+    if op.get_context().dialect.name != "postgresql":
+        return
+
+    create_trgm = True
+    # Подстрока имени: pg_trgm входит в contrib и есть почти везде, но не на любом хостинге.
+    # Без расширения поиск по подстроке работает, только перебором - миграция не падает
+    if not context.is_offline_mode():
+        create_trgm = bool(op.get_bind().execute(
+            sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        ).scalar())
+        if not create_trgm:
+            logger.warning("pg_trgm is not available, skipping ix_users_name_trgm (substring search will scan)")
+
+    # CONCURRENTLY не блокирует запись в users на время построения (минуты на миллионах строк),
+    # но не работает внутри транзакции: блок фиксирует предыдущие миграции и идет в autocommit.
+    # Прерванное построение оставляет невалидный индекс - DROP перед CREATE делает повтор безопасным
+    with op.get_context().autocommit_block():
+        if create_trgm:
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, definition in _indexes(create_trgm):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            op.execute(f"CREATE INDEX CONCURRENTLY {name} ON users {definition}")
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(_indexes(create_trgm=True)):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    # Расширение pg_trgm остается: им могут пользоваться другие объекты БД
+
+
+def _indexes(create_trgm: bool):
+    """(имя, определение) индексов поиска в порядке создания"""
+    indexes = [
+        # Префикс имени и порядок внутри уровня: побайтовое сравнение, чтобы LIKE 'q%' шел по btree
+        ("ix_users_name_prefix", '((lower(name) COLLATE "C"), id)'),
+        # Слова биографии: 'simple' без стемминга - одинаково для русского и английского
+        ("ix_users_bio_fts", "USING gin (to_tsvector('simple', coalesce(bio, '')))"),
+    ]
+    if create_trgm:
+        # Подстрока имени: lower(name) без COLLATE - как в запросе уровня подстроки
+        indexes.append(("ix_users_name_trgm", "USING gin (lower(name) gin_trgm_ops)"))
+    return indexes
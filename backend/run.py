@@ -1,14 +1,101 @@
 # Импорт ASGI сервера для запуска FastAPI приложения
+import argparse  # Разбор аргументов командной строки
+import importlib.util  # Проверка, установлены ли uvloop и httptools
+import os  # Для работы с переменными окружения
+
 import uvicorn
 
+
+# Свой разбор окружения, без импорта app: app.database читает настройки при импорте,
+# а WEB_CONCURRENCY для воркеров выставляется только в main()
+def _env_int(name: str, default: int) -> int:
+    """Целое число из переменной окружения (пустое значение = default)"""
+    value = os.getenv(name)
+    return default if value is None or value.strip() == "" else int(value)
+
+
+def default_workers() -> int:
+    """
+    Число воркеров: WEB_CONCURRENCY или число доступных процессу CPU
+    (sched_getaffinity учитывает cpuset контейнера; квоту CPU в cgroups - нет, ее задают через WEB_CONCURRENCY)
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS, Windows
+        cpus = os.cpu_count() or 1
+    return _env_int("WEB_CONCURRENCY", cpus)
+
+
+def production_config(host: str, port: int, workers: int) -> dict:
+    """
+    ⚙️ Настройки uvicorn для продакшена
+    - uvloop и httptools, если установлены (uvicorn[standard]), иначе asyncio и h11
+    - UVICORN_BACKLOG - очередь соединений, которые ядро держит до accept()
+    - UVICORN_KEEPALIVE - сколько секунд держать простаивающее keep-alive соединение
+      (должно быть больше, чем у балансировщика перед сервером, иначе он получает обрывы)
+    - UVICORN_LIMIT_CONCURRENCY - сверх этого числа одновременных соединений воркер отвечает 503,
+      а не копит очередь (0 = без лимита)
+    - UVICORN_GRACEFUL_TIMEOUT - сколько секунд после SIGTERM ждать текущие запросы; затем lifespan
+      приложения закрывает пулы соединений БД
+    """
+    return {
+        "host": host,
+        "port": port,
+        "workers": workers,
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "h11",
+        "backlog": _env_int("UVICORN_BACKLOG", 2048),
+        "timeout_keep_alive": _env_int("UVICORN_KEEPALIVE", 75),
+        "limit_concurrency": _env_int("UVICORN_LIMIT_CONCURRENCY", 0) or None,
+        "timeout_graceful_shutdown": _env_int("UVICORN_GRACEFUL_TIMEOUT", 30),
+        "proxy_headers": True,  # X-Forwarded-For/Proto от балансировщика
+        "forwarded_allow_ips": os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        "access_log": os.getenv("UVICORN_ACCESS_LOG", "").lower() in ("1", "true", "yes", "on"),
+        "server_header": False,
+        "log_level": "info",
+    }
+
+
 # 🚀 ТОЧКА ВХОДА ДЛЯ ЗАПУСКА СЕРВЕРА
 # Этот код выполняется только при прямом запуске файла (python run.py)
+#   python run.py                    - разработка: один процесс с автоперезагрузкой
+#   python run.py --prod [--workers N] - продакшен: несколько воркеров, без reload (или RUN_MODE=production)
+# Схема БД готовится отдельно перед запуском: python migrate.py
+def main():
+    parser = argparse.ArgumentParser(description="Run the User Management API")
+    parser.add_argument("--prod", action="store_true", default=os.getenv("RUN_MODE") == "production",
+                        help="Продакшен режим (по умолчанию - разработка с reload)")
+    parser.add_argument("--workers", type=int, help="Число воркеров (по умолчанию WEB_CONCURRENCY или число CPU)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"), help="0.0.0.0 - слушать все сетевые интерфейсы")
+    parser.add_argument("--port", type=int, default=_env_int("PORT", 8000), help="8000 - стандартный порт для FastAPI")
+    args = parser.parse_args()
+
+    if not args.prod:
+        # Запуск Uvicorn сервера для разработки
+        uvicorn.run(
+            "app.main:app",  # Путь к приложению: модуль app.main, переменная app
+            host=args.host,
+            port=args.port,
+            reload=True,     # Автоматическая перезагрузка при изменении кода (только для разработки)
+            log_level="info" # Уровень логирования: info - информационные сообщения
+        )
+        return
+
+    workers = args.workers or default_workers()
+    # Воркеры наследуют окружение: по WEB_CONCURRENCY каждый делит бюджет DB_MAX_CONNECTIONS (app/database.py)
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    # И продакшен режим: THREADPOOL_SIZE по умолчанию ограничивает threadpool размером пула
+    os.environ["RUN_MODE"] = "production"
+    from app.database import DB_POOL_SIZE, DB_MAX_OVERFLOW, THREADPOOL_SIZE
+
+    config = production_config(args.host, args.port, workers)
+    print(
+        f"Starting {workers} worker(s) with {config['loop']}/{config['http']}, "
+        f"DB pool {DB_POOL_SIZE}+{DB_MAX_OVERFLOW} and {THREADPOOL_SIZE} threads per worker "
+        f"(up to {workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)} DB connections)"
+    )
+    uvicorn.run("app.main:app", **config)
+
+
 if __name__ == "__main__":
-    # Запуск Uvicorn сервера с настройками
-    uvicorn.run(
-        "app.main:app",  # Путь к приложению: модуль app.main, переменная app
-        host="0.0.0.0",  # Хост: 0.0.0.0 - слушать все сетевые интерфейсы
-        port=8000,       # Порт: 8000 - стандартный порт для FastAPI
-        reload=True,     # Автоматическая перезагрузка при изменении кода (только для разработки)
-        log_level="info" # Уровень логирования: info - информационные сообщения
-    )
\ No newline at end of file
+    main()
@@ -2,7 +2,14 @@
 import pytest  # Фреймворк для написания и запуска тестов
 import os     # Для работы с операционной системой и переменными окружения
 import sys    # Для работы с системными параметрами и путями
+import shutil      # Поиск бинарников PostgreSQL и удаление временного кластера
+import socket      # Поиск свободного порта для временного кластера
+import subprocess  # Запуск initdb/pg_ctl
+import tempfile    # Временная папка кластера
+import time        # Длительность SQL запросов
+from contextlib import contextmanager
 from pathlib import Path  # Современный способ работы с путями файловой системы
+from typing import List, NamedTuple, Optional
 
 # 📍 НАСТРОЙКА PYTHONPATH ДЛЯ КОРРЕКТНЫХ ИМПОРТОВ
 # Добавляем корневую директорию проекта в PYTHONPATH
@@ -15,4 +22,477 @@ print(f"✅ PYTHONPATH настроен: {sys.path}")
 
 # 🧪 НАСТРОЙКА ТЕСТОВОГО ОКРУЖЕНИЯ
 # Устанавливаем переменную окружения для тестового режима
-os.environ['TESTING'] = 'True'  # Приложение может использовать это для тестовой конфигурации
\ No newline at end of file
+os.environ['TESTING'] = 'True'  # Приложение может использовать это для тестовой конфигурации
+from alembic import command
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool, StaticPool
+
+from app.main import app, get_db
+from app.database import DB_DRIVER
+from migrate import alembic_config
+
+# 🧪 НАСТРОЙКА ТЕСТОВОЙ БАЗЫ ДАННЫХ
+# TEST_DATABASE_URL задает тестовую БД, по умолчанию - SQLite в памяти.
+# При параллельном запуске (pytest -n auto, pytest-xdist) каждый воркер получает свою базу:
+#   - SQLite в памяти: воркер - отдельный процесс, база и так своя
+#   - SQLite файл: свой файл на воркер (test.db -> test_gw0.db, test_gw1.db, ...)
+#   - PostgreSQL: контроллер один раз создает шаблонную БД со схемой <имя>_template,
+#     воркер клонирует ее через CREATE DATABASE <имя>_gw0 TEMPLATE <имя>_template
+# Все базы воркеров удаляются в конце сессии
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL", "sqlite:///:memory:")
+
+# Ключи для хранения состояния сессии в config.stash
+DATABASE_URL_KEY = pytest.StashKey[str]()
+CLUSTER_KEY = pytest.StashKey["PostgresCluster"]()
+
+
+def get_test_database_url(config) -> str:
+    """URL тестовой БД: воркеры xdist получают его от контроллера через workerinput"""
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput and "test_database_url" in workerinput:
+        return workerinput["test_database_url"]
+    return config.stash.get(DATABASE_URL_KEY, TEST_DATABASE_URL)
+
+
+def get_worker_id(config) -> str:
+    """ID воркера xdist (gw0, gw1, ...) или master при обычном запуске"""
+    workerinput = getattr(config, "workerinput", None)
+    return workerinput["workerid"] if workerinput else "master"
+
+
+def worker_database_url(url: URL, worker_id: str) -> URL:
+    """URL базы конкретного воркера"""
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            return url
+        path = Path(url.database)
+        return url.set(database=str(path.with_name(f"{path.stem}_{worker_id}{path.suffix}")))
+    return url.set(database=f"{url.database}_{worker_id}")
+
+
+def template_database_name(url: URL) -> str:
+    """Имя шаблонной БД PostgreSQL со схемой"""
+    return f"{url.database}_template"
+
+
+def _run_admin(url: URL, *statements: str):
+    """DDL над базами (CREATE/DROP DATABASE) через служебную БД postgres вне транзакции"""
+    admin = create_engine(url.set(database="postgres"), isolation_level="AUTOCOMMIT", poolclass=NullPool)
+    try:
+        with admin.connect() as conn:
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+    finally:
+        admin.dispose()
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def create_template_database(url: URL):
+    """Создает шаблонную БД PostgreSQL и схему в ней (один раз на весь запуск)"""
+    template = template_database_name(url)
+    _run_admin(
+        url,
+        f"DROP DATABASE IF EXISTS {_quote(template)}",
+        # Тесты пишут кириллицу - кодировка не должна зависеть от настроек кластера
+        f"CREATE DATABASE {_quote(template)} ENCODING 'UTF8' TEMPLATE template0",
+    )
+
+    engine = create_engine(url.set(database=template), poolclass=NullPool)
+    try:
+        apply_migrations(engine)
+    finally:
+        # У шаблона не должно остаться соединений, иначе CREATE DATABASE ... TEMPLATE упадет
+        engine.dispose()
+
+
+def apply_migrations(engine):
+    """Схема тестовой БД - теми же миграциями Alembic, что и в продакшене (migrate.py)"""
+    # Без внешней транзакции: ревизии фиксируются сами, а CREATE INDEX CONCURRENTLY идет в autocommit
+    with engine.connect() as connection:
+        command.upgrade(alembic_config(connection=connection), "head")
+
+
+def drop_database(url: URL, name: str):
+    """Удаляет БД PostgreSQL, если она есть"""
+    _run_admin(url, f"DROP DATABASE IF EXISTS {_quote(name)}")
+
+
+def find_pg_bin() -> Optional[Path]:
+    """Папка с initdb/pg_ctl: PG_BIN, PATH, pg_config --bindir или /usr/lib/postgresql/<версия>/bin"""
+    candidates = []
+    if os.environ.get("PG_BIN"):
+        candidates.append(Path(os.environ["PG_BIN"]))
+    if shutil.which("pg_ctl"):
+        candidates.append(Path(shutil.which("pg_ctl")).parent)
+    if shutil.which("pg_config"):
+        bindir = subprocess.run(["pg_config", "--bindir"], capture_output=True, text=True).stdout.strip()
+        if bindir:
+            candidates.append(Path(bindir))
+    candidates.extend(sorted(Path("/usr/lib/postgresql").glob("*/bin"), reverse=True))
+
+    for candidate in candidates:
+        if (candidate / "initdb").exists() and (candidate / "pg_ctl").exists():
+            return candidate
+    return None
+
+
+class PostgresCluster:
+    """
+    🐘 Временный кластер PostgreSQL для тестов
+    initdb во временную папку, pg_ctl start на случайном порту, после тестов - stop и удаление папки.
+    Надежность данных тестам не нужна, поэтому fsync и прочие гарантии записи выключены
+    """
+
+    SETTINGS = {
+        "fsync": "off",
+        "synchronous_commit": "off",
+        "full_page_writes": "off",
+        "wal_level": "minimal",
+        "max_wal_senders": "0",
+        "shared_buffers": "128MB",
+        "listen_addresses": "127.0.0.1",
+    }
+
+    def __init__(self, bin_dir: Path):
+        self.bin_dir = bin_dir
+        self.directory = None
+        self.port = None
+
+    @property
+    def data_dir(self) -> Path:
+        return self.directory / "data"
+
+    def _run(self, program: str, *args: str):
+        """Запускает initdb/pg_ctl; при ошибке показывает их вывод и лог сервера"""
+        try:
+            subprocess.run([str(self.bin_dir / program), *args], check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as exc:
+            log = self.directory / "postgres.log"
+            details = exc.stderr or exc.stdout
+            if log.exists():
+                details += log.read_text()[-2000:]
+            raise RuntimeError(f"{program} failed: {details}") from exc
+
+    def start(self):
+        self.directory = Path(tempfile.mkdtemp(prefix="pytest-pg-"))
+        self._run(
+            "initdb", "-D", str(self.data_dir), "-U", "postgres", "--auth=trust",
+            "--encoding=UTF8", "--no-locale", "--no-sync",
+        )
+
+        # Свободный порт выбирает ОС; сокет закрывается прямо перед стартом сервера
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+
+        settings = dict(self.SETTINGS, port=str(self.port), unix_socket_directories=str(self.directory))
+        options = " ".join(f"-c {name}={value}" for name, value in settings.items())
+        self._run(
+            "pg_ctl", "-D", str(self.data_dir), "-o", options,
+            "-l", str(self.directory / "postgres.log"), "-w", "start",
+        )
+
+    def stop(self):
+        if self.directory is None:
+            return
+        try:
+            self._run("pg_ctl", "-D", str(self.data_dir), "-m", "immediate", "-w", "stop")
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+    def url(self, database: str) -> URL:
+        return URL.create(
+            f"postgresql+{DB_DRIVER}", username="postgres", host="127.0.0.1", port=self.port, database=database,
+        )
+
+
+def enable_sqlite_savepoints(engine):
+    """
+    🩹 Обход для драйвера pysqlite: без него SAVEPOINT не работают
+    pysqlite сам решает, когда открыть транзакцию, и не делает BEGIN перед SAVEPOINT.
+    Отключаем его логику и отправляем BEGIN сами, когда транзакцию начинает SQLAlchemy
+    """
+
+    @event.listens_for(engine, "connect")
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def do_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+
+# 📝 ЗАПИСЬ SQL ЗАПРОСОВ
+# Служебные запросы изоляции тестов (BEGIN от обхода pysqlite и SAVEPOINT от db_session)
+# к коду приложения не относятся и не считаются
+SERVICE_STATEMENTS = ("BEGIN", "SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+class CapturedQuery(NamedTuple):
+    statement: str
+    parameters: object
+    duration: float  # секунды
+
+
+class QueryRecorder:
+    """
+    📝 Записывает SQL запросы движка и их длительность внутри блока with
+    Ловятся запросы из всех потоков, в том числе из обработчиков, вызванных через TestClient
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.queries: List[CapturedQuery] = []
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_started")
+        if not started:
+            return  # Запрос начался до подписки на события
+        duration = time.perf_counter() - started.pop()
+        if not statement.lstrip().upper().startswith(SERVICE_STATEMENTS):
+            self.queries.append(CapturedQuery(statement, parameters, duration))
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._before)
+        event.listen(self.engine, "after_cursor_execute", self._after)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._before)
+        event.remove(self.engine, "after_cursor_execute", self._after)
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def statements(self) -> List[str]:
+        return [query.statement for query in self.queries]
+
+    @property
+    def total_ms(self) -> float:
+        return sum(query.duration for query in self.queries) * 1000
+
+    def dump(self) -> str:
+        """Запросы с длительностью и параметрами - для сообщения об ошибке"""
+        lines = [f"{self.count} queries, {self.total_ms:.2f} ms total:"]
+        for n, query in enumerate(self.queries, start=1):
+            lines.append(f"  {n}. [{query.duration * 1000:.2f} ms] {query.statement}")
+            lines.append(f"     parameters: {query.parameters!r}")
+        return "\n".join(lines)
+
+
+# 🪝 ХУКИ PYTEST
+# Хуки без workerinput выполняются в контроллере xdist (или в единственном процессе без xdist):
+# контроллер один раз поднимает кластер и шаблонную БД, воркеры получают URL через workerinput
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--db-backend",
+        choices=("sqlite", "postgresql"),
+        default=None,
+        help="sqlite - SQLite in memory; postgresql - throwaway local PostgreSQL cluster started "
+             "with initdb/pg_ctl (PG_BIN points to the binaries). Default: TEST_DATABASE_URL or SQLite",
+    )
+
+
+def pytest_configure(config):
+    """Выбирает тестовую БД и при необходимости поднимает временный кластер PostgreSQL"""
+    if hasattr(config, "workerinput"):
+        return
+
+    backend = config.getoption("db_backend")
+    if backend == "postgresql":
+        bin_dir = find_pg_bin()
+        if bin_dir is None:
+            raise pytest.UsageError("--db-backend=postgresql: initdb/pg_ctl not found, set PG_BIN")
+        cluster = PostgresCluster(bin_dir)
+        try:
+            cluster.start()
+        except RuntimeError as exc:
+            cluster.stop()
+            raise pytest.UsageError(f"--db-backend=postgresql: {exc}")
+        config.stash[CLUSTER_KEY] = cluster
+        config.stash[DATABASE_URL_KEY] = cluster.url("test_db").render_as_string(hide_password=False)
+    elif backend == "sqlite":
+        config.stash[DATABASE_URL_KEY] = "sqlite:///:memory:"
+    else:
+        config.stash[DATABASE_URL_KEY] = TEST_DATABASE_URL
+
+
+def pytest_unconfigure(config):
+    """Останавливает временный кластер"""
+    cluster = config.stash.get(CLUSTER_KEY, None)
+    if cluster is not None:
+        cluster.stop()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """pytest-xdist: передает воркеру URL тестовой БД контроллера"""
+    node.workerinput["test_database_url"] = node.config.stash[DATABASE_URL_KEY]
+
+
+def pytest_sessionstart(session):
+    """Готовит шаблонную БД PostgreSQL для воркеров"""
+    url = make_url(get_test_database_url(session.config))
+    if url.get_backend_name() == "postgresql" and not hasattr(session.config, "workerinput"):
+        create_template_database(url)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Удаляет шаблонную БД PostgreSQL"""
+    url = make_url(get_test_database_url(session.config))
+    if url.get_backend_name() == "postgresql" and not hasattr(session.config, "workerinput"):
+        drop_database(url, template_database_name(url))
+
+
+# 🎯 ФИКСТУРЫ PYTEST
+# Схема создается ОДИН раз за сессию, а каждый тест работает внутри внешней транзакции,
+# которая откатывается после теста. Это в разы дешевле create_all/drop_all на каждый тест,
+# особенно на настоящем PostgreSQL, где DDL дорогой
+
+@pytest.fixture(scope="session")
+def db_engine(request):
+    """
+    Фикстура: движок БД текущего воркера со схемой, созданной один раз на всю сессию
+    """
+    base_url = make_url(get_test_database_url(request.config))
+    url = worker_database_url(base_url, get_worker_id(request.config))
+
+    if url.get_backend_name() == "postgresql":
+        # Копия шаблона со схемой - быстрее, чем миграции в каждом воркере
+        drop_database(base_url, url.database)
+        _run_admin(
+            base_url,
+            f"CREATE DATABASE {_quote(url.database)} TEMPLATE {_quote(template_database_name(base_url))}",
+        )
+        engine = create_engine(url)
+    elif url.database in (None, "", ":memory:"):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},  # Разрешаем использование в разных потоках
+            poolclass=StaticPool,  # Одно соединение на все тесты - in-memory база живет, пока оно открыто
+        )
+    else:
+        Path(url.database).unlink(missing_ok=True)  # Файл от прерванного прошлого запуска
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+
+    if url.get_backend_name() == "sqlite":
+        enable_sqlite_savepoints(engine)
+        print("🔄 Создание схемы тестовой БД...")
+        apply_migrations(engine)
+
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        if url.get_backend_name() == "postgresql":
+            drop_database(base_url, url.database)
+        elif url.database not in (None, "", ":memory:"):
+            Path(url.database).unlink(missing_ok=True)
+
+
+@pytest.fixture(scope="function")
+def db_connection(db_engine):
+    """
+    Фикстура: соединение с открытой внешней транзакцией, откатываемой после теста
+    """
+    connection = db_engine.connect()
+    transaction = connection.begin()
+    try:
+        yield connection
+    finally:
+        # Все, что тест записал (включая "закоммиченное"), исчезает вместе с транзакцией
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture(scope="function")
+def db_session(db_connection):
+    """
+    Фикстура: сессия для теста внутри внешней транзакции
+    - commit() в коде приложения фиксирует только SAVEPOINT, а не внешнюю транзакцию
+    - rollback() откатывает до последнего SAVEPOINT
+    - После теста внешняя транзакция откатывается - следующий тест видит пустые таблицы
+    """
+    session = Session(
+        bind=db_connection,
+        autoflush=False,
+        join_transaction_mode="create_savepoint",
+    )
+    try:
+        yield session
+    finally:
+        session.close()
+        print("🔄 Откат тестовой транзакции...")
+
+
+@pytest.fixture(scope="function")
+def client(db_session):
+    """
+    Фикстура: создает тестового клиента FastAPI с подменой зависимостей
+    - Заменяет реальную БД на тестовую (то же соединение и транзакция, что у db_session)
+    - Создает тестовый клиент для HTTP запросов
+    - Очищает подмены после теста
+    """
+
+    def override_get_db():
+        """Функция для подмены реальной БД на тестовую"""
+        yield db_session
+
+    # 🔄 ПОДМЕНА ЗАВИСИМОСТЕЙ
+    app.dependency_overrides[get_db] = override_get_db
+
+    # Создаем тестовый клиент - специальный клиент для тестирования FastAPI
+    client = TestClient(app)
+
+    # Отдаем клиент тесту
+    yield client
+
+    # Очищаем подмены зависимостей после теста
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture(scope="function")
+def query_recorder(db_engine):
+    """
+    Фикстура: запись SQL запросов без проверок
+        with query_recorder() as queries:
+            ...
+        assert queries.statements[0].startswith("INSERT")
+    """
+    return lambda: QueryRecorder(db_engine)
+
+
+@pytest.fixture(scope="function")
+def assert_queries(db_engine):
+    """
+    Фикстура: проверка числа и времени SQL запросов в блоке with
+        with assert_queries(1):
+            client.get("/users/")
+        with assert_queries(max_time_ms=50):
+            ...
+    При ошибке в сообщение попадают все выполненные запросы
+    """
+
+    @contextmanager
+    def check(count: Optional[int] = None, max_time_ms: Optional[float] = None):
+        with QueryRecorder(db_engine) as recorder:
+            yield recorder
+        if count is not None and recorder.count != count:
+            raise AssertionError(f"Expected {count} queries, got {recorder.count}\n{recorder.dump()}")
+        if max_time_ms is not None and recorder.total_ms > max_time_ms:
+            raise AssertionError(f"Expected at most {max_time_ms} ms in the database\n{recorder.dump()}")
+
+    return check
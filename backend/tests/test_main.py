@@ -1,100 +1,30 @@
 
+import json
+import time
+
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
-from app.main import app, get_db
+from app import models
 from app.models import Base
 from app.schemas import UserCreate
 
-# 🧪 НАСТРОЙКА ТЕСТОВОЙ БАЗЫ ДАННЫХ
-# SQLite in-memory база - создается в оперативной памяти, исчезает после тестов
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
-
-# Создание движка БД для тестов
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},  # Разрешаем использование в разных потоках
-    poolclass=StaticPool,  # Простой пул соединений для тестов (не для продакшена)
-)
-
-# Фабрика сессий для тестовой БД
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-
-# 🎯 ФИКСТУРЫ PYTEST
-# Фикстура - специальная функция, которая подготавливает данные для тестов
-# scope="function" - фикстура пересоздается для каждого теста
-
-@pytest.fixture(scope="function")
-def db_session():
-    """
-    Фикстура: создает и очищает тестовую БД для каждого теста
-    - Создает таблицы перед тестом
-    - Удаляет таблицы после теста
-    - Обеспечивает изоляцию тестов
-    """
-    print("🔄 Создание тестовой БД...")
-
-    # Создаем все таблицы в БД перед тестом
-    Base.metadata.create_all(bind=engine)
-
-    # Создаем сессию для работы с БД
-    session = TestingSessionLocal()
-
-    try:
-        # yield разделяет код на "до теста" и "после теста"
-        # Здесь выполняется сам тест
-        yield session
-    finally:
-        # Очистка после теста (выполняется даже если тест упал)
-        session.close()
-        Base.metadata.drop_all(bind=engine)  # Удаляем таблицы после теста
-        print("🔄 Очистка тестовой БД...")
-
-
-@pytest.fixture(scope="function")
-def client(db_session):
-    """
-    Фикстура: создает тестового клиента FastAPI с подменой зависимостей
-    - Заменяет реальную БД на тестовую
-    - Создает тестовый клиент для HTTP запросов
-    - Очищает подмены после теста
-    """
-
-    def override_get_db():
-        """Функция для подмены реальной БД на тестовую"""
-        try:
-            yield db_session
-        finally:
-            pass
-
-    # 🔄 ПОДМЕНА ЗАВИСИМОСТЕЙ
-    # Заменяем реальное подключение к БД на тестовое
-    app.dependency_overrides[get_db] = override_get_db
-
-    # Создаем тестовый клиент - специальный клиент для тестирования FastAPI
-    client = TestClient(app)
-
-    # Отдаем клиент тесту
-    yield client
-
-    # Очищаем подмены зависимостей после теста
-    app.dependency_overrides.clear()
+# 🎯 Фикстуры db_engine, db_session, client и assert_queries - в conftest.py
 
 
 # 🧪 ТЕСТЫ ДЛЯ API УПРАВЛЕНИЯ ПОЛЬЗОВАТЕЛЯМИ
 class TestUserManagementAPI:
     """📋 Тесты для API управления пользователями"""
 
-    def test_root_endpoint(self, client):
+    def test_root_endpoint(self, client, assert_queries):
         """✅ Проверяет, что корневой эндпоинт возвращает правильное сообщение"""
         print("🧪 Тест: Корневой эндпоинт")
 
-        # Отправляем GET запрос на корневой эндпоинт
-        response = client.get("/")
+        # Отправляем GET запрос на корневой эндпоинт (в БД он не ходит)
+        with assert_queries(0):
+            response = client.get("/")
 
         # Проверяем статус код (200 OK - успешный запрос)
         assert response.status_code == 200, "Код статуса должен быть 200"
@@ -105,7 +35,21 @@ class TestUserManagementAPI:
 
         print("✅ Корневой эндпоинт работает корректно")
 
-    def test_create_user_success(self, client, db_session):
+    def test_health_db_endpoint(self, client, assert_queries):
+        """✅ Проверяет эндпоинт состояния БД и пула соединений"""
+        print("🧪 Тест: Состояние БД")
+
+        with assert_queries(1):
+            response = client.get("/health/db")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "ok"
+        assert set(data["pool"]) == {"pool_class", "size", "checkedin", "checkedout", "overflow"}
+
+        print("✅ Эндпоинт состояния БД работает")
+
+    def test_create_user_success(self, client, db_session, assert_queries):
         """✅ Проверяет успешное создание пользователя со всеми полями"""
         print("🧪 Тест: Создание пользователя (успешный сценарий)")
 
@@ -116,7 +60,9 @@ class TestUserManagementAPI:
         }
 
         # Отправляем POST запрос для создания пользователя
-        response = client.post("/users/", json=user_data)
+        # (один INSERT ... ON CONFLICT ... RETURNING без предварительного SELECT)
+        with assert_queries(1):
+            response = client.post("/users/", json=user_data)
 
         # 201 Created - успешное создание ресурса
         assert response.status_code == 201, "Код статуса должен быть 201 (Created)"
@@ -132,7 +78,7 @@ class TestUserManagementAPI:
 
         print(f"✅ Пользователь создан: ID={data['id']}, Email={data['email']}")
 
-    def test_create_user_minimal_data(self, client, db_session):
+    def test_create_user_minimal_data(self, client, db_session, assert_queries):
         """✅ Проверяет создание пользователя только с обязательными полями"""
         print("🧪 Тест: Создание пользователя (минимальные данные)")
 
@@ -142,7 +88,8 @@ class TestUserManagementAPI:
             # bio отсутствует - должно работать (опциональное поле)
         }
 
-        response = client.post("/users/", json=user_data)
+        with assert_queries(1):
+            response = client.post("/users/", json=user_data)
 
         assert response.status_code == 201
         data = response.json()
@@ -153,7 +100,7 @@ class TestUserManagementAPI:
 
         print("✅ Пользователь с минимальными данными создан успешно")
 
-    def test_create_user_duplicate_email(self, client, db_session):
+    def test_create_user_duplicate_email(self, client, db_session, assert_queries):
         """❌ Проверяет обработку дублирующихся email"""
         print("🧪 Тест: Попытка создания пользователя с дублирующимся email")
 
@@ -169,7 +116,8 @@ class TestUserManagementAPI:
         print(f"✅ Первый пользователь создан: {response1.json()['email']}")
 
         # Второй запрос с тем же email - должен вернуть ошибку
-        response2 = client.post("/users/", json=user_data)
+        with assert_queries(1):
+            response2 = client.post("/users/", json=user_data)
 
         # 400 Bad Request - некорректный запрос (дубликат email)
         assert response2.status_code == 400, "Должна быть ошибка 400"
@@ -178,7 +126,7 @@ class TestUserManagementAPI:
 
         print("✅ Дублирующий email корректно отклонен")
 
-    def test_create_user_invalid_email(self, client, db_session):
+    def test_create_user_invalid_email(self, client, db_session, assert_queries):
         """❌ Проверяет валидацию некорректного email"""
         print("🧪 Тест: Валидация некорректного email")
 
@@ -188,7 +136,9 @@ class TestUserManagementAPI:
             "bio": "Тестовая биография"
         }
 
-        response = client.post("/users/", json=user_data)
+        # Невалидный запрос отклоняется до обращения к БД
+        with assert_queries(0):
+            response = client.post("/users/", json=user_data)
 
         # 422 Unprocessable Entity - ошибка валидации данных
         assert response.status_code == 422, "Должна быть ошибка валидации 422"
@@ -216,17 +166,88 @@ class TestUserManagementAPI:
         assert response.status_code == 422, "Должна быть ошибка без email"
         print("✅ Отсутствие email корректно обнаружено")
 
-    def test_get_users_empty_list(self, client, db_session):
+    def test_create_users_bulk(self, client, db_session, assert_queries):
+        """✅ Проверяет массовое создание пользователей со статусом по каждому элементу"""
+        print("🧪 Тест: Массовое создание пользователей")
+
+        # Один пользователь уже существует
+        client.post("/users/", json={"name": "Existing", "email": "existing@example.com"})
+
+        payload = [
+            {"name": "Bulk One", "email": "bulk1@example.com", "bio": "Bio 1"},
+            {"name": "Existing Again", "email": "existing@example.com"},
+            {"name": "Bulk Two", "email": "bulk2@example.com"},
+            {"name": "Bulk One Again", "email": "bulk1@example.com"},  # Повтор внутри запроса
+        ]
+        # Вся пачка - один многострочный INSERT
+        with assert_queries(1):
+            response = client.post("/users/bulk", json=payload)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 2
+        assert data["duplicates"] == 2
+        assert [r["status"] for r in data["results"]] == ["created", "duplicate", "created", "duplicate"]
+        assert [r["email"] for r in data["results"]] == [u["email"] for u in payload]
+        assert data["results"][1]["id"] is None
+
+        # Созданные пользователи доступны по выданным ID
+        created_id = data["results"][0]["id"]
+        user = client.get(f"/users/{created_id}").json()
+        assert user["name"] == "Bulk One"
+        assert user["bio"] == "Bio 1"
+
+        print("✅ Массовое создание работает корректно")
+
+    def test_create_users_bulk_validation(self, client, db_session, assert_queries):
+        """❌ Проверяет, что невалидный элемент отклоняет весь запрос"""
+        print("🧪 Тест: Валидация массового создания")
+
+        payload = [
+            {"name": "Valid", "email": "valid@example.com"},
+            {"name": "Invalid", "email": "invalid-email-format"},
+        ]
+        with assert_queries(0):
+            response = client.post("/users/bulk", json=payload)
+
+        assert response.status_code == 422
+        assert client.get("/users/").json() == [], "Ничего не должно быть вставлено"
+
+        print("✅ Невалидный элемент корректно отклонен")
+
+    def test_create_users_bulk_rejects_overlong_fields(self, client, db_session, assert_queries):
+        """❌ Проверяет, что длина name/email проверяется схемой, а не падает в БД"""
+        print("🧪 Тест: Длина полей при массовом создании")
+
+        from app.schemas import EMAIL_MAX_LENGTH, NAME_MAX_LENGTH
+
+        payload = [
+            {"name": "Valid", "email": "valid@example.com"},
+            {"name": "N" * (NAME_MAX_LENGTH + 1), "email": "long-name@example.com"},
+            {"name": "Long Email", "email": "e" * 60 + "@" + "d" * (EMAIL_MAX_LENGTH - 60) + ".com"},
+        ]
+        # PostgreSQL отклонил бы всю пачку с DataError (500); схема отвечает 422 до запросов к БД
+        with assert_queries(0):
+            response = client.post("/users/bulk", json=payload)
+
+        assert response.status_code == 422
+        assert {tuple(error["loc"][1:]) for error in response.json()["detail"]} == {(1, "name"), (2, "email")}
+        assert client.post("/users/", json=payload[1]).status_code == 422
+
+        print("✅ Слишком длинные поля отклонены валидацией")
+
+    def test_get_users_empty_list(self, client, db_session, assert_queries):
         """✅ Проверяет получение пустого списка пользователей"""
         print("🧪 Тест: Получение пустого списка пользователей")
 
-        response = client.get("/users/")
+        with assert_queries(2):  # Версия таблицы для ETag + страница
+            response = client.get("/users/")
 
         assert response.status_code == 200
         assert response.json() == [], "Список должен быть пустым"
         print("✅ Пустой список пользователей возвращен корректно")
 
-    def test_get_users_with_data(self, client, db_session):
+    def test_get_users_with_data(self, client, db_session, assert_queries):
         """✅ Проверяет получение списка пользователей с данными"""
         print("🧪 Тест: Получение списка пользователей")
 
@@ -246,7 +267,9 @@ class TestUserManagementAPI:
         print(f"✅ Создано {len(created_users)} тестовых пользователей")
 
         # Получаем всех пользователей
-        response = client.get("/users/")
+        # Список - один SELECT независимо от числа пользователей
+        with assert_queries(2):
+            response = client.get("/users/")
         assert response.status_code == 200
         users = response.json()
 
@@ -261,7 +284,7 @@ class TestUserManagementAPI:
 
         print(f"✅ Получен список из {len(users)} пользователей")
 
-    def test_get_users_pagination(self, client, db_session):
+    def test_get_users_pagination(self, client, db_session, assert_queries):
         """✅ Проверяет пагинацию при получении пользователей"""
         print("🧪 Тест: Пагинация списка пользователей")
 
@@ -277,7 +300,8 @@ class TestUserManagementAPI:
         # 📊 ТЕСТИРУЕМ ПАГИНАЦИЮ
         # skip=1 - пропустить первого пользователя
         # limit=2 - вернуть только 2 пользователя
-        response = client.get("/users/?skip=1&limit=2")
+        with assert_queries(2):
+            response = client.get("/users/?skip=1&limit=2")
         assert response.status_code == 200
         users = response.json()
 
@@ -287,7 +311,345 @@ class TestUserManagementAPI:
 
         print("✅ Пагинация работает корректно")
 
-    def test_get_user_by_id_success(self, client, db_session):
+    def test_get_users_cursor_pagination(self, client, db_session, assert_queries):
+        """✅ Проверяет keyset-пагинацию через курсор из заголовка X-Next-Cursor"""
+        print("🧪 Тест: Курсорная пагинация списка пользователей")
+
+        # Создаем 5 пользователей
+        for i in range(5):
+            client.post("/users/", json={"name": f"User {i}", "email": f"cursor{i}@example.com"})
+
+        # Первая страница - обычный запрос без курсора
+        response = client.get("/users/?limit=2")
+        assert response.status_code == 200
+        pages = [response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        assert cursor is not None, "Полная страница должна вернуть курсор"
+
+        # Идем по курсорам, пока сервер их отдает
+        while cursor is not None:
+            with assert_queries(2):
+                response = client.get("/users/", params={"limit": 2, "cursor": cursor})
+            assert response.status_code == 200
+            pages.append(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+
+        names = [user["name"] for page in pages for user in page]
+        assert names == [f"User {i}" for i in range(5)], "Страницы должны идти подряд без пропусков и повторов"
+        assert [len(page) for page in pages] == [2, 2, 1]
+
+        print("✅ Курсорная пагинация работает корректно")
+
+    def test_get_users_invalid_cursor(self, client, db_session, assert_queries):
+        """❌ Проверяет обработку поврежденного курсора"""
+        print("🧪 Тест: Некорректный курсор")
+
+        with assert_queries(0):
+            response = client.get("/users/?cursor=not-a-cursor!")
+
+        assert response.status_code == 400
+        assert "cursor" in response.json()["detail"].lower()
+
+        print("✅ Некорректный курсор корректно отклонен")
+
+    def test_get_users_fast_serialization_matches_response_model(self, client, db_session, monkeypatch, assert_queries):
+        """✅ Проверяет, что быстрая сериализация списка отдает то же, что обычный путь через response_model"""
+        print("🧪 Тест: Быстрая сериализация списка пользователей")
+
+        from app import serialization
+
+        for i in range(3):
+            client.post("/users/", json={"name": f"Юзер {i}", "email": f"fast{i}@example.com", "bio": None if i else "Био"})
+
+        responses = {}
+        for fast in (True, False):
+            monkeypatch.setattr(serialization, "FAST_SERIALIZATION", fast)
+            with assert_queries(2):
+                responses[fast] = client.get("/users/?limit=2")
+
+        fast_response, slow_response = responses[True], responses[False]
+        assert fast_response.status_code == slow_response.status_code == 200
+        assert fast_response.headers["content-type"] == slow_response.headers["content-type"]
+        assert fast_response.json() == slow_response.json()
+        assert list(fast_response.json()[0]) == list(slow_response.json()[0]), "Порядок ключей как у схемы User"
+        assert fast_response.headers["X-Next-Cursor"] == slow_response.headers["X-Next-Cursor"]
+
+        # Схема в OpenAPI не изменилась - список User
+        schema = client.get("/openapi.json").json()
+        response_schema = schema["paths"]["/users/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert response_schema["items"]["$ref"] == "#/components/schemas/User"
+
+        print("✅ Быстрая сериализация совпадает с обычной")
+
+    def test_get_users_conditional_get(self, client, db_session, assert_queries):
+        """✅ Проверяет ETag/Cache-Control списка и 304 Not Modified без чтения строк"""
+        print("🧪 Тест: Условный GET списка пользователей")
+
+        for i in range(2):
+            client.post("/users/", json={"name": f"Poll {i}", "email": f"poll{i}@example.com"})
+
+        first = client.get("/users/?limit=10")
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        assert etag.startswith('W/"')
+        assert first.headers["Cache-Control"] == "private, no-cache"
+        assert "Last-Modified" in first.headers
+
+        # Данные не менялись - пустой 304 после одного запроса версии
+        with assert_queries(1):
+            cached = client.get("/users/?limit=10", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["ETag"] == etag
+
+        # Другая страница - другой ресурс, чужой ETag не подходит
+        assert client.get("/users/?limit=1", headers={"If-None-Match": etag}).status_code == 200
+        # С ?count= ответ несет X-Total-Count - ETag ответа без числа не подходит
+        counted = client.get("/users/?limit=10&count=exact", headers={"If-None-Match": etag})
+        assert counted.status_code == 200 and counted.headers["X-Total-Count"] == "2"
+        assert client.get(
+            "/users/?limit=10&count=exact", headers={"If-None-Match": counted.headers["ETag"]}
+        ).status_code == 304
+
+        # Новый пользователь меняет версию коллекции
+        client.post("/users/", json={"name": "Poll 2", "email": "poll2@example.com"})
+        changed = client.get("/users/?limit=10", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+        assert len(changed.json()) == 3
+
+        print("✅ Условный GET списка работает корректно")
+
+    def test_get_users_total_count(self, client, db_session, monkeypatch, assert_queries):
+        """✅ Проверяет X-Total-Count во всех режимах ?count= и отказ от COUNT(*) на большой таблице"""
+        print("🧪 Тест: Общее число пользователей в списке")
+
+        from app import cache, crud
+        from app.cache import InMemoryCache
+
+        monkeypatch.setattr(cache, "users_count_cache", InMemoryCache(maxsize=1, ttl=60))
+        for i in range(3):
+            client.post("/users/", json={"name": f"Total {i}", "email": f"total{i}@example.com"})
+
+        # Без ?count= подсчета нет: версия и страница, как раньше
+        with assert_queries(2):
+            plain = client.get("/users/?limit=2")
+        assert "X-Total-Count" not in plain.headers
+
+        exact = client.get("/users/?limit=2&count=exact")
+        assert len(exact.json()) == 2
+        assert exact.headers["X-Total-Count"] == "3"
+        assert exact.headers["X-Total-Count-Mode"] == "exact"
+
+        # Без статистики pg_class (SQLite, свежая таблица PostgreSQL) оценка - точный подсчет
+        estimated = client.get("/users/?count=estimated")
+        if estimated.headers["X-Total-Count-Mode"] == "exact":
+            assert estimated.headers["X-Total-Count"] == "3"
+
+        # cached: число живет TTL и не пересчитывается при создании пользователей
+        assert client.get("/users/?count=cached").headers["X-Total-Count"] == "3"
+        client.post("/users/", json={"name": "Total 3", "email": "total3@example.com"})
+        cached = client.get("/users/?count=cached")
+        assert cached.headers["X-Total-Count"] == "3"
+        assert cached.headers["X-Total-Count-Mode"] == "cached"
+        assert client.get("/users/?count=exact").headers["X-Total-Count"] == "4"
+
+        # Большая таблица: exact отдает оценку вместо COUNT(*), cached ее не запоминает
+        monkeypatch.setattr(cache, "users_count_cache", InMemoryCache(maxsize=1, ttl=60))
+        monkeypatch.setattr(crud, "estimate_users_count", lambda db: 5_000_000)
+        for mode in ("exact", "cached"):
+            with assert_queries(2) as queries:
+                big = client.get(f"/users/?count={mode}")
+            assert big.headers["X-Total-Count"] == "5000000"
+            assert big.headers["X-Total-Count-Mode"] == "estimated"
+            assert not any("count(" in sql.lower() for sql, _, _ in queries.queries)
+
+        assert client.get("/users/?count=all").status_code == 422
+
+        print("✅ X-Total-Count работает во всех режимах")
+
+    def test_get_user_conditional_get(self, client, db_session):
+        """✅ Проверяет ETag/Last-Modified пользователя, If-None-Match и If-Modified-Since"""
+        print("🧪 Тест: Условный GET пользователя")
+
+        user_id = client.post("/users/", json={"name": "Etag", "email": "etag@example.com"}).json()["id"]
+
+        first = client.get(f"/users/{user_id}")
+        assert first.status_code == 200
+        etag, last_modified = first.headers["ETag"], first.headers["Last-Modified"]
+
+        cached = client.get(f"/users/{user_id}", headers={"If-None-Match": f'"other", {etag}'})
+        assert cached.status_code == 304
+        assert cached.headers["ETag"] == etag
+
+        assert client.get(f"/users/{user_id}", headers={"If-Modified-Since": last_modified}).status_code == 304
+        assert client.get(f"/users/{user_id}", headers={"If-None-Match": '"other"'}).status_code == 200
+        # If-None-Match важнее If-Modified-Since
+        stale = client.get(f"/users/{user_id}", headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified})
+        assert stale.status_code == 200
+        assert stale.json()["email"] == "etag@example.com"
+
+        print("✅ Условный GET пользователя работает корректно")
+
+    def test_export_users_ndjson_and_csv(self, client, db_session, assert_queries):
+        """✅ Проверяет потоковую выгрузку пользователей в NDJSON и CSV"""
+        print("🧪 Тест: Выгрузка пользователей")
+
+        import csv
+        import io
+        import json
+
+        client.post("/users/bulk", json=[
+            {"name": f"Export {i}", "email": f"export{i}@example.com", "bio": "Bio, с запятой" if i == 0 else None}
+            for i in range(3)
+        ])
+
+        # Вся выгрузка - один SELECT с серверным курсором
+        with assert_queries(1):
+            response = client.get("/users/export")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["name"] for row in rows] == ["Export 0", "Export 1", "Export 2"]
+        assert set(rows[0]) == {"id", "name", "email", "bio"}
+
+        with assert_queries(1):
+            response = client.get("/users/export?format=csv")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert 'filename="users.csv"' in response.headers["content-disposition"]
+        records = list(csv.DictReader(io.StringIO(response.text)))
+        assert [r["email"] for r in records] == [f"export{i}@example.com" for i in range(3)]
+        assert records[0]["bio"] == "Bio, с запятой"
+
+        assert client.get("/users/export?format=xml").status_code == 422
+
+        print("✅ Выгрузка пользователей работает")
+
+    def test_import_users_csv(self, client, db_session):
+        """✅ Проверяет импорт CSV: вставка, дубликаты и отклоненные строки"""
+        print("🧪 Тест: Импорт пользователей из CSV")
+
+        client.post("/users/", json={"name": "Existing", "email": "existing@example.com"})
+
+        content = (
+            "name,email,bio\n"
+            "Import One,import1@example.com,Bio 1\n"
+            "Bad Email,not-an-email,\n"
+            "Existing Again,existing@example.com,\n"
+            "Import Two,import2@example.com,\n"
+            "Import One Again,import1@example.com,\n"
+            + "N" * 51 + ",long-name@example.com,\n"  # Длиннее name varchar(50): на PostgreSQL ронял COPY
+        )
+        response = client.post("/users/import", files={"file": ("users.csv", content, "text/csv")})
+
+        assert response.status_code == 200
+        report = response.json()
+        assert report["processed"] == 6
+        assert report["inserted"] == 2
+        assert report["duplicates"] == 2
+        assert report["rejected"] == 2
+        assert report["errors"][0]["line"] == 3
+        assert "email" in report["errors"][0]["error"]
+        assert report["errors"][1]["line"] == 7
+        assert report["errors"][1]["error"].startswith("name:")
+
+        users = {u["email"]: u for u in client.get("/users/").json()}
+        assert users["import1@example.com"]["name"] == "Import One"
+        assert users["import2@example.com"]["bio"] is None
+
+        print("✅ Импорт CSV работает")
+
+    def test_import_users_ndjson(self, client, db_session):
+        """✅ Проверяет импорт NDJSON с явным форматом и битой строкой"""
+        print("🧪 Тест: Импорт пользователей из NDJSON")
+
+        content = (
+            '{"name": "Json One", "email": "json1@example.com"}\n'
+            "{broken json\n"
+            '{"name": "Json Two", "email": "json2@example.com", "bio": "Bio"}\n'
+        )
+        response = client.post("/users/import?format=ndjson", files={"file": ("dump.txt", content)})
+
+        assert response.status_code == 200
+        report = response.json()
+        assert (report["inserted"], report["rejected"]) == (2, 1)
+        assert report["errors"][0]["line"] == 2
+
+        # Без расширения и без ?format формат не угадать
+        response = client.post("/users/import", files={"file": ("dump.txt", content)})
+        assert response.status_code == 400
+
+        print("✅ Импорт NDJSON работает")
+
+    def test_batch_get_users_by_ids(self, client, db_session, assert_queries):
+        """✅ Проверяет пакетное получение пользователей по ID с сохранением порядка"""
+        print("🧪 Тест: Пакетное получение по ID")
+
+        created = client.post("/users/bulk", json=[
+            {"name": f"Batch {i}", "email": f"batchget{i}@example.com"} for i in range(3)
+        ]).json()["results"]
+        ids = [r["id"] for r in created]
+
+        # Один SELECT на весь пакет
+        with assert_queries(1):
+            response = client.get("/users/batch", params={"ids": [ids[2], 99999, ids[0]]})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [u["id"] for u in data["users"]] == [ids[2], ids[0]], "Порядок должен совпадать с запросом"
+        assert data["missing_ids"] == [99999]
+
+        with assert_queries(0):
+            too_many = client.get("/users/batch", params={"ids": list(range(501))})
+        assert too_many.status_code == 400
+
+        print("✅ Пакетное получение по ID работает")
+
+    def test_lookup_users_by_ids_and_emails(self, client, db_session, assert_queries):
+        """✅ Проверяет пакетный поиск по ID и email"""
+        print("🧪 Тест: Пакетный поиск по ID и email")
+
+        first = client.post("/users/", json={"name": "Lookup 1", "email": "lookup1@example.com"}).json()
+        second = client.post("/users/", json={"name": "Lookup 2", "email": "lookup2@example.com"}).json()
+
+        # Один SELECT по ids и один по emails
+        with assert_queries(2):
+            response = client.post("/users/lookup", json={
+                "ids": [first["id"], 424242],
+                "emails": ["lookup2@example.com", "nobody@example.com", "lookup1@example.com"],
+            })
+
+        assert response.status_code == 200
+        data = response.json()
+        # first найден и по id, и по email - в ответе один раз
+        assert [u["id"] for u in data["users"]] == [first["id"], second["id"]]
+        assert data["missing_ids"] == [424242]
+        assert data["missing_emails"] == ["nobody@example.com"]
+
+        print("✅ Пакетный поиск работает")
+
+    def test_lookup_limit_covers_ids_and_emails_together(self, client, db_session, assert_queries):
+        """❌ Проверяет, что лимит BATCH_LOOKUP_MAX_ITEMS - на ids и emails вместе"""
+        print("🧪 Тест: Лимит пакетного поиска")
+
+        from app.schemas import BATCH_LOOKUP_MAX_ITEMS
+
+        half = BATCH_LOOKUP_MAX_ITEMS // 2
+        ids = list(range(1, half + 2))
+        emails = [f"limit{i}@example.com" for i in range(BATCH_LOOKUP_MAX_ITEMS - half)]
+
+        # Каждый список в пределах лимита, но вместе на один ключ больше
+        with assert_queries(0):
+            response = client.post("/users/lookup", json={"ids": ids, "emails": emails})
+        assert response.status_code == 422
+        assert "Too many ids and emails" in response.text
+
+        assert client.post("/users/lookup", json={"ids": ids[:-1], "emails": emails}).status_code == 200
+
+        print("✅ Лимит считается по ids и emails вместе")
+
+    def test_get_user_by_id_success(self, client, db_session, assert_queries):
         """✅ Проверяет получение пользователя по ID"""
         print("🧪 Тест: Получение пользователя по ID")
 
@@ -303,7 +665,8 @@ class TestUserManagementAPI:
         print(f"✅ Создан пользователь с ID: {user_id}")
 
         # Получаем пользователя по ID
-        response = client.get(f"/users/{user_id}")
+        with assert_queries(1):
+            response = client.get(f"/users/{user_id}")
 
         assert response.status_code == 200
         data = response.json()
@@ -315,12 +678,13 @@ class TestUserManagementAPI:
 
         print(f"✅ Пользователь с ID {user_id} найден корректно")
 
-    def test_get_user_by_id_not_found(self, client, db_session):
+    def test_get_user_by_id_not_found(self, client, db_session, assert_queries):
         """❌ Проверяет обработку запроса несуществующего пользователя"""
         print("🧪 Тест: Поиск несуществующего пользователя")
 
         # Пытаемся найти пользователя с несуществующим ID
-        response = client.get("/users/99999")
+        with assert_queries(1):
+            response = client.get("/users/99999")
 
         # 404 Not Found - ресурс не найден
         assert response.status_code == 404
@@ -351,6 +715,123 @@ class TestUserManagementAPI:
         print("✅ Все типы данных корректны")
 
 
+# 🔎 ТЕСТЫ ДЛЯ ПОИСКА ПОЛЬЗОВАТЕЛЕЙ
+class TestUserSearch:
+    """🔎 Тесты для GET /users/search"""
+
+    USERS = [
+        {"name": "Anna Karenina", "email": "karenina@example.com"},
+        {"name": "Bob", "email": "bob@example.com", "bio": "Friends with Anna since school"},
+        {"name": "Marianna", "email": "marianna@example.com"},
+        {"name": "anna b", "email": "annab@example.com"},
+        {"name": "Zed", "email": "zed@example.com", "bio": "Nothing to see"},
+        {"name": "50%_off", "email": "sale@example.com"},
+    ]
+
+    def _seed(self, client):
+        response = client.post("/users/bulk", json=self.USERS)
+        assert response.status_code == 200
+
+    def test_search_ranks_prefix_substring_and_bio(self, client, db_session, assert_queries):
+        """✅ Проверяет порядок: префикс имени, подстрока имени, слова биографии"""
+        print("🧪 Тест: Ранжирование поиска")
+
+        self._seed(client)
+
+        # Страница не заполнилась - запрошены все три уровня
+        with assert_queries(3):
+            response = client.get("/users/search", params={"q": "ANNA"})
+        assert response.status_code == 200
+        assert [user["name"] for user in response.json()] == ["anna b", "Anna Karenina", "Marianna", "Bob"]
+        assert "X-Next-Cursor" not in response.headers
+
+        # Страницу заполнил префикс - следующие уровни не выполняются
+        with assert_queries(1):
+            response = client.get("/users/search", params={"q": "anna", "limit": 2})
+        assert [user["name"] for user in response.json()] == ["anna b", "Anna Karenina"]
+        assert "X-Next-Cursor" in response.headers
+
+        # Короткий запрос - только префикс: подстрока из 1-2 символов не ищется
+        assert [u["name"] for u in client.get("/users/search", params={"q": "an"}).json()] == ["anna b", "Anna Karenina"]
+        # % и _ ищутся буквально
+        assert [u["name"] for u in client.get("/users/search", params={"q": "0%_"}).json()] == ["50%_off"]
+        assert client.get("/users/search", params={"q": "nobody"}).json() == []
+
+        print("✅ Поиск ранжирует результаты")
+
+    def test_search_keyset_pagination(self, client, db_session, monkeypatch):
+        """✅ Проверяет курсор поиска через все уровни ранжирования и одинаковый ответ обоих путей сериализации"""
+        print("🧪 Тест: Пагинация поиска")
+
+        from app import serialization
+
+        self._seed(client)
+        expected = [user["name"] for user in client.get("/users/search", params={"q": "anna"}).json()]
+
+        for fast in (True, False):
+            monkeypatch.setattr(serialization, "FAST_SERIALIZATION", fast)
+            names, cursor = [], None
+            while True:
+                params = {"q": "anna", "limit": 1}
+                if cursor is not None:
+                    params["cursor"] = cursor
+                response = client.get("/users/search", params=params)
+                assert response.status_code == 200
+                names += [user["name"] for user in response.json()]
+                cursor = response.headers.get("X-Next-Cursor")
+                if cursor is None:
+                    break
+            assert names == expected, "Страницы идут подряд без пропусков и повторов"
+
+        print("✅ Курсор поиска работает корректно")
+
+    def test_short_search_keeps_name_substring_bio_matches(self, client, db_session):
+        """✅ Проверяет, что при коротком запросе совпадение в биографии не теряется из-за подстроки в имени"""
+        print("🧪 Тест: Короткий запрос и биография")
+
+        client.post("/users/bulk", json=[
+            {"name": "Andy", "email": "andy@example.com", "bio": "an engineer"},
+            {"name": "Dan", "email": "dan@example.com", "bio": "an apple a day"},
+        ])
+
+        # Уровень подстроки для 2 символов не выполняется, поэтому "Dan" исключается из биографии только по префиксу
+        response = client.get("/users/search", params={"q": "an"})
+        assert [user["name"] for user in response.json()] == ["Andy", "Dan"]
+
+        print("✅ Dan найден по биографии")
+
+    def test_search_rejects_bad_input(self, client, db_session, assert_queries):
+        """❌ Проверяет пустой запрос, поврежденный курсор и слишком большой limit"""
+        print("🧪 Тест: Некорректный поиск")
+
+        with assert_queries(0):
+            assert client.get("/users/search", params={"q": "   "}).status_code == 400
+            assert client.get("/users/search", params={"q": "anna", "cursor": "broken!"}).status_code == 400
+            assert client.get("/users/search", params={"q": "anna", "limit": 1000}).status_code == 422
+            assert client.get("/users/search").status_code == 422
+
+        print("✅ Некорректный поиск отклонен")
+
+    def test_search_sql_matches_index_expressions(self):
+        """✅ Проверяет, что SQL уровней PostgreSQL совпадает с выражениями индексов миграции 0003"""
+        print("🧪 Тест: Выражения поиска и индексы")
+
+        from sqlalchemy.dialects import postgresql
+        from app.crud import search_stmts
+
+        prefix, substring, bio = (
+            str(stmt.compile(dialect=postgresql.dialect())) for stmt in search_stmts("postgresql", "ivanov")
+        )
+        # ix_users_name_prefix: (lower(name) COLLATE "C", id)
+        assert '(lower(users.name) COLLATE "C") LIKE' in prefix
+        # ix_users_name_trgm: lower(name) без COLLATE - иначе индекс не подходит и таблица читается целиком
+        assert "WHERE lower(users.name) LIKE" in substring
+        # ix_users_bio_fts: to_tsvector('simple', coalesce(bio, ''))
+        assert "to_tsvector('simple', coalesce(users.bio, ''))" in bio
+
+        print("✅ Выражения поиска совпадают с индексами")
+
+
 # 🔧 ТЕСТЫ ДЛЯ НИЗКОУРОВНЕВЫХ CRUD ОПЕРАЦИЙ
 class TestCRUDOperations:
     """🔧 Тесты для низкоуровневых CRUD операций"""
@@ -409,6 +890,1339 @@ class TestCRUDOperations:
 
         print("✅ CRUD: Предотвращение дубликатов работает")
 
+    def test_crud_create_user_single_statement(self, db_session, assert_queries):
+        """✅ Проверяет, что создание пользователя - один запрос без предварительного SELECT"""
+        print("🧪 Тест: CRUD - создание за один запрос")
+
+        from app.crud import create_user
+        from app.schemas import UserCreate
+
+        # По одному INSERT ... ON CONFLICT ... RETURNING на каждую попытку
+        with assert_queries(2) as queries:
+            created = create_user(db_session, UserCreate(name="Single", email="single@example.com"))
+            duplicate = create_user(db_session, UserCreate(name="Single", email="single@example.com"))
+
+        assert created is not None and created.id is not None
+        assert created.email == "single@example.com"
+        assert duplicate is None
+
+        assert all(s.lstrip().upper().startswith("INSERT") and "ON CONFLICT" in s.upper() for s in queries.statements)
+
+        print("✅ CRUD: Создание пользователя - один запрос")
+
+    def test_crud_concurrent_signup_same_email(self, tmp_path):
+        """✅ Стресс-тест: параллельные регистрации с одним email не дают IntegrityError"""
+        print("🧪 Тест: CRUD - параллельные регистрации")
+
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from app.crud import create_user
+        from app.schemas import UserCreate
+
+        # Файловая БД: у каждого потока свое соединение, как у воркеров в продакшене
+        file_engine = create_engine(
+            f"sqlite:///{tmp_path / 'signup.db'}",
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        Base.metadata.create_all(bind=file_engine)
+        FileSession = sessionmaker(autocommit=False, autoflush=False, bind=file_engine)
+
+        workers = 16
+        barrier = threading.Barrier(workers)
+
+        def signup(i):
+            session = FileSession()
+            try:
+                barrier.wait()  # Все потоки стартуют одновременно
+                user = create_user(session, UserCreate(name=f"Racer {i}", email="race@example.com"))
+                return None if user is None else user.id
+            finally:
+                session.close()
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # result() пробросит исключение, если какой-то поток упал
+                results = [future.result() for future in [pool.submit(signup, i) for i in range(workers)]]
+
+            winners = [user_id for user_id in results if user_id is not None]
+            assert len(winners) == 1, "Ровно одна регистрация должна победить"
+
+            session = FileSession()
+            try:
+                assert session.query(models.User).count() == 1
+            finally:
+                session.close()
+        finally:
+            file_engine.dispose()
+
+        print("✅ CRUD: Гонка регистраций разрешается детерминированно")
+
+    def test_crud_bulk_create_batches(self, db_session, assert_queries):
+        """✅ Проверяет, что число INSERT зависит от размера пачки, а не от числа строк"""
+        print("🧪 Тест: CRUD - массовая вставка пачками")
+
+        from app.crud import create_users_bulk
+        from app.schemas import UserCreate
+
+        users = [UserCreate(name=f"Batch {i}", email=f"batch{i}@example.com") for i in range(25)]
+
+        # 25 строк пачками по 10 - три многострочных INSERT
+        with assert_queries(3) as queries:
+            results = create_users_bulk(db_session, users, batch_size=10)
+
+        assert all("ON CONFLICT" in statement.upper() for statement in queries.statements)
+        assert [email for email, _ in results] == [u.email for u in users]
+        assert all(user_id is not None for _, user_id in results)
+
+        print("✅ CRUD: Массовая вставка идет пачками")
+
+    def test_export_memory_is_flat(self, db_session):
+        """✅ Проверяет, что пиковая память выгрузки не растет вместе с таблицей"""
+        print("🧪 Тест: Память потоковой выгрузки")
+
+        import tracemalloc
+        from app.crud import create_users_bulk
+        from app.export import stream_ndjson
+        from app.schemas import UserCreate
+
+        def export_peak():
+            """Пиковая память Python при полном проходе выгрузки"""
+            tracemalloc.start()
+            try:
+                exported = 0
+                for chunk in stream_ndjson(db_session, batch_size=500):
+                    exported += chunk.count("\n")
+                return exported, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        def add_users(start, count):
+            create_users_bulk(db_session, [
+                UserCreate(name=f"Row {i}", email=f"row{i}@example.com", bio="x" * 100)
+                for i in range(start, start + count)
+            ])
+
+        add_users(0, 2000)
+        small_rows, small_peak = export_peak()
+
+        add_users(2000, 18000)
+        large_rows, large_peak = export_peak()
+
+        assert (small_rows, large_rows) == (2000, 20000)
+        # В 10 раз больше строк - примерно та же пиковая память (одна пачка)
+        assert large_peak < small_peak * 2, f"Пиковая память выросла: {small_peak} -> {large_peak}"
+
+        print(f"✅ Пиковая память: {small_peak} байт на 2000 строк, {large_peak} байт на 20000 строк")
+
+    def test_import_progress_per_chunk(self, db_session):
+        """✅ Проверяет, что импорт идет пачками и сообщает прогресс после каждой"""
+        print("🧪 Тест: Прогресс импорта")
+
+        import io
+        from app.importer import import_users
+
+        content = "name,email\n" + "".join(f"Chunk {i},chunk{i}@example.com\n" for i in range(25))
+        reports = []
+
+        report = import_users(
+            db_session, io.StringIO(content), "csv", chunk_size=10,
+            progress=lambda r: reports.append((r.processed, r.inserted)),
+        )
+
+        assert reports == [(10, 10), (20, 20), (25, 25)]
+        assert report.inserted == 25 and report.rejected == 0
+
+        print("✅ Прогресс импорта сообщается по пачкам")
+
+    def test_import_uses_copy_on_postgresql(self, db_engine, db_session):
+        """✅ Проверяет путь COPY + ON CONFLICT импорта (только --db-backend=postgresql)"""
+        if db_engine.dialect.name != "postgresql":
+            pytest.skip("COPY есть только в PostgreSQL: запустите pytest --db-backend=postgresql")
+        print("🧪 Тест: Импорт через COPY")
+
+        import io
+        from sqlalchemy import text
+        from app.importer import STAGING_TABLE, import_users
+
+        db_session.add(models.User(name="Existing", email="copy1@example.com"))
+        db_session.commit()
+
+        content = "name,email,bio\n" + "".join(f"Copy {i},copy{i}@example.com,\n" for i in range(5))
+        content += "Copy again,copy3@example.com,\n"  # Повтор внутри файла
+        report = import_users(db_session, io.StringIO(content), "csv", chunk_size=4)
+
+        assert (report.inserted, report.duplicates, report.rejected) == (4, 2, 0)
+        # Данные прошли через временную staging таблицу, а не через INSERT ... VALUES
+        staging = db_session.execute(text("SELECT to_regclass(:name)"), {"name": f"pg_temp.{STAGING_TABLE}"}).scalar()
+        assert staging is not None
+        # Пустое поле bio в CSV стало NULL
+        assert db_session.execute(text("SELECT count(*) FROM users WHERE bio IS NULL")).scalar() == 5
+
+        print("✅ Импорт идет через COPY")
+
+    def test_import_keeps_empty_and_missing_bio(self, db_session):
+        """✅ Проверяет, что COPY (PostgreSQL) и многострочный INSERT (другие БД) одинаково хранят пустую и отсутствующую bio"""
+        print("🧪 Тест: Пустая bio при импорте")
+
+        import io
+        from sqlalchemy import select
+        from app.crud import create_users_bulk
+        from app.importer import import_users
+        from app.schemas import UserCreate
+
+        content = (
+            '{"name": "Empty", "email": "empty@example.com", "bio": ""}\n'
+            '{"name": "Missing", "email": "missing@example.com"}\n'
+            '{"name": "Quoted", "email": "quoted@example.com", "bio": "say \\"hi\\", bye"}\n'
+        )
+        report = import_users(db_session, io.StringIO(content), "ndjson")
+        assert report.inserted == 3
+
+        # Те же значения через INSERT (путь импорта не на PostgreSQL)
+        create_users_bulk(db_session, [
+            UserCreate(name="Empty", email="empty-insert@example.com", bio=""),
+            UserCreate(name="Missing", email="missing-insert@example.com"),
+        ])
+
+        bios = dict(db_session.execute(select(models.User.email, models.User.bio)).all())
+        assert bios["empty@example.com"] == bios["empty-insert@example.com"] == ""
+        assert bios["missing@example.com"] is None and bios["missing-insert@example.com"] is None
+        assert bios["quoted@example.com"] == 'say "hi", bye'
+
+        print("✅ Пустая строка и NULL не смешиваются")
+
+    def test_crud_batch_lookup_single_query(self, db_session, assert_queries):
+        """✅ Проверяет, что пакетный поиск - один запрос независимо от числа ID"""
+        print("🧪 Тест: CRUD - пакетный поиск одним запросом")
+
+        from app.crud import create_users_bulk, get_users_by_ids
+        from app.schemas import UserCreate
+
+        results = create_users_bulk(db_session, [
+            UserCreate(name=f"Many {i}", email=f"many{i}@example.com") for i in range(50)
+        ])
+        ids = [user_id for _, user_id in results][::-1] + [-1]
+
+        with assert_queries(1):
+            users = get_users_by_ids(db_session, ids)
+
+        assert [u.id for u in users[:-1]] == ids[:-1]
+        assert users[-1] is None
+
+        print("✅ CRUD: Пакетный поиск - один запрос")
+
+    def test_estimated_count_on_postgresql(self, db_engine, db_session, assert_queries):
+        """✅ Проверяет оценку числа пользователей по pg_class (только --db-backend=postgresql)"""
+        print("🧪 Тест: CRUD - оценка числа пользователей")
+
+        if db_engine.dialect.name != "postgresql":
+            pytest.skip("pg_class есть только в PostgreSQL: запустите pytest --db-backend=postgresql")
+
+        from app.crud import create_users_bulk, get_users_total
+
+        create_users_bulk(db_session, [
+            UserCreate(name=f"Estimate {i}", email=f"estimate{i}@example.com") for i in range(2000)
+        ])
+        # ANALYZE видит незафиксированные строки своей транзакции
+        db_session.execute(text("ANALYZE users"))
+
+        # Один запрос к каталогу, без COUNT(*) по таблице
+        with assert_queries(1) as queries:
+            total, mode = get_users_total(db_session, "estimated")
+        assert mode == "estimated"
+        assert 1800 <= total <= 2200
+        assert "pg_class" in queries.queries[0][0]
+
+        print("✅ CRUD: Оценка числа пользователей - один запрос к каталогу")
+
+    def test_crud_keyset_pagination_constant_cost(self, db_engine, db_session, assert_queries):
+        """✅ Проверяет, что стоимость keyset-страницы не зависит от ее глубины"""
+        print("🧪 Тест: CRUD - стоимость keyset-пагинации")
+
+        from app.crud import create_user, get_users
+        from app.schemas import UserCreate
+
+        created = [
+            create_user(db_session, UserCreate(name=f"Deep {i}", email=f"deep{i}@example.com"))
+            for i in range(50)
+        ]
+
+        # Перехватываем SQL, который реально уходит в БД
+        with assert_queries(2) as queries:
+            shallow = get_users(db_session, limit=5, after_id=0)
+            deep = get_users(db_session, limit=5, after_id=created[44].id)
+
+        assert [u.name for u in shallow] == [f"Deep {i}" for i in range(5)]
+        assert [u.name for u in deep] == [f"Deep {i}" for i in range(45, 50)]
+
+        # Один и тот же запрос для любой глубины: фильтр по id вместо пропуска строк
+        (shallow_sql, _, _), (deep_sql, deep_params, _) = queries.queries
+        assert shallow_sql == deep_sql
+        assert "users.id >" in deep_sql
+
+        # План запроса - поиск по первичному ключу, а не полный проход таблицы
+        # (на PostgreSQL планировщик для 50 строк законно выбирает Seq Scan, поэтому только SQLite)
+        if db_engine.dialect.name == "sqlite":
+            plan = db_session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + deep_sql, deep_params).all()
+            details = " ".join(str(row[-1]) for row in plan).upper()
+            assert "SEARCH" in details and "SCAN USERS" not in details
+
+        print("✅ CRUD: Keyset-страница читается поиском по индексу")
+
+    def test_crud_create_without_on_conflict(self, db_session, monkeypatch):
+        """✅ Проверяет переносимый путь SELECT + INSERT для БД без INSERT ... ON CONFLICT"""
+        print("🧪 Тест: CRUD - создание без ON CONFLICT")
+
+        from app import crud
+        from app.schemas import UserCreate
+
+        # Текущая БД считается не поддерживающей ON CONFLICT
+        monkeypatch.setattr(crud, "ON_CONFLICT_DIALECTS", ())
+
+        created = crud.create_user(db_session, UserCreate(name="Portable", email="portable@example.com"))
+        duplicate = crud.create_user(db_session, UserCreate(name="Again", email="portable@example.com"))
+        bulk = crud.create_users_bulk(db_session, [
+            UserCreate(name="Bulk 1", email="bulk1@example.com"),
+            UserCreate(name="Portable", email="portable@example.com"),
+            UserCreate(name="Bulk 1 again", email="bulk1@example.com"),
+        ])
+
+        assert created.id is not None and created.name == "Portable"
+        assert duplicate is None
+        assert [email for email, _ in bulk] == ["bulk1@example.com", "portable@example.com", "bulk1@example.com"]
+        assert [user_id is not None for _, user_id in bulk] == [True, False, False]
+        assert crud.get_user_by_email(db_session, "bulk1@example.com").id == bulk[0][1]
+
+        print("✅ CRUD: Без ON CONFLICT дубликаты тоже отсеиваются")
+
+
+# ⚙️ ТЕСТЫ ДЛЯ НАСТРОЕК ДВИЖКА БД
+class TestDatabaseSettings:
+    """⚙️ Тесты для настроек пула и подключения"""
+
+    def test_pool_status_counts(self, tmp_path):
+        """✅ Проверяет счетчики пула соединений"""
+        print("🧪 Тест: Счетчики пула соединений")
+
+        from sqlalchemy.pool import QueuePool
+        from app.database import pool_status
+
+        pooled_engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=QueuePool, pool_size=2)
+        try:
+            with pooled_engine.connect():
+                busy = pool_status(pooled_engine)
+            idle = pool_status(pooled_engine)
+        finally:
+            pooled_engine.dispose()
+
+        assert busy["pool_class"] == "QueuePool"
+        assert busy["size"] == 2
+        assert busy["checkedout"] == 1
+        assert idle["checkedout"] == 0
+        assert idle["checkedin"] == 1
+
+        print("✅ Счетчики пула корректны")
+
+    def test_connect_args(self):
+        """✅ Проверяет параметры подключения в обычном режиме и режиме PgBouncer"""
+        print("🧪 Тест: Параметры подключения")
+
+        from app.database import build_connect_args
+
+        direct = build_connect_args(driver="psycopg2", pgbouncer=False, statement_timeout=5000, application_name="api")
+        assert direct == {"application_name": "api", "options": "-c statement_timeout=5000"}
+
+        # PgBouncer: без startup-параметра options и без серверных prepared statements
+        bouncer = build_connect_args(driver="psycopg", pgbouncer=True, statement_timeout=5000, application_name="api")
+        assert "options" not in bouncer
+        assert bouncer["prepare_threshold"] is None
+
+        print("✅ Параметры подключения корректны")
+
+    def test_connection_budget_split(self):
+        """✅ Проверяет, что пулы всех воркеров укладываются в общий бюджет соединений"""
+        print("🧪 Тест: Бюджет соединений на воркеры")
+
+        from app.database import split_connection_budget
+
+        for budget, workers in [(100, 4), (90, 8), (12, 2), (3, 3), (1, 1)]:
+            pool_size, max_overflow = split_connection_budget(budget, workers)
+            assert pool_size >= 1 and max_overflow >= 0
+            assert workers * (pool_size + max_overflow) <= budget
+        assert split_connection_budget(100, 4) == (16, 9)
+
+        with pytest.raises(ValueError):
+            split_connection_budget(3, 4)
+        with pytest.raises(ValueError):
+            split_connection_budget(3, 2, pools=2)
+
+        print("✅ Пулы укладываются в бюджет")
+
+    def test_connection_budget_covers_async_engine(self):
+        """✅ Проверяет, что при DB_ASYNC=true синхронный и асинхронный пулы вместе укладываются в бюджет"""
+        print("🧪 Тест: Бюджет соединений в async режиме")
+
+        import os
+        import subprocess
+        import sys
+        from pathlib import Path
+
+        # Движки создаются без подключения к БД - достаточно прочитать размеры пулов
+        code = (
+            "import app.database as d; "
+            "pools = [d.get_engine().pool, d.get_async_engine().sync_engine.pool]; "
+            "print(sum(p.size() + p._max_overflow for p in pools))"
+        )
+        budget, workers = 40, 4
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).parent.parent,
+            env=dict(
+                os.environ, DB_ASYNC="true", DB_MAX_CONNECTIONS=str(budget), WEB_CONCURRENCY=str(workers),
+                DB_HOST="db.invalid", DB_PORT="1",
+            ),
+            capture_output=True, text=True, timeout=60,
+        )
+        assert result.returncode == 0, result.stderr
+        assert 0 < workers * int(result.stdout) <= budget
+
+        print("✅ Оба пула укладываются в бюджет")
+
+    def test_production_config(self, monkeypatch):
+        """✅ Проверяет настройки uvicorn продакшен режима из окружения"""
+        print("🧪 Тест: Продакшен настройки uvicorn")
+
+        from run import default_workers, production_config
+
+        monkeypatch.setenv("UVICORN_LIMIT_CONCURRENCY", "500")
+        monkeypatch.setenv("UVICORN_KEEPALIVE", "")
+        monkeypatch.setenv("WEB_CONCURRENCY", "3")
+
+        config = production_config("0.0.0.0", 8000, default_workers())
+        assert config["workers"] == 3
+        assert config["limit_concurrency"] == 500
+        assert config["timeout_keep_alive"] == 75
+        assert config["loop"] in ("uvloop", "asyncio") and config["http"] in ("httptools", "h11")
+        assert "reload" not in config
+
+        print("✅ Продакшен настройки корректны")
+
+
+# 🧠 ТЕСТЫ ДЛЯ КЭША ПОЛЬЗОВАТЕЛЕЙ
+class TestUserCache:
+    """🧠 Тесты для LRU/TTL кэша пользователей"""
+
+    def test_lru_eviction_and_ttl(self):
+        """✅ Проверяет вытеснение LRU и истечение TTL"""
+        print("🧪 Тест: LRU и TTL кэша")
+
+        from app.cache import InMemoryCache
+
+        now = [0.0]
+        lru = InMemoryCache(maxsize=2, ttl=10, clock=lambda: now[0])
+
+        lru.set("a", 1)
+        lru.set("b", 2)
+        assert lru.get("a") == 1  # "a" становится самым свежим
+        lru.set("c", 3)           # Вытесняется "b"
+        assert lru.get("b") is None
+        assert lru.get("a") == 1 and lru.get("c") == 3
+
+        now[0] = 10.0
+        assert lru.get("a") is None, "Запись с истекшим TTL не должна отдаваться"
+
+        print("✅ LRU и TTL работают")
+
+    def test_cached_reads_skip_database(self, db_session, monkeypatch, assert_queries):
+        """✅ Проверяет, что повторное чтение отдается из кэша без запроса к БД"""
+        print("🧪 Тест: Чтение из кэша")
+
+        from app import cache, crud
+        from app.cache import InMemoryCache, UserCache
+
+        user_cache = UserCache(InMemoryCache(maxsize=100, ttl=60))
+        monkeypatch.setattr(cache, "user_cache", user_cache)
+
+        created = crud.create_user(db_session, UserCreate(name="Hot", email="hot@example.com"))
+
+        # В БД должен уйти только первый запрос
+        with assert_queries(1):
+            first = crud.get_user_by_id(db_session, user_id=created.id)     # Промах - идем в БД
+            second = crud.get_user_by_id(db_session, user_id=created.id)    # Попадание
+            by_email = crud.get_user_by_email(db_session, email="hot@example.com")  # Попадание по второму ключу
+
+        assert first.name == second.name == by_email.name == "Hot"
+        assert user_cache.stats()["hits"] == 2
+        assert user_cache.stats()["misses"] == 1
+
+        print("✅ Повторные чтения идут из кэша")
+
+    def test_invalidation_on_create(self, db_session, monkeypatch):
+        """✅ Проверяет сброс записей кэша при создании пользователя"""
+        print("🧪 Тест: Инвалидация кэша")
+
+        from app import cache, crud
+        from app.cache import InMemoryCache, UserCache
+
+        user_cache = UserCache(InMemoryCache(maxsize=100))
+        monkeypatch.setattr(cache, "user_cache", user_cache)
+
+        # Устаревшая запись под email, который сейчас будет зарегистрирован
+        user_cache.put(models.User(id=999, name="Stale", email="fresh@example.com"))
+
+        created = crud.create_user(db_session, UserCreate(name="Fresh", email="fresh@example.com"))
+
+        assert user_cache.get_by_email("fresh@example.com") is None
+        assert crud.get_user_by_email(db_session, email="fresh@example.com").id == created.id
+
+        print("✅ Кэш сбрасывается при создании")
+
+    def test_pluggable_backend(self, client, db_session, monkeypatch):
+        """✅ Проверяет подключение собственного бэкенда и статистику в /health/cache"""
+        print("🧪 Тест: Собственный бэкенд кэша")
+
+        from app import cache
+        from app.cache import CacheBackend, UserCache
+
+        class DictBackend(CacheBackend):
+            """Простейший бэкенд без TTL - как заглушка общего кэша"""
+
+            def __init__(self):
+                self.data = {}
+
+            def get(self, key):
+                return self.data.get(key)
+
+            def set(self, key, value, ttl=None):
+                self.data[key] = value
+
+            def delete(self, *keys):
+                for key in keys:
+                    self.data.pop(key, None)
+
+            def clear(self):
+                self.data.clear()
+
+        backend = DictBackend()
+        monkeypatch.setattr(cache, "user_cache", UserCache(backend))
+
+        user_id = client.post("/users/", json={"name": "Plug", "email": "plug@example.com"}).json()["id"]
+        assert client.get(f"/users/{user_id}").status_code == 200
+        assert client.get(f"/users/{user_id}").json()["name"] == "Plug"
+        assert f"user:id:{user_id}" in backend.data
+
+        stats = client.get("/health/cache").json()
+        assert stats["enabled"] is True
+        assert stats["hits"] == 1 and stats["misses"] == 1
+
+        print("✅ Собственный бэкенд кэша работает")
+
+
+# 📚 ТЕСТЫ ДЛЯ РЕПЛИК ЧТЕНИЯ
+class TestReadReplicas:
+    """📚 Тесты для маршрутизации чтений на реплики"""
+
+    @staticmethod
+    def _replica_engine(path, names):
+        """Файловая SQLite БД, изображающая реплику с заданными пользователями"""
+        replica_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=replica_engine)
+        with replica_engine.begin() as conn:
+            for i, name in enumerate(names):
+                conn.execute(models.User.__table__.insert().values(name=name, email=f"{name.lower()}{i}@replica.com"))
+        return replica_engine
+
+    def test_round_robin_and_failover(self, tmp_path):
+        """✅ Проверяет выбор реплик по кругу и пропуск недоступной реплики"""
+        print("🧪 Тест: Round-robin и failover реплик")
+
+        from app.database import ReplicaRouter
+
+        first = self._replica_engine(tmp_path / "first.db", ["First"])
+        second = self._replica_engine(tmp_path / "second.db", ["Second"])
+        # Путь в несуществующую папку - подключение упадет как у недоступной реплики
+        broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'broken.db'}")
+
+        def read_names(router):
+            db = router.session()
+            try:
+                return db.query(models.User.name).scalar()
+            finally:
+                db.close()
+
+        router = ReplicaRouter([first, second])
+        assert sorted(read_names(router) for _ in range(4)) == ["First", "First", "Second", "Second"]
+
+        router = ReplicaRouter([broken, first], cooldown=60)
+        assert [read_names(router) for _ in range(3)] == ["First", "First", "First"]
+        assert router._unhealthy_until[0] > 0, "Упавшая реплика должна быть выведена из ротации"
+
+        # Все реплики недоступны - сессии нет, чтение уйдет на primary
+        assert ReplicaRouter([broken]).session() is None
+
+        print("✅ Round-robin и failover работают")
+
+    def test_reads_routed_to_replica(self, client, db_session, tmp_path, monkeypatch):
+        """✅ Проверяет, что чтения идут на реплику, а после записи - на primary"""
+        print("🧪 Тест: Маршрутизация чтений")
+
+        from app import database
+        from app.database import ReplicaRouter, READ_PRIMARY_COOKIE
+
+        replica = self._replica_engine(tmp_path / "replica.db", ["Replica"])
+        monkeypatch.setattr(database, "replica_router", ReplicaRouter([replica]))
+
+        # Чтение списка - с реплики
+        assert [u["name"] for u in client.get("/users/").json()] == ["Replica"]
+
+        # Запись идет на primary и включает read-your-own-writes для клиента
+        created = client.post("/users/", json={"name": "Primary", "email": "primary@example.com"})
+        assert created.status_code == 201
+        assert READ_PRIMARY_COOKIE in created.cookies
+
+        # Пока cookie жива, клиент читает с primary
+        assert [u["name"] for u in client.get("/users/").json()] == ["Primary"]
+
+        # Без cookie пользователь, которого нет на реплике, все равно находится через primary
+        client.cookies.clear()
+        response = client.get(f"/users/{created.json()['id'] + 100}")
+        assert response.status_code == 404
+        db_session.add(models.User(id=500, name="Lagging", email="lagging@example.com"))
+        db_session.commit()
+        assert client.get("/users/500").json()["name"] == "Lagging"
+
+        print("✅ Чтения маршрутизируются корректно")
+
+
+# ⚡ ТЕСТЫ ДЛЯ АСИНХРОННОГО РЕЖИМА
+class TestAsyncMode:
+    """⚡ Тесты для async CRUD и async эндпоинтов (DB_ASYNC=true)"""
+
+    @staticmethod
+    async def _async_session_factory():
+        """Асинхронная in-memory SQLite БД с созданными таблицами"""
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        async_engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        return async_engine, async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    def test_async_crud_operations(self):
+        """✅ Проверяет async версии CRUD операций"""
+        print("🧪 Тест: Async CRUD операции")
+
+        import asyncio
+        from app import crud_async
+
+        async def scenario():
+            async_engine, AsyncTestingSession = await self._async_session_factory()
+            try:
+                async with AsyncTestingSession() as db:
+                    created = await crud_async.create_user(db, UserCreate(name="Async", email="async@example.com"))
+                    duplicate = await crud_async.create_user(db, UserCreate(name="Async", email="async@example.com"))
+                    bulk = await crud_async.create_users_bulk(db, [
+                        UserCreate(name="Async 2", email="async2@example.com"),
+                        UserCreate(name="Async", email="async@example.com"),
+                    ])
+                    by_id = await crud_async.get_user_by_id(db, user_id=created.id)
+                    by_email = await crud_async.get_user_by_email(db, email="async2@example.com")
+                    page = await crud_async.get_users(db, limit=10, after_id=created.id)
+                return created, duplicate, bulk, by_id, by_email, page
+            finally:
+                await async_engine.dispose()
+
+        created, duplicate, bulk, by_id, by_email, page = asyncio.run(scenario())
+
+        assert created.id is not None
+        assert duplicate is None
+        assert [user_id is not None for _, user_id in bulk] == [True, False]
+        assert by_id.email == "async@example.com"
+        assert by_email.name == "Async 2"
+        assert [user.email for user in page] == ["async2@example.com"]
+
+        print("✅ Async CRUD операции работают")
+
+    def test_async_endpoints(self):
+        """✅ Проверяет async эндпоинты через ASGI клиент"""
+        print("🧪 Тест: Async эндпоинты")
+
+        import asyncio
+        import httpx
+        from fastapi import FastAPI
+        from app.async_api import router
+        from app.database import get_async_db
+
+        async def scenario():
+            async_engine, AsyncTestingSession = await self._async_session_factory()
+
+            async def override_get_async_db():
+                async with AsyncTestingSession() as db:
+                    yield db
+
+            async_app = FastAPI()
+            async_app.include_router(router)
+            async_app.dependency_overrides[get_async_db] = override_get_async_db
+
+            transport = httpx.ASGITransport(app=async_app)
+            try:
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                    created = await ac.post("/users/", json={"name": "Async API", "email": "api@example.com"})
+                    duplicate = await ac.post("/users/", json={"name": "Async API", "email": "api@example.com"})
+                    fetched = await ac.get(f"/users/{created.json()['id']}")
+                    missing = await ac.get("/users/99999")
+                    listed = await ac.get("/users/?limit=1&count=exact")
+                    searched = await ac.get("/users/search", params={"q": "async"})
+                return created, duplicate, fetched, missing, listed, searched
+            finally:
+                await async_engine.dispose()
+
+        created, duplicate, fetched, missing, listed, searched = asyncio.run(scenario())
+
+        assert created.status_code == 201
+        assert duplicate.status_code == 400
+        assert fetched.status_code == 200 and fetched.json()["email"] == "api@example.com"
+        assert missing.status_code == 404
+        assert len(listed.json()) == 1 and "X-Next-Cursor" in listed.headers
+        assert listed.headers["X-Total-Count"] == "1"
+        assert [user["email"] for user in searched.json()] == ["api@example.com"]
+
+        print("✅ Async эндпоинты работают")
+
+    def test_async_writes_mark_read_primary(self, tmp_path, monkeypatch):
+        """✅ Проверяет, что async записи ставят cookie read_primary для синхронных чтений с реплик"""
+        print("🧪 Тест: Read-your-own-writes в async режиме")
+
+        import asyncio
+        import httpx
+        from fastapi import FastAPI
+        from app import database
+        from app.async_api import router
+        from app.database import READ_PRIMARY_COOKIE, ReplicaRouter, get_async_db
+
+        replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+        monkeypatch.setattr(database, "replica_router", ReplicaRouter([replica]))
+
+        async def scenario():
+            async_engine, AsyncTestingSession = await self._async_session_factory()
+
+            async def override_get_async_db():
+                async with AsyncTestingSession() as db:
+                    yield db
+
+            async_app = FastAPI()
+            async_app.include_router(router)
+            async_app.dependency_overrides[get_async_db] = override_get_async_db
+
+            transport = httpx.ASGITransport(app=async_app)
+            try:
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                    created = await ac.post("/users/", json={"name": "Writer", "email": "writer@example.com"})
+                    bulk = await ac.post("/users/bulk", json=[{"name": "Bulk", "email": "bulk@example.com"}])
+                return created, bulk
+            finally:
+                await async_engine.dispose()
+
+        try:
+            created, bulk = asyncio.run(scenario())
+        finally:
+            replica.dispose()
+
+        assert created.status_code == 201 and READ_PRIMARY_COOKIE in created.cookies
+        assert bulk.status_code == 200 and READ_PRIMARY_COOKIE in bulk.cookies
+
+        print("✅ Async записи переключают чтения клиента на primary")
+
+    def test_async_router_keeps_static_routes(self, client, db_session, monkeypatch):
+        """✅ Проверяет, что async /users/{user_id} не перехватывает синхронные пути из main.py"""
+        print("🧪 Тест: Порядок маршрутов при DB_ASYNC=true")
+
+        from app import crud
+        from app.async_api import router
+        from app.main import app
+
+        # Как в main.py при DB_ASYNC=true: async роутер стоит перед синхронными маршрутами
+        monkeypatch.setattr(app.router, "routes", list(router.routes) + list(app.router.routes))
+        user = crud.create_user(db_session, UserCreate(name="Route", email="route@example.com"))
+
+        exported = client.get("/users/export")
+        batch = client.get("/users/batch", params={"ids": [user.id]})
+        lookup = client.post("/users/lookup", json={"emails": ["route@example.com"]})
+
+        assert exported.status_code == 200
+        assert json.loads(exported.text.splitlines()[0])["email"] == "route@example.com"
+        assert batch.status_code == 200 and [u["id"] for u in batch.json()["users"]] == [user.id]
+        assert lookup.status_code == 200 and [u["id"] for u in lookup.json()["users"]] == [user.id]
+
+        print("✅ export, batch и lookup доступны в async режиме")
+
+    def test_async_pool_records_wait(self, tmp_path):
+        """✅ Проверяет, что пул async движка пишет ожидание соединения в DBStats запроса"""
+        print("🧪 Тест: Ожидание пула в async режиме")
+
+        import asyncio
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from app.database import DBStats, InstrumentedAsyncQueuePool, current_db_stats
+
+        async def scenario():
+            async_engine = create_async_engine(
+                f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+                poolclass=InstrumentedAsyncQueuePool,
+                pool_size=1,
+                max_overflow=0,
+            )
+            stats = DBStats()
+            token = current_db_stats.set(stats)
+            try:
+                async with async_engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            finally:
+                current_db_stats.reset(token)
+                await async_engine.dispose()
+            return stats
+
+        stats = asyncio.run(scenario())
+
+        assert stats.pool_wait > 0
+        assert stats.queries == 1
+
+        print("✅ pool;dur считается и при DB_ASYNC=true")
+
+
+# 🔒 ТЕСТЫ ДЛЯ ИЗОЛЯЦИИ ТЕСТОВ ТРАНЗАКЦИЕЙ
+class TestTransactionIsolation:
+    """🔒 Тесты для фикстур db_connection/db_session из conftest.py"""
+
+    def test_commit_keeps_outer_transaction(self, db_connection, db_session):
+        """✅ Проверяет, что commit() в коде фиксирует SAVEPOINT, а внешняя транзакция остается открытой"""
+        print("🧪 Тест: commit внутри внешней транзакции")
+
+        from app import crud
+
+        committed = crud.create_user(db_session, UserCreate(name="Kept", email="kept@example.com"))
+        assert db_connection.in_transaction(), "Внешняя транзакция должна пережить commit()"
+
+        # rollback() откатывает только до последнего SAVEPOINT - закоммиченное остается
+        db_session.add(models.User(name="Dropped", email="dropped@example.com"))
+        db_session.flush()
+        db_session.rollback()
+
+        assert crud.get_user_by_email(db_session, email="kept@example.com").id == committed.id
+        assert crud.get_user_by_email(db_session, email="dropped@example.com") is None
+
+        print("✅ commit() и rollback() работают внутри внешней транзакции")
+
+    def test_client_shares_test_transaction(self, client, db_session):
+        """✅ Проверяет, что запросы через client видят данные теста и наоборот"""
+        print("🧪 Тест: Общая транзакция для client и db_session")
+
+        db_session.add(models.User(name="Seeded", email="seeded@example.com"))
+        db_session.commit()
+
+        assert [u["email"] for u in client.get("/users/").json()] == ["seeded@example.com"]
+
+        created = client.post("/users/", json={"name": "Via API", "email": "viaapi@example.com"}).json()
+        assert db_session.get(models.User, created["id"]).name == "Via API"
+
+        print("✅ client и db_session работают в одной транзакции")
+
+    def test_assert_queries_reports_sql(self, client, assert_queries):
+        """✅ Проверяет, что при неверном числе запросов в ошибку попадает выполненный SQL"""
+        print("🧪 Тест: Сообщение assert_queries")
+
+        with pytest.raises(AssertionError) as excinfo:
+            with assert_queries(0):
+                client.get("/users/")
+
+        message = str(excinfo.value)
+        assert "Expected 0 queries, got 2" in message
+        assert "FROM users" in message and "ms]" in message
+
+        with assert_queries(max_time_ms=10_000) as queries:
+            client.get("/users/")
+        assert queries.count == 2 and queries.total_ms > 0
+
+        print("✅ assert_queries показывает выполненные запросы")
+
+
+
+class TestMetrics:
+    """📈 Тесты для middleware метрик, /metrics и Server-Timing"""
+
+    @pytest.fixture(autouse=True)
+    def reset_metrics(self):
+        from app.metrics import metrics_registry
+
+        metrics_registry.reset()
+        yield
+        metrics_registry.reset()
+
+    def test_server_timing_header(self, client):
+        """✅ Проверяет заголовок Server-Timing со временем приложения, БД и ожидания пула"""
+        print("🧪 Тест: Server-Timing")
+
+        response = client.get("/users/")
+        assert response.status_code == 200
+
+        timing = response.headers["server-timing"]
+        assert timing.startswith("app;dur=")
+        assert "db;dur=" in timing and "pool;dur=" in timing
+        # В тестах сессия работает через SAVEPOINT - их тоже видно, поэтому проверяем только, что SELECT учтен
+        queries = int(timing.split('desc="')[1].split(" ")[0])
+        assert queries >= 1
+
+        print("✅ Server-Timing показывает время и число запросов к БД")
+
+    def test_metrics_by_route_template(self, client):
+        """✅ Проверяет, что /metrics считает запросы по шаблону маршрута, а не по пути"""
+        print("🧪 Тест: Метрики по маршрутам")
+
+        user_id = client.post("/users/", json={"name": "Metered", "email": "metered@example.com"}).json()["id"]
+        client.get(f"/users/{user_id}")
+        client.get(f"/users/{user_id}")
+        client.get("/users/999999")
+        client.get("/no-such-page")
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+        body = response.text
+        assert 'http_requests_total{method="POST",route="/users/",status="201"} 1' in body
+        assert 'http_requests_total{method="GET",route="/users/{user_id}",status="200"} 2' in body
+        assert 'http_requests_total{method="GET",route="/users/{user_id}",status="404"} 1' in body
+        assert 'http_requests_total{method="GET",route="<unmatched>",status="404"} 1' in body
+        assert f"/users/{user_id}" not in body
+
+        assert 'http_request_duration_seconds_count{method="GET",route="/users/{user_id}"} 3' in body
+        assert 'db_queries_per_request_bucket{method="GET",route="<unmatched>",le="0"} 1' in body
+        assert 'db_time_per_request_seconds_bucket{method="GET",route="/users/{user_id}",le="+Inf"} 3' in body
+        assert 'db_pool_wait_seconds_count{method="POST",route="/users/"} 1' in body
+
+        print("✅ Метрики сгруппированы по шаблонам маршрутов")
+
+    def test_metrics_report_created_pools_only(self, tmp_path, monkeypatch):
+        """✅ Проверяет, что /metrics показывает пулы sync и async движков и не создает движок ради отчета"""
+        print("🧪 Тест: Пулы в /metrics")
+
+        import asyncio
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from app import database
+        from app.metrics import MetricsRegistry
+
+        monkeypatch.setattr(database, "_engine", None)
+        monkeypatch.setattr(database, "_async_engine", None)
+        assert "db_pool_size" not in MetricsRegistry().render()
+        assert database._engine is None and database._async_engine is None
+
+        sync_engine = create_engine(f"sqlite:///{tmp_path / 'sync.db'}", poolclass=database.InstrumentedQueuePool, pool_size=2)
+        async_engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'async.db'}", poolclass=database.InstrumentedAsyncQueuePool, pool_size=3
+        )
+        monkeypatch.setattr(database, "_engine", sync_engine)
+        monkeypatch.setattr(database, "_async_engine", async_engine)
+        try:
+            body = MetricsRegistry().render()
+        finally:
+            sync_engine.dispose()
+            asyncio.run(async_engine.dispose())
+
+        assert body.count("# TYPE db_pool_size gauge") == 1
+        assert 'db_pool_size{engine="sync"} 2' in body
+        assert 'db_pool_size{engine="async"} 3' in body
+
+        print("✅ Оба пула в /metrics под меткой engine")
+
+    def test_db_stats_only_inside_request(self, db_session):
+        """✅ Проверяет, что хуки БД копят счетчики только при активном DBStats"""
+        print("🧪 Тест: Хуки счетчиков БД")
+
+        from app.database import DBStats, current_db_stats
+
+        stats = DBStats()
+        db_session.execute(text("SELECT 1"))
+        token = current_db_stats.set(stats)
+        try:
+            db_session.execute(text("SELECT 1"))
+            db_session.execute(text("SELECT 2"))
+        finally:
+            current_db_stats.reset(token)
+        db_session.execute(text("SELECT 3"))
+
+        assert stats.queries == 2
+        assert stats.db_time > 0
+
+        print("✅ Запросы вне HTTP запроса не учитываются")
+
+
+
+class TestSlowQueryLog:
+    """🐢 Тесты для журнала медленных запросов из database.py"""
+
+    @pytest.fixture
+    def slow_log(self, monkeypatch, caplog):
+        """Подменяет глобальный журнал и возвращает (установить журнал, записи журнала)"""
+        from app import database
+
+        caplog.set_level("WARNING", logger="app.slow_query")
+
+        def install(threshold_ms, **options):
+            log = database.SlowQueryLog(threshold_ms, **options)
+            monkeypatch.setattr(database, "slow_query_log", log)
+            return log
+
+        def entries(event="slow_query"):
+            records = [json.loads(r.getMessage()) for r in caplog.records if r.name == "app.slow_query"]
+            return [record for record in records if record["event"] == event]
+
+        return install, entries
+
+    @staticmethod
+    def _sleep_sql(db_session, ms):
+        """Запрос, который выполняется не меньше ms миллисекунд"""
+        if db_session.get_bind().dialect.name == "postgresql":
+            return text("SELECT pg_sleep(:seconds), :email AS email"), {"seconds": ms / 1000}
+        # В SQLite нет sleep - регистрируем функцию на соединении
+        db_session.connection().connection.driver_connection.create_function(
+            "sleep_ms", 1, lambda value: time.sleep(value / 1000) or 0
+        )
+        return text("SELECT sleep_ms(:ms), :email AS email"), {"ms": ms}
+
+    def test_slow_statement_is_logged(self, db_session, slow_log):
+        """✅ Проверяет, что запрос дольше порога попадает в журнал JSON со скрытыми строковыми параметрами"""
+        print("🧪 Тест: Запись медленного запроса")
+
+        install, entries = slow_log
+        install(50)
+
+        db_session.execute(text("SELECT 1"))
+        statement, params = self._sleep_sql(db_session, 80)
+        db_session.execute(statement, {**params, "email": "secret@example.com"})
+
+        [entry] = entries()
+        assert entry["duration_ms"] >= 80
+        assert entry["threshold_ms"] == 50
+        assert "sleep" in entry["statement"]
+        assert "<redacted>" in json.dumps(entry["parameters"])
+        assert "secret@example.com" not in json.dumps(entry)
+
+        print("✅ Медленный запрос записан, email скрыт")
+
+    def test_route_in_entry(self, client, slow_log):
+        """✅ Проверяет, что в записи есть шаблон маршрута HTTP запроса"""
+        print("🧪 Тест: Маршрут в журнале")
+
+        install, entries = slow_log
+        install(0)  # Порог 0 - в журнал попадает каждый запрос
+
+        client.get("/users/", params={"limit": 5})
+
+        routes = {entry["route"] for entry in entries() if "FROM users" in entry["statement"]}
+        assert routes == {"GET /users/"}
+
+        print("✅ Запись содержит маршрут")
+
+    def test_rate_limit(self, slow_log):
+        """✅ Проверяет, что сверх лимита записи не пишутся, а их число попадает в следующую запись"""
+        print("🧪 Тест: Ограничение частоты журнала")
+
+        now = [0.0]
+        install, entries = slow_log
+        install(0, per_minute=2, clock=lambda: now[0])
+
+        # Отдельный движок без SAVEPOINT фикстур - в журнал попадают только эти SELECT
+        engine = create_engine("sqlite://")
+        with engine.connect() as conn:
+            for _ in range(5):
+                conn.execute(text("SELECT 1"))
+            assert len(entries()) == 2
+
+            now[0] += 30  # За полминуты восстанавливается один токен
+            conn.execute(text("SELECT 1"))
+        engine.dispose()
+
+        assert len(entries()) == 3
+        assert entries()[-1]["suppressed"] == 3
+
+        print("✅ Лишние записи отброшены и посчитаны")
+
+    def test_redact_parameters(self):
+        """✅ Проверяет скрытие строк и обрезку длинных списков"""
+        print("🧪 Тест: Скрытие параметров")
+
+        from app.database import redact_parameters
+
+        assert redact_parameters({"email": "a@b.c", "limit": 10, "bio": None}) == {
+            "email": "<redacted>", "limit": 10, "bio": None,
+        }
+        assert redact_parameters(("a@b.c", 5)) == ["<redacted>", 5]
+        assert redact_parameters({"ids": list(range(100))})["ids"][-1] == "<100 items>"
+        assert redact_parameters({"email": "a@b.c"}, redact=False) == {"email": "a@b.c"}
+
+        print("✅ Параметры скрыты")
+
+    def test_explain_plan_on_postgresql(self, db_session, slow_log):
+        """✅ Проверяет, что для медленного SELECT на PostgreSQL снимается план EXPLAIN (ANALYZE, BUFFERS)"""
+        if db_session.get_bind().dialect.name != "postgresql":
+            pytest.skip("EXPLAIN ANALYZE снимается только на PostgreSQL")
+        print("🧪 Тест: EXPLAIN медленного запроса")
+
+        install, entries = slow_log
+        log = install(50, explain_sample=100)
+
+        statement, params = self._sleep_sql(db_session, 80)
+        db_session.execute(statement, {**params, "email": "plan@example.com"})
+        log.wait()
+
+        [plan] = entries("slow_query_plan")
+        assert "error" not in plan, plan
+        assert plan["plan"][0]["Plan"]["Actual Total Time"] >= 80
+        assert "Shared Hit Blocks" in plan["plan"][0]["Plan"]
+
+        print("✅ План записан в журнал")
+
+
+
+class TestStartupAndMigrations:
+    """🗃️ Тесты для миграций Alembic, ленивого движка и lifespan приложения"""
+
+    def test_migrations_match_models(self, db_engine):
+        """✅ Проверяет, что схема после миграций совпадает с моделями (нет забытой миграции)"""
+        print("🧪 Тест: Миграции совпадают с моделями")
+
+        from alembic.autogenerate import compare_metadata
+        from alembic.migration import MigrationContext
+        from migrate import include_object
+
+        with db_engine.connect() as conn:
+            context = MigrationContext.configure(conn, opts={"include_object": include_object})
+            diff = compare_metadata(context, Base.metadata)
+        assert diff == [], f"Модели изменились без миграции: {diff}"
+
+        print("✅ Схема миграций совпадает с моделями")
+
+    def test_bootstrap_stamps_existing_schema(self, tmp_path):
+        """✅ Проверяет, что база, созданная раньше через create_all, получает историю миграций без ошибок"""
+        print("🧪 Тест: Bootstrap существующей базы")
+
+        from alembic import command
+        from migrate import BASELINE_REVISION, alembic_config, bootstrap
+
+        # Схема, которую create_all строил до миграций, - это ревизия 0001 без таблицы alembic_version
+        url = f"sqlite:///{tmp_path / 'legacy.db'}"
+        command.upgrade(alembic_config(url), BASELINE_REVISION)
+        legacy_engine = create_engine(url)
+        with legacy_engine.begin() as conn:
+            conn.execute(text("DROP TABLE alembic_version"))
+            conn.execute(text("INSERT INTO users (name, email) VALUES ('Legacy', 'legacy@example.com')"))
+
+        bootstrap(url)
+        bootstrap(url)  # Повторный запуск ничего не делает
+
+        with legacy_engine.connect() as conn:
+            assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar_one() >= "0002"
+            assert conn.execute(text("SELECT email FROM users")).scalar_one() == "legacy@example.com"
+            assert conn.execute(text("SELECT updated_at FROM users")).scalar_one() is not None
+        legacy_engine.dispose()
+
+        print("✅ Существующая схема помечена и обновлена")
+
+    def test_import_does_not_touch_database(self):
+        """✅ Проверяет, что импорт приложения не создает движок и не требует доступной БД"""
+        print("🧪 Тест: Импорт без БД")
+
+        import os
+        import subprocess
+        import sys
+        from pathlib import Path
+
+        code = "import app.main, app.database as d; assert d._engine is None; print('ok')"
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).parent.parent,
+            env=dict(os.environ, DB_HOST="db.invalid", DB_PORT="1"),
+            capture_output=True, text=True, timeout=60,
+        )
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == "ok"
+
+        print("✅ Приложение импортируется без БД")
+
+    def test_lifespan_warms_and_disposes_pool(self, tmp_path, monkeypatch):
+        """✅ Проверяет, что старт приложения открывает соединения пула, а остановка их закрывает"""
+        print("🧪 Тест: Прогрев пула в lifespan")
+
+        from fastapi.testclient import TestClient
+        from sqlalchemy.pool import QueuePool
+        from app import database
+        from app.main import app
+
+        pooled_engine = create_engine(f"sqlite:///{tmp_path / 'warm.db'}", poolclass=QueuePool, pool_size=3)
+        monkeypatch.setattr(database, "_engine", pooled_engine)
+
+        with TestClient(app):
+            assert database.pool_status(pooled_engine)["checkedin"] == 3
+        assert database.pool_status(pooled_engine)["checkedin"] == 0
+
+        print("✅ Пул прогрет при старте и закрыт при остановке")
+
+    def test_threadpool_limit_is_opt_in(self, tmp_path, monkeypatch):
+        """✅ Проверяет, что threadpool anyio ограничивается только при явном THREADPOOL_SIZE (или --prod)"""
+        print("🧪 Тест: Размер threadpool")
+
+        import anyio
+        from fastapi.testclient import TestClient
+        from app import database, main
+
+        def thread_limit(client):
+            return client.portal.call(lambda: anyio.to_thread.current_default_thread_limiter().total_tokens)
+
+        monkeypatch.setattr(database, "_engine", create_engine(f"sqlite:///{tmp_path / 'threads.db'}"))
+
+        # По умолчанию (не продакшен) - 40 потоков anyio, как без настройки
+        assert database.THREADPOOL_SIZE == 0
+        with TestClient(main.app) as client:
+            assert thread_limit(client) == 40
+
+        monkeypatch.setattr(main, "THREADPOOL_SIZE", 7)
+        with TestClient(main.app) as client:
+            assert thread_limit(client) == 7
+
+        print("✅ Threadpool ограничивается только явно")
+
+    def test_warm_up_with_unavailable_database(self, tmp_path):
+        """✅ Проверяет, что недоступная БД не мешает старту воркера"""
+        print("🧪 Тест: Прогрев без БД")
+
+        from app.database import warm_up_pool
+
+        broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'broken.db'}")
+        assert warm_up_pool(broken, connections=2) == 0
+
+        print("✅ Старт продолжается без прогрева")
+
+
+class TestCompression:
+    """🗜️ Тесты для сжатия ответов (compression.py)"""
+
+    def _seed(self, client, count=30):
+        client.post("/users/bulk", json=[
+            {"name": f"Zip {i}", "email": f"zip{i}@example.com", "bio": "Длинная биография " * 5} for i in range(count)
+        ])
+
+    def test_list_is_compressed_by_negotiation(self, client, db_session):
+        """✅ Проверяет gzip для большого списка, отказ через q=0 и отсутствие сжатия маленьких ответов"""
+        print("🧪 Тест: Сжатие списка пользователей")
+
+        self._seed(client)
+        plain = client.get("/users/", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+
+        gzipped = client.get("/users/", headers={"Accept-Encoding": "gzip"})
+        assert gzipped.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in gzipped.headers["vary"]
+        assert int(gzipped.headers["content-length"]) < len(plain.content) / 3
+        assert gzipped.json() == plain.json()  # httpx распаковывает тело сам
+
+        refused = client.get("/users/", headers={"Accept-Encoding": "gzip;q=0, br;q=0, zstd;q=0"})
+        assert "content-encoding" not in refused.headers
+
+        # Меньше COMPRESSION_MIN_SIZE - без сжатия
+        assert "content-encoding" not in client.get("/", headers={"Accept-Encoding": "gzip"}).headers
+
+        # 304 без тела проходит как есть
+        etag = plain.headers["ETag"]
+        not_modified = client.get("/users/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert not_modified.status_code == 304 and "content-encoding" not in not_modified.headers
+
+        print("✅ Сжатие выбирается по Accept-Encoding")
+
+    def test_streaming_export_is_compressed(self, client, db_session):
+        """✅ Проверяет потоковое сжатие выгрузки: без Content-Length, распаковывается в тот же NDJSON"""
+        print("🧪 Тест: Сжатие потоковой выгрузки")
+
+        self._seed(client)
+        plain = client.get("/users/export", headers={"Accept-Encoding": "identity"})
+        gzipped = client.get("/users/export", headers={"Accept-Encoding": "gzip"})
+
+        assert gzipped.headers["content-encoding"] == "gzip"
+        assert "content-length" not in gzipped.headers
+        assert gzipped.text == plain.text and len(plain.text.splitlines()) == 30
+
+        print("✅ Выгрузка сжимается по чанкам")
+
+    def test_select_encoding(self):
+        """✅ Проверяет разбор Accept-Encoding: q, * и порядок предпочтения сервера"""
+        print("🧪 Тест: Выбор кодировки")
+
+        from app.compression import select_encoding
+
+        encodings = ["zstd", "br", "gzip"]
+        assert select_encoding("gzip, deflate, br", encodings) == "br"
+        assert select_encoding("gzip;q=1.0, br;q=0.5", encodings) == "gzip"
+        assert select_encoding("*;q=0.1, gzip", encodings) == "gzip"
+        assert select_encoding("*", encodings) == "zstd"
+        assert select_encoding("deflate, identity", encodings) is None
+        assert select_encoding("GZIP;q=0.8", ["gzip"]) == "gzip"
+        assert select_encoding("", encodings) is None
+
+        print("✅ Кодировка выбирается корректно")
+
+    @pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+    def test_codecs_round_trip(self, encoding):
+        """✅ Проверяет разовое и потоковое сжатие каждой установленной кодировки"""
+        print(f"🧪 Тест: Кодировка {encoding}")
+
+        import gzip
+        from app import compression
+
+        if encoding not in compression.available_encodings([encoding]):
+            pytest.skip(f"{encoding} не установлен")
+        decompress = {
+            "gzip": gzip.decompress,
+            "br": lambda data: compression.brotli.decompress(data),
+            "zstd": lambda data: compression.zstandard.ZstdDecompressor().decompressobj().decompress(data),
+        }[encoding]
+
+        data = b'{"name":"User","email":"user@example.com"}\n' * 200
+        assert decompress(compression.compress(encoding, data)) == data
+
+        stream = compression.StreamCompressor(encoding)
+        chunks = [stream.compress(data[:3000]), stream.compress(data[3000:]), stream.finish()]
+        assert chunks[0], "Первый чанк отдается сразу, не дожидаясь конца потока"
+        assert decompress(b"".join(chunks)) == data
+
+        print(f"✅ {encoding} сжимает и распаковывается")
+
+    def test_cached_payload_is_reused(self, monkeypatch):
+        """✅ Проверяет, что ответ с ETag сжимается один раз, а без ETag - на каждый запрос"""
+        print("🧪 Тест: Кэш сжатых ответов")
+
+        from fastapi.testclient import TestClient
+        from app import compression
+
+        calls = []
+        original = compression.compress
+        monkeypatch.setattr(compression, "compress", lambda encoding, data: calls.append(encoding) or original(encoding, data))
+
+        async def json_app(scope, receive, send):
+            headers = [(b"content-type", b"application/json")]
+            if scope["path"] == "/etag":
+                headers.append((b"etag", b'W/"1"'))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b"[" + b"1," * 2000 + b"1]"})
+
+        client = TestClient(compression.CompressionMiddleware(json_app, minimum_size=100, encodings=["gzip"]))
+        for _ in range(3):
+            assert client.get("/etag", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+        assert calls == ["gzip"]
+
+        for _ in range(2):
+            client.get("/plain", headers={"Accept-Encoding": "gzip"})
+        assert calls == ["gzip"] * 3
+
+        print("✅ Сжатые байты переиспользуются")
+
 
 # 🔄 ТЕСТ ПОЛНОГО ЦИКЛА РАБОТЫ
 def test_complete_user_workflow(client, db_session):